@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from .cancellation import check_cancelled
 from .context import NODES_CONTEXT, NodeContext, temporal_context
-from .file_nodes import FileNode
+from .file_nodes import DirectoryNode, FileNode
 from .node import *
 from .syntax_nodes import *
 from .utils import *
@@ -0,0 +1,183 @@
+"""Cancellation of node computations.
+
+Each time a node computes its output, a ``CancellationToken`` is created for that
+computation. The token is cancelled when the computation exceeds the node's timeout,
+when the node is invalidated (its result would be thrown away) or when someone calls
+``Node.cancel``. Node functions can cooperate by calling ``check_cancelled``
+periodically. Functions that can't cooperate can be ran in a separate process
+(with the ``isolate`` context key), which is killed if the token is cancelled.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple
+
+from .errors import NodeCancelledError, NodeTimeoutError
+
+if TYPE_CHECKING:
+    from .node import Node
+
+__all__ = ["CancellationToken", "current_token", "check_cancelled"]
+
+
+class CancellationToken:
+    """Signals to a running computation that it should stop.
+
+    Parameters
+    ----------
+    node:
+        The node whose computation this token controls.
+    timeout:
+        Number of seconds after which the computation is considered cancelled.
+        If None, the computation can only be cancelled explicitly.
+    """
+
+    # Reason used when the computation is cancelled because the node has been invalidated.
+    INVALIDATED = "inputs changed"
+
+    def __init__(self, node: Node, timeout: Optional[float] = None):
+        self.node = node
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.reason: Optional[str] = None
+
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancels the computation."""
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def timed_out(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the computation should stop."""
+        return self._event.is_set() or self.timed_out
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the timeout, if there is one."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def check(self):
+        """Raises an error if the computation should stop."""
+        if self._event.is_set():
+            raise NodeCancelledError(self.node, self.reason)
+        if self.timed_out:
+            raise NodeTimeoutError(self.node, self.timeout)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleeps for some time, waking up as soon as the token is cancelled.
+
+        Returns
+        -------
+        bool
+            Whether the token is cancelled.
+        """
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._event.wait(seconds)
+        return self.cancelled
+
+
+# Token of the computation that is running in the current thread (or asyncio task).
+_CURRENT_TOKEN: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "nodify_cancellation_token", default=None
+)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """Returns the cancellation token of the node computation that is currently running."""
+    return _CURRENT_TOKEN.get()
+
+
+def check_cancelled():
+    """Raises an error if the node computation that is currently running should stop.
+
+    Long running node functions should call this function periodically. Outside
+    of a node computation it does nothing.
+    """
+    token = _CURRENT_TOKEN.get()
+    if token is not None:
+        token.check()
+
+
+def _isolated_worker(conn, function: Callable, args: Tuple, kwargs: Dict[str, Any]):
+    """Runs a function in a child process and sends the result through a pipe."""
+    try:
+        result = ("ok", function(*args, **kwargs))
+    except Exception as e:
+        result = ("error", e)
+
+    try:
+        conn.send(result)
+    except Exception as e:
+        # The result (or the exception) could not be pickled.
+        conn.send(("error", RuntimeError(f"Could not send back the result: {e}")))
+    finally:
+        conn.close()
+
+
+def run_isolated(
+    function: Callable,
+    args: Tuple,
+    kwargs: Dict[str, Any],
+    token: CancellationToken,
+    poll_interval: float = 0.05,
+) -> Any:
+    """Runs a function in a separate process, killing it if the token is cancelled.
+
+    The function, its arguments and its result must be picklable.
+
+    Parameters
+    ----------
+    function:
+        The function to run.
+    args:
+        Positional arguments for the function.
+    kwargs:
+        Keyword arguments for the function.
+    token:
+        The cancellation token of the computation.
+    poll_interval:
+        How often (in seconds) the token is checked while waiting for the result.
+    """
+    ctx = multiprocessing.get_context()
+    receiver, sender = ctx.Pipe(duplex=False)
+
+    process = ctx.Process(
+        target=_isolated_worker, args=(sender, function, args, kwargs), daemon=True
+    )
+    process.start()
+    sender.close()
+
+    try:
+        while not receiver.poll(poll_interval):
+            if token.cancelled:
+                process.kill()
+                token.check()
+
+        try:
+            status, value = receiver.recv()
+        except EOFError:
+            process.join()
+            raise RuntimeError(
+                f"The process running {token.node} died with exit code {process.exitcode}."
+            )
+    finally:
+        receiver.close()
+        process.join()
+
+    if status == "error":
+        raise value
+    return value
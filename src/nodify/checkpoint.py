@@ -0,0 +1,216 @@
+"""Persistence of node outputs, so that interrupted computations can be resumed."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from types import CodeType, FunctionType
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+__all__ = ["CheckpointStore", "fingerprint"]
+
+# Value returned by CheckpointStore.load when there is no checkpoint.
+_MISSING = object()
+# Placeholder for variables of enclosing scopes that have no value yet.
+_MISSING_CELL = "<empty cell>"
+
+
+def _canonical(obj: Any) -> Any:
+    """Returns an equivalent of a value that always pickles to the same bytes.
+
+    The iteration order of sets (e.g. of strings) depends on the hash seed of the
+    process, so they are converted to sorted tuples. Dictionaries are sorted as well,
+    since dictionaries with the same items are equal regardless of their order.
+    Containers are converted recursively.
+    """
+    if isinstance(obj, (set, frozenset)):
+        items = [_canonical(item) for item in obj]
+        return (type(obj), _sorted_by_pickle(items))
+    elif type(obj) is dict:
+        items = [(_canonical(k), _canonical(v)) for k, v in obj.items()]
+        return (dict, _sorted_by_pickle(items))
+    elif type(obj) in (list, tuple):
+        return type(obj)(_canonical(item) for item in obj)
+    return obj
+
+
+def _sorted_by_pickle(items: List[Any]) -> Tuple[Any, ...]:
+    """Sorts values of any type, using their pickled bytes."""
+    return tuple(
+        sorted(
+            items, key=lambda item: pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+    )
+
+
+def fingerprint(*objs: Any) -> Optional[str]:
+    """Returns a hash that identifies some values, computed from their pickled bytes.
+
+    Sets and dictionaries are sorted before pickling them, so that equal values
+    have the same fingerprint in every process (see ``_canonical``).
+
+    Returns None if any of the values can't be pickled.
+    """
+    try:
+        data = pickle.dumps(_canonical(objs), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _code_id(code: CodeType) -> Tuple[Any, ...]:
+    """Identifies a code object, including the code objects of nested functions."""
+    return (
+        code.co_code,
+        tuple(
+            _code_id(const) if isinstance(const, CodeType) else const
+            for const in code.co_consts
+        ),
+        code.co_names,
+    )
+
+
+def _function_id(
+    function: Callable, _seen: Optional[Set[int]] = None
+) -> Tuple[Any, ...]:
+    """Identifies a function, so that changing it invalidates checkpoints.
+
+    Apart from the code, the constants, the default values of the arguments and the
+    values of the variables of enclosing scopes that the function uses are part of it.
+    Functions that the function receives through those are identified recursively.
+    """
+    module = getattr(function, "__module__", None) or ""
+    name = getattr(function, "__qualname__", None) or repr(function)
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return (module, name, b"")
+
+    _seen = set() if _seen is None else _seen
+    _seen.add(id(function))
+
+    def _value_id(value: Any) -> Any:
+        if isinstance(value, FunctionType):
+            return "<recursive>" if id(value) in _seen else _function_id(value, _seen)
+        return value
+
+    closure = []
+    for cell in getattr(function, "__closure__", None) or ():
+        try:
+            closure.append(_value_id(cell.cell_contents))
+        except ValueError:
+            # The variable has not been assigned yet.
+            closure.append(_MISSING_CELL)
+
+    return (
+        module,
+        name,
+        _code_id(code),
+        tuple(_value_id(v) for v in getattr(function, "__defaults__", None) or ()),
+        {
+            k: _value_id(v)
+            for k, v in (getattr(function, "__kwdefaults__", None) or {}).items()
+        },
+        tuple(closure),
+    )
+
+
+class CheckpointStore:
+    """Stores node outputs in a local directory.
+
+    Each output is stored in its own file, under the key of the node (e.g. its key
+    in the workflow) and a fingerprint of the function and the inputs that produced
+    it. Files are written atomically, so an interrupted write never leaves a
+    corrupt checkpoint behind.
+
+    Parameters
+    ----------
+    directory:
+        The directory where checkpoints are stored. It is created if needed.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+
+    def fingerprint(
+        self, function: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]
+    ) -> Optional[str]:
+        """Fingerprint of a call, or None if it can't be computed."""
+        return fingerprint(_function_id(function), args, sorted(kwargs.items()))
+
+    def _path(self, key: str, fingerprint: str) -> Path:
+        return self.directory / key / f"{fingerprint}.pkl"
+
+    def load(self, key: str, fingerprint: str) -> Any:
+        """Returns the stored output, or ``_MISSING`` if there is no checkpoint."""
+        try:
+            with open(self._path(key, fingerprint), "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return _MISSING
+
+    def save(self, key: str, fingerprint: str, output: Any) -> bool:
+        """Stores an output, returning whether it could be stored."""
+        path = self._path(key, fingerprint)
+        try:
+            data = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    def call(
+        self,
+        key: str,
+        function: Callable,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        call: Callable[[Tuple[Any, ...], Dict[str, Any]], Any],
+    ) -> Tuple[Any, bool]:
+        """Returns the output of a call, loading it from a checkpoint if there is one.
+
+        Parameters
+        ----------
+        key:
+            The key of the node.
+        function:
+            The function that is called, which is part of the fingerprint.
+        args, kwargs:
+            The arguments of the call.
+        call:
+            Function that performs the call if there is no checkpoint.
+
+        Returns
+        -------
+        output:
+            The output of the call.
+        loaded:
+            Whether the output was loaded from a checkpoint.
+        """
+        call_fingerprint = self.fingerprint(function, args, kwargs)
+        if call_fingerprint is None:
+            return call(args, kwargs), False
+
+        output = self.load(key, call_fingerprint)
+        if output is not _MISSING:
+            return output, True
+
+        output = call(args, kwargs)
+        self.save(key, call_fingerprint, output)
+        return output, False
+
+    def clear(self):
+        """Removes all the checkpoints of the store."""
+        shutil.rmtree(self.directory, ignore_errors=True)
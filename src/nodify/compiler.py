@@ -0,0 +1,420 @@
+"""Compilation of node trees into plain python functions.
+
+While ``conversions.node_to_python_script`` generates code that is meant to be
+read by humans, the compiler in this module generates code that is meant to be
+executed as fast as possible. All the bookkeeping that nodes do (checking whether
+inputs have changed, storing outputs, logging...) is removed, and the whole
+tree is fused into a single python function.
+"""
+
+from __future__ import annotations
+
+import inspect
+import itertools
+import keyword
+import linecache
+import weakref
+from typing import Any, Callable, Dict, List, Type, Union
+
+from .node import Batch, ConstantNode, DummyInputValue, Node
+from .syntax_nodes import BoolOpNode, ConditionalExpressionNode, SwitchNode
+from .workflow import Workflow
+
+__all__ = ["compile_node"]
+
+# Cache of compiled functions for workflow classes. Workflow classes are immutable
+# once they are created, so their compiled function never needs to be regenerated.
+_COMPILED_WORKFLOWS: "weakref.WeakKeyDictionary[Type[Workflow], Callable]" = (
+    weakref.WeakKeyDictionary()
+)
+
+# Error raised by compiled functions when they receive batches.
+_BATCH_ERROR = "Compiled functions can not receive batches, use the nodes instead."
+
+# Counter used to give a unique (fake) filename to each piece of compiled code.
+_compiled_counter = itertools.count()
+
+
+class _VarRef:
+    """Placeholder for a variable of the generated code."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Compiler:
+    """Generates the source code of a function that computes a node tree.
+
+    Parameters
+    ----------
+    function_name:
+        The name that the generated function will have.
+    """
+
+    def __init__(self, function_name: str):
+        self.function_name = function_name
+
+        # Objects that the generated code needs to access (functions, constants...)
+        self.namespace: Dict[str, Any] = {}
+        self._namespace_ids: Dict[int, str] = {}
+        # Parameters of the generated function, mapping to their default value.
+        self.params: Dict[str, Any] = {}
+
+        self._var_counter = itertools.count()
+
+    def bind(self, obj: Any, prefix: str = "_c") -> str:
+        """Makes an object available to the generated code, returning its name."""
+        name = self._namespace_ids.get(id(obj))
+        if name is None:
+            name = f"{prefix}{len(self.namespace)}"
+            self.namespace[name] = obj
+            self._namespace_ids[id(obj)] = name
+        return name
+
+    def new_var(self) -> str:
+        return f"_v{next(self._var_counter)}"
+
+    def emit(self, node: Node, lines: List[str], indent: str, defined: Dict[int, str]):
+        """Writes the code that computes a node, returning the variable that holds its value.
+
+        Parameters
+        ----------
+        node:
+            The node to compute.
+        lines:
+            The list of code lines to which the code should be appended.
+        indent:
+            The indentation of the current block.
+        defined:
+            Mapping from node ids to the variables that already hold their values
+            in the current block.
+        """
+        if id(node) in defined:
+            return defined[id(node)]
+
+        if isinstance(node, Batch):
+            raise NotImplementedError(
+                f"Batches can not be compiled (found {node} in the tree)."
+            )
+
+        if isinstance(node, DummyInputValue):
+            var = self._emit_input(node)
+        elif isinstance(node, ConstantNode):
+            var = self.bind(node._inputs.get("value", Node._blank))
+        elif isinstance(node, ConditionalExpressionNode):
+            var = self._emit_conditional(node, lines, indent, defined)
+        elif isinstance(node, SwitchNode):
+            var = self._emit_switch(node, lines, indent, defined)
+        elif isinstance(node, BoolOpNode):
+            var = self._emit_bool_op(node, lines, indent, defined)
+        elif isinstance(node, Workflow):
+            var = self._emit_call(
+                node, compile_node(type(node)), lines, indent, defined
+            )
+        else:
+            node_cls = type(node)
+            if (
+                node_cls.get is not Node.get
+                or node_cls._get_evaluated_inputs is not Node._get_evaluated_inputs
+            ):
+                raise NotImplementedError(
+                    f"{node_cls.__name__} implements a custom evaluation, which the compiler does not know about."
+                )
+            var = self._emit_call(node, node.function, lines, indent, defined)
+
+        defined[id(node)] = var
+        return var
+
+    def _emit_input(self, node: DummyInputValue) -> str:
+        """Input nodes are converted into parameters of the generated function."""
+        name = node.input_key
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise ValueError(
+                f"Input key '{name}' can't be used as a parameter of the compiled function."
+            )
+
+        if name in self.params and self.params[name] is not node.value:
+            raise ValueError(f"There is more than one input with key '{name}'.")
+        self.params[name] = node.value
+
+        return name
+
+    def _emit_call(
+        self,
+        node: Node,
+        function: Callable,
+        lines: List[str],
+        indent: str,
+        defined: Dict[int, str],
+    ) -> str:
+        """Writes a call to the function of a node with its (already computed) inputs."""
+        mapped = node.map_inputs(
+            node._inputs,
+            func=lambda input_node: _VarRef(
+                self.emit(input_node, lines, indent, defined)
+            ),
+            only_nodes=True,
+        )
+        args, kwargs = node._sanitize_inputs(mapped)
+
+        def _ref(value):
+            return value.name if isinstance(value, _VarRef) else self.bind(value)
+
+        call_args = [_ref(arg) for arg in args]
+        extra_kwargs = {}
+        for k, v in kwargs.items():
+            if k.isidentifier() and not keyword.iskeyword(k):
+                call_args.append(f"{k}={_ref(v)}")
+            else:
+                extra_kwargs[k] = v
+        if extra_kwargs:
+            call_args.append(
+                "**{"
+                + ", ".join(f"{repr(k)}: {_ref(v)}" for k, v in extra_kwargs.items())
+                + "}"
+            )
+
+        var = self.new_var()
+        lines.append(
+            f"{indent}{var} = {self.bind(function, '_f')}({', '.join(call_args)})"
+        )
+        return var
+
+    def _emit_value(
+        self, value: Any, lines: List[str], indent: str, defined: Dict[int, str]
+    ) -> str:
+        """Returns the code for an input value, which may be a node or a plain value."""
+        if isinstance(value, Node):
+            return self.emit(value, lines, indent, defined)
+        return self.bind(value)
+
+    def _emit_conditional(
+        self,
+        node: ConditionalExpressionNode,
+        lines: List[str],
+        indent: str,
+        defined: Dict[int, str],
+    ) -> str:
+        """Writes an if/else block so that only the branch that is taken is computed."""
+        inputs = node._inputs
+
+        test = self._emit_value(inputs["test"], lines, indent, defined)
+        var = self.new_var()
+
+        lines.append(f"{indent}if {test}:")
+        true = self._emit_value(inputs["true"], lines, indent + "    ", defined.copy())
+        lines.append(f"{indent}    {var} = {true}")
+        lines.append(f"{indent}else:")
+        false = self._emit_value(
+            inputs["false"], lines, indent + "    ", defined.copy()
+        )
+        lines.append(f"{indent}    {var} = {false}")
+
+        return var
+
+    def _emit_switch(
+        self,
+        node: SwitchNode,
+        lines: List[str],
+        indent: str,
+        defined: Dict[int, str],
+    ) -> str:
+        """Writes a chain of if blocks so that only the case that is taken is computed.
+
+        Tests after the case that is taken are not computed either. Tests may need
+        several statements, so they can't be written as ``elif`` conditions. Instead,
+        a flag tells whether the following blocks should run, and all blocks are at
+        the same indentation level, however many cases there are.
+        """
+        cases = node._inputs.get("cases", ())
+        if len(cases) % 2 != 0:
+            raise ValueError(
+                f"SwitchNode needs pairs of test and value, but {len(cases)} cases were given."
+            )
+        var = self.new_var()
+        pending = self.new_var()
+
+        lines.append(f"{indent}{pending} = True")
+        for i in range(0, len(cases), 2):
+            block_indent = indent
+            block_defined = defined
+            if i > 0:
+                # Only the first test is always computed.
+                lines.append(f"{indent}if {pending}:")
+                block_indent = indent + "    "
+                block_defined = defined.copy()
+
+            test = self._emit_value(cases[i], lines, block_indent, block_defined)
+            lines.append(f"{block_indent}if {test}:")
+            value = self._emit_value(
+                cases[i + 1], lines, block_indent + "    ", block_defined.copy()
+            )
+            lines.append(f"{block_indent}    {var} = {value}")
+            lines.append(f"{block_indent}    {pending} = False")
+
+        default_indent = indent
+        default_defined = defined
+        if len(cases) > 0:
+            lines.append(f"{indent}if {pending}:")
+            default_indent = indent + "    "
+            default_defined = defined.copy()
+        default = self._emit_value(
+            node._inputs.get("default"), lines, default_indent, default_defined
+        )
+        lines.append(f"{default_indent}{var} = {default}")
+
+        return var
+
+    def _emit_bool_op(
+        self,
+        node: BoolOpNode,
+        lines: List[str],
+        indent: str,
+        defined: Dict[int, str],
+    ) -> str:
+        """Writes if blocks so that values are only computed until the result is known.
+
+        Once the result is known, the tests of all the following blocks fail, so the
+        blocks don't need to be nested.
+        """
+        op = node._inputs["op"]
+        if op not in ("and", "or"):
+            raise ValueError(f"Invalid operator: {op}")
+        values = node._inputs.get("values", ())
+        if len(values) == 0:
+            raise ValueError("BoolOpNode needs at least one value.")
+
+        var = self.new_var()
+
+        for i, value in enumerate(values):
+            block_indent = indent
+            block_defined = defined
+            if i > 0:
+                lines.append(f"{indent}if {'' if op == 'and' else 'not '}{var}:")
+                block_indent = indent + "    "
+                block_defined = defined.copy()
+            value = self._emit_value(value, lines, block_indent, block_defined)
+            lines.append(f"{block_indent}{var} = {value}")
+
+        return var
+
+    def signature_code(self, signature: Union[inspect.Signature, None]) -> str:
+        """Returns the code for the parameters of the generated function."""
+        if signature is None:
+            # There is no natural order for the parameters, so they are keyword only.
+            params = list(self.params)
+            if len(params) == 0:
+                return ""
+            params_code = ["*"]
+        else:
+            params = [k for k in signature.parameters if k in self.params]
+            params.extend(k for k in self.params if k not in params)
+            params_code = []
+
+        for param in params:
+            default = self.params[param]
+            if default is Node._blank:
+                params_code.append(param)
+            else:
+                params_code.append(f"{param}={self.bind(default)}")
+
+        return ", ".join(params_code)
+
+    def build(
+        self, output_node: Node, signature: Union[inspect.Signature, None] = None
+    ) -> Callable:
+        """Generates the source code for the tree and returns the compiled function."""
+        body = []
+        output = self.emit(output_node, body, "    ", {})
+        body.append(f"    return {output}")
+
+        # Nodes unpack batches that they receive as inputs, the compiled code doesn't.
+        if len(self.params) > 0:
+            batch = self.bind(Batch)
+            any_batch = " or ".join(
+                f"isinstance({param}, {batch})" for param in self.params
+            )
+            body[:0] = [
+                f"    if {any_batch}:",
+                f"        raise NotImplementedError({self.bind(_BATCH_ERROR)})",
+            ]
+
+        source = "\n".join(
+            [f"def {self.function_name}({self.signature_code(signature)}):", *body]
+        )
+
+        # Register the source in linecache, so that tracebacks can show the generated code.
+        filename = f"<nodify-compiled-{next(_compiled_counter)}>"
+        linecache.cache[filename] = (
+            len(source),
+            None,
+            source.splitlines(True),
+            filename,
+        )
+
+        namespace = dict(self.namespace)
+        exec(compile(source, filename, "exec"), namespace)
+
+        function = namespace[self.function_name]
+        function.__nodify_source__ = source
+        return function
+
+
+def compile_node(
+    node: Union[Node, Type[Workflow]], function_name: Union[str, None] = None
+) -> Callable:
+    """Compiles a node tree or a workflow into a single python function.
+
+    The returned function computes exactly the same output as ``Node.get``, but without
+    any of the node bookkeeping. This is useful when the same computation needs to be
+    performed many times with different inputs.
+
+    The parameters of the compiled function are the input nodes of the tree (e.g. the
+    inputs of a workflow). All other inputs are frozen to the values that they have
+    at compilation time. The source code of the function can be found in its
+    ``__nodify_source__`` attribute.
+
+    Batches are not supported: trees that contain ``Batch`` nodes can't be compiled,
+    and compiled functions raise ``NotImplementedError`` if they receive a ``Batch``
+    as an argument, instead of computing each item like nodes do.
+
+    Parameters
+    ----------
+    node:
+        The node whose output the compiled function should return. It can also be a
+        workflow class, in which case the compiled function will have the same signature
+        as the workflow. Compiled functions of workflow classes are cached.
+    function_name:
+        The name of the compiled function. If not provided, the name of the node class
+        is used.
+
+    Examples
+    --------
+
+    >>> from nodify import Workflow
+    >>> from nodify.compiler import compile_node
+    >>>
+    >>> @Workflow.from_func
+    >>> def my_workflow(a, b=2):
+    >>>     return a * b + 1
+    >>>
+    >>> f = compile_node(my_workflow)
+    >>> f(3)
+    7
+    """
+    if isinstance(node, type) and issubclass(node, Workflow):
+        workflow_cls = node
+        if function_name is None and workflow_cls in _COMPILED_WORKFLOWS:
+            return _COMPILED_WORKFLOWS[workflow_cls]
+
+        compiler = _Compiler(function_name or workflow_cls.__name__)
+        function = compiler.build(
+            workflow_cls.dryrun_nodes.output, inspect.signature(workflow_cls)
+        )
+
+        if function_name is None:
+            _COMPILED_WORKFLOWS[workflow_cls] = function
+        return function
+
+    compiler = _Compiler(function_name or type(node).__name__)
+    return compiler.build(node)
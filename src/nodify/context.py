@@ -1,11 +1,64 @@
 from __future__ import annotations
 
 import contextlib
+import itertools
 from collections import ChainMap
-from typing import Any, Union
+from contextvars import ContextVar
+from typing import Any, Dict, Union
+
+# Version of the contexts. It is bumped every time that any context is modified,
+# so that NodeContext objects know when the values that they have cached are stale.
+_context_versions = itertools.count(1)
+_CONTEXT_VERSION = 0
+
+
+def _bump_context_version():
+    """Signals that some context has changed, invalidating all cached context values."""
+    global _CONTEXT_VERSION
+    _CONTEXT_VERSION = next(_context_versions)
+
+
+class _VersionedDict(dict):
+    """Dictionary that bumps the context version whenever it is modified.
+
+    It is used for the dictionaries that contexts are made of, so that modifying
+    them directly (instead of through a NodeContext) is also noticed.
+    """
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        _bump_context_version()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        _bump_context_version()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        _bump_context_version()
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        _bump_context_version()
+        return value
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        _bump_context_version()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        _bump_context_version()
+        return item
+
+    def clear(self):
+        super().clear()
+        _bump_context_version()
+
 
 # The main nodes context that all nodes will use by default as their base.
-NODES_CONTEXT = dict(
+NODES_CONTEXT = _VersionedDict(
     # Whether the nodes should compute lazily or immediately when inputs are updated.
     lazy=True,
     # On initialization, should the node compute? If None, defaults to `lazy`.
@@ -21,12 +74,100 @@ NODES_CONTEXT = dict(
     on_init=None,
     # Mode for batch iteration. Can be "zip" or "product".
     batch_iter="zip",
+    # Maximum number of seconds that a computation can take. Node functions
+    # must call `check_cancelled` to be stopped, unless the node is isolated.
+    timeout=None,
+    # Whether to run the node function in a separate process, which can be killed
+    # if the computation is cancelled. The function, its inputs and its output
+    # must be picklable.
+    isolate=False,
+    # Whether to remember errors, raising them again without recomputing
+    # until the inputs of the node change.
+    cache_errors=True,
+    # Whether errors of the node are transient (e.g. I/O errors). Errors of transient
+    # nodes are not remembered, and the computation is retried with exponential backoff.
+    transient=False,
+    # Number of times that the computation of a transient node is retried.
+    retries=3,
+    # Seconds to wait before the first retry. It is doubled for each subsequent retry.
+    retry_backoff=0.1,
+    # Whether nodes derived from a node (e.g. node.attr, node[key], node + 1) should be
+    # reused when the same expression is requested again, instead of creating a new node.
+    intern_derived=False,
+    # Whether workflows should merge the nodes that compute exactly the same thing
+    # (same node class with the same inputs) when the workflow class is created.
+    merge_identical_nodes=False,
+    # Whether nodes of a workflow that don't depend on its inputs should be shared between
+    # all instances of the workflow, so that they are only computed once.
+    fold_constants=True,
+    # Whether instances of a workflow should share with the workflow class the nodes whose
+    # inputs have the same values, copying them only when their inputs are updated.
+    copy_on_write=False,
+    # Maximum number of nodes of a workflow that are computed at the same time. If None,
+    # the nodes of a workflow are computed one at a time.
+    max_workers=None,
+    # How the nodes of a workflow are computed concurrently when max_workers is set.
+    # Can be "thread" or "process" (each node function runs in its own process).
+    executor="thread",
+    # Directory where workflows persist the outputs of their nodes, so that a workflow
+    # that is ran again with the same inputs reuses them. If None, nothing is persisted.
+    checkpoint_dir=None,
+    # Whether the instances of a workflow should share the outputs of their nodes through
+    # the output cache of the workflow class, so that nodes that receive the same inputs
+    # in different instances are only computed once.
+    output_cache=False,
+    # Runner (e.g. nodify.runner.ProcessRunner) where node functions are ran. If None,
+    # they run in the current process.
+    runner=None,
+    # Scheduler (e.g. nodify.scheduler.ReactiveScheduler) that takes care of recomputing
+    # non-lazy nodes. If None, they recompute immediately when they are outdated.
+    scheduler=None,
+    # Seconds that FileNodes wait for a burst of file events to finish before
+    # checking whether the file has changed.
+    file_debounce=0.05,
+    # Whether FileNodes should compare the contents of the file (through a hash) to
+    # decide whether it has changed, instead of only the modification time and size.
+    file_hash=False,
 )
 
+
+class _TemporalState:
+    """Immutable snapshot of the temporal contexts that are currently active.
+
+    Parameters
+    ----------
+    keys:
+        Keys that are forced on all nodes.
+    map_overrides:
+        Keys that are forced on specific context dictionaries. They are stored
+        by the id of the dictionary that they override.
+    """
+
+    __slots__ = ("keys", "map_overrides")
+
+    def __init__(self, keys: ChainMap, map_overrides: Dict[int, ChainMap]):
+        self.keys = keys
+        self.map_overrides = map_overrides
+
+    def push(self, context_keys: dict) -> "_TemporalState":
+        """Returns a new state with some keys forced on all nodes."""
+        return _TemporalState(self.keys.new_child(context_keys), self.map_overrides)
+
+    def push_map(self, context_map: dict, context_keys: dict) -> "_TemporalState":
+        """Returns a new state with some keys forced on a specific context dictionary."""
+        map_overrides = self.map_overrides.copy()
+        previous = map_overrides.get(id(context_map), ChainMap())
+        map_overrides[id(context_map)] = previous.new_child(context_keys)
+        return _TemporalState(self.keys, map_overrides)
+
+
 # Temporal contexts stack. It should not be used directly by users, the aim of this
-# stack is to populate it when context managers are used. This is a chainmap and
-# not a simple dict because we might have nested context managers.
-_TEMPORAL_CONTEXTS = ChainMap()
+# stack is to populate it when context managers are used. It is stored in a context
+# variable, so that each thread and each asyncio task sees only the temporal contexts
+# that it has entered itself (or that were active when the task was created).
+_TEMPORAL_CONTEXTS: ContextVar[_TemporalState] = ContextVar(
+    "nodify_temporal_contexts", default=_TemporalState(ChainMap(), {})
+)
 
 
 class NodeContext(ChainMap):
@@ -36,6 +177,11 @@ class NodeContext(ChainMap):
     always in the first position of the chainmap. Since this is not a very nice
     thing to force on users, we use this class instead.
 
+    Resolved values are cached, so that looking up a key does not need to go
+    through all the maps every time. The cache is discarded whenever the global
+    context version changes, which happens on any modification of a context,
+    or when the active temporal contexts are not the ones the cache was built with.
+
     Keys:
         lazy: bool
             If `False`, nodes will automatically recompute if any of their inputs
@@ -43,23 +189,153 @@ class NodeContext(ChainMap):
         lazy_init: bool or None
             Whether the node should compute on initialization. If None, defaults to
             `lazy`.
+        timeout: float or None
+            Maximum number of seconds that the computation of a node can take.
+        isolate: bool
+            Whether the node function should run in a separate process that can
+            be killed when the computation is cancelled.
+        cache_errors: bool
+            Whether errors should be raised again without recomputing until the
+            inputs of the node change.
+        transient: bool
+            Whether errors are transient, in which case they are not cached and the
+            computation is retried (up to `retries` times, waiting `retry_backoff`
+            seconds before the first retry and doubling the wait each time).
+        intern_derived: bool
+            Whether asking twice for the same derived node (e.g. ``node.attr``,
+            ``node[key]`` or ``node + 1``) should return the same node.
+        merge_identical_nodes: bool
+            Whether workflow classes should merge their structurally identical
+            nodes when they are created. Merged nodes are removed from the
+            ``dryrun_nodes`` of the class.
+        fold_constants: bool
+            Whether nodes of a workflow that don't depend on its inputs should be
+            computed only once and shared between all instances of the workflow.
+        copy_on_write: bool
+            Whether workflow instances should use the nodes of the workflow class
+            for the computations whose inputs are the same, instead of copying them.
+            Nodes are copied when the inputs on which they depend are updated, and
+            when they are accessed through ``workflow.nodes``. Shared nodes are not
+            checkpointed nor cached by instances (see "checkpoint_dir" and
+            "output_cache"), since they are computed only once anyway.
+        max_workers: int or None
+            Maximum number of nodes of a workflow that are computed concurrently.
+            Nodes are computed by dependency levels. If None, workflows compute
+            their nodes one at a time.
+        executor: str
+            Either "thread" or "process". If "process", the function of each node that
+            a workflow computes concurrently runs in a separate process.
+        checkpoint_dir: str or None
+            Directory where workflow instances store the output of each of their
+            nodes, identified by the node key and a fingerprint of its inputs. Running
+            a workflow again with the same inputs loads the outputs from it.
+        output_cache: bool
+            Whether the instances of a workflow should store the outputs of their
+            nodes in the ``output_cache`` of the workflow class, identified by the
+            node key and a fingerprint of its inputs, and reuse them from there.
+        runner: ProcessRunner or None
+            If set, node functions run in the worker processes of the runner, and
+            workflows compute all their nodes that are ready at the same time.
+        scheduler: ReactiveScheduler or None
+            If set, non-lazy nodes are not recomputed immediately when they are
+            outdated. Instead, they are scheduled to be recomputed by it.
+        file_debounce: float
+            Seconds that file nodes wait for a burst of file events to finish before
+            checking if the file has changed.
+        file_hash: bool
+            Whether file nodes should compare the contents of the file to decide if
+            it has changed, so that rewriting the same contents has no effect.
         debug: bool
             Whether to print debugging information.
         debug_show_inputs:
             Whether to print the inputs of the node when debugging.
     """
 
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        # The cache is stored along with the context version and the temporal state
+        # for which it is valid. It is a single tuple so that it can be replaced atomically.
+        self._cache = (_CONTEXT_VERSION, None, {})
+        # Modifications of plain dictionaries (e.g. the ones passed by users to
+        # Node.from_func) can't be noticed, so contexts that have them are not cached.
+        self._cacheable = all(isinstance(m, _VersionedDict) for m in self.maps)
+
     def __getitem__(self, key: str):
-        if key in _TEMPORAL_CONTEXTS:
-            return _TEMPORAL_CONTEXTS[key]
-        else:
-            return super().__getitem__(key)
+        state = _TEMPORAL_CONTEXTS.get()
+        if not self._cacheable:
+            return self._resolve(key, state)
+
+        version = _CONTEXT_VERSION
+
+        cache_version, cache_state, cache = self._cache
+        if cache_version != version or cache_state is not state:
+            cache = {}
+            self._cache = (version, state, cache)
+
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        value = self._resolve(key, state)
+
+        cache[key] = value
+        return value
+
+    def _resolve(self, key: str, state: _TemporalState):
+        """Finds the value of a key, taking into account the temporal contexts."""
+        if key in state.keys:
+            return state.keys[key]
+
+        map_overrides = state.map_overrides
+        for mapping in self.maps:
+            if map_overrides:
+                overrides = map_overrides.get(id(mapping))
+                if overrides is not None and key in overrides:
+                    return overrides[key]
+            if key in mapping:
+                return mapping[key]
+
+        return self.__missing__(key)
+
+    # Modifications of the context must invalidate cached values.
+    def __setitem__(self, key: str, value: Any):
+        super().__setitem__(key, value)
+        _bump_context_version()
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        _bump_context_version()
+
+    def pop(self, key: str, *args):
+        value = super().pop(key, *args)
+        _bump_context_version()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        _bump_context_version()
+        return item
+
+    def clear(self):
+        super().clear()
+        _bump_context_version()
 
 
 @contextlib.contextmanager
 def temporal_context(context: Union[dict, ChainMap, None] = None, **context_keys: Any):
     """Sets a context temporarily (until the context manager is exited).
 
+    Temporal contexts are only seen by the thread (or asyncio task) that enters
+    them, so evaluating nodes concurrently with different temporal contexts is safe.
+    The context dictionaries are never modified.
+
+    As a consequence, temporal values are only seen through node contexts
+    (e.g. ``Workflow.context["lazy"]``). Reading the passed dictionary directly
+    inside the block (e.g. ``NODES_CONTEXT["lazy"]`` or ``context.maps[0]``) returns
+    the value that it had before entering the block. This is a change from
+    previous versions, where the dictionary was updated in place.
+
     Parameters
     ----------
     context: dict or ChainMap, optional
@@ -88,29 +364,20 @@ def temporal_context(context: Union[dict, ChainMap, None] = None, **context_keys
     >>>     # class overwrites the lazy behavior.
 
     """
-    if context is not None:
-        # We have to temporally update a context dictionary. We keep a copy of the
-        # original context so that we can restore it later.
-        old_context = {k: context[k] for k in context_keys}
-        context.update(context_keys)
-
-        def _restore():
-            # Restore the original context.
-            context.update(old_context)
+    state = _TEMPORAL_CONTEXTS.get()
 
+    if context is not None:
+        # The keys override the values of a specific context dictionary. For a
+        # ChainMap, that is the dictionary where its updates would be written.
+        context_map = context.maps[0] if isinstance(context, ChainMap) else context
+        new_state = state.push_map(context_map, context_keys)
     else:
         # Add this temporal context on top of the temporal contexts stack.
-        _TEMPORAL_CONTEXTS.maps.insert(0, context_keys)
-
-        def _restore():
-            # Remove the temporal context from the stack.
-            del _TEMPORAL_CONTEXTS.maps[0]
+        new_state = state.push(context_keys)
 
+    token = _TEMPORAL_CONTEXTS.set(new_state)
     # We have entered the context, execute whatever code is inside the "with" block.
     try:
         yield
-        _restore()
-    except Exception as e:
-        # The block has raised an exception, restore the context and re-raise.
-        _restore()
-        raise e
+    finally:
+        _TEMPORAL_CONTEXTS.reset(token)
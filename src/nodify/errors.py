@@ -11,6 +11,8 @@ class NodeCalcError(NodeError):
     def __init__(self, node, error, inputs):
         super().__init__(node, error)
         self._inputs = inputs
+        # Keep the original traceback, so that the error can be raised again.
+        self._traceback = error.__traceback__
 
     def __str__(self):
         return f"Couldn't generate an output for {self._node} with the current inputs."
@@ -24,3 +26,17 @@ class NodeInputError(NodeError):
     def __str__(self):
         # Should make this more specific
         return f"Some input is not right in {self._node} and could not be parsed"
+
+
+class NodeCancelledError(NodeError):
+    """The computation of a node was cancelled before it finished."""
+
+    def __str__(self):
+        return f"The computation of {self._node} was cancelled ({self._error})."
+
+
+class NodeTimeoutError(NodeCancelledError):
+    """The computation of a node took longer than its timeout."""
+
+    def __str__(self):
+        return f"The computation of {self._node} exceeded its timeout of {self._error} seconds."
@@ -0,0 +1,211 @@
+"""Process-wide cache for the contents of files read by node functions."""
+
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Set, Tuple, Union
+
+from ._env import get_env_variable, register_env_variable
+
+__all__ = ["FileContentCache", "FILE_CACHE", "read_bytes", "read_text", "read_mmap"]
+
+register_env_variable(
+    "NODIFY_FILE_CACHE_SIZE",
+    default=256 * 1024**2,
+    description="Maximum number of bytes of file contents kept in the file content cache.",
+    process=int,
+)
+
+
+def _stat_key(path: str) -> Tuple[str, int, int]:
+    """Returns the (path, mtime in ns, size) key that identifies the current contents of a file."""
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+class FileContentCache:
+    """Read-through cache of file contents, shared by all nodes.
+
+    Contents are stored by ``(path, mtime_ns, size)``, so a file that has been
+    modified is never served from the cache. Each read only needs an ``os.stat``
+    call when the contents are cached. If several threads ask for the same
+    contents at the same time, the file is read only once.
+
+    The least recently used contents are discarded when the cached files
+    take more than ``max_bytes``. Contents are also discarded when file nodes
+    detect that the file has changed.
+
+    Parameters
+    ----------
+    max_bytes:
+        Maximum total size (in bytes) of the cached files. If None, it is taken
+        from the "NODIFY_FILE_CACHE_SIZE" environment variable.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = get_env_variable("NODIFY_FILE_CACHE_SIZE")
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # Cached contents, from least to most recently used. The values
+        # are (contents, size in bytes).
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        # Keys of the cached contents of each path, so that the contents of a
+        # file can be discarded without looking at all the entries.
+        self._keys_by_path: Dict[str, Set[Hashable]] = {}
+        # Locks of the contents that are being read, so that they are read only once.
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, path: Union[str, Path], kind: Tuple, load) -> Any:
+        """Returns the cached contents of a file, loading them if needed.
+
+        Parameters
+        ----------
+        path:
+            The path of the file.
+        kind:
+            Identifies the way the contents are represented (e.g. text with
+            some encoding).
+        load:
+            Function that receives the path and returns the contents.
+        """
+        path = os.path.realpath(path)
+        key = (*_stat_key(path), *kind)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            # Another thread might have loaded the contents while we were waiting.
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0]
+                self.misses += 1
+
+            try:
+                contents = load(path)
+
+                # Don't cache the contents if the file changed while reading it.
+                if _stat_key(path) == key[:3]:
+                    self._store(key, contents, key[2])
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+        return contents
+
+    def _store(self, key: Hashable, contents: Any, size: int):
+        with self._lock:
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (contents, size)
+            self._keys_by_path.setdefault(key[0], set()).add(key)
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: Hashable):
+        """Removes an entry. Must be called with the lock held."""
+        _, size = self._entries.pop(key)
+        self.nbytes -= size
+
+        path_keys = self._keys_by_path[key[0]]
+        path_keys.discard(key)
+        if not path_keys:
+            del self._keys_by_path[key[0]]
+
+    def read_bytes(self, path: Union[str, Path]) -> bytes:
+        """Returns the contents of a file as bytes."""
+
+        def load(path):
+            with open(path, "rb") as f:
+                return f.read()
+
+        return self._get(path, ("bytes",), load)
+
+    def read_text(
+        self, path: Union[str, Path], encoding: str = "utf-8", errors: str = "strict"
+    ) -> str:
+        """Returns the contents of a file as text."""
+
+        def load(path):
+            with open(path, "r", encoding=encoding, errors=errors, newline=None) as f:
+                return f.read()
+
+        return self._get(path, ("text", encoding, errors), load)
+
+    def read_mmap(self, path: Union[str, Path]) -> memoryview:
+        """Returns a read only view of the file, mapped in memory.
+
+        The file is not read into memory, pages are loaded by the operating
+        system when they are accessed.
+        """
+
+        def load(path):
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    # Empty files can't be mapped.
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        return self._get(path, ("mmap",), load)
+
+    def invalidate(self, path: Union[str, Path, None] = None):
+        """Discards the cached contents of a file.
+
+        Parameters
+        ----------
+        path:
+            The path of the file. If None, all contents are discarded.
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._keys_by_path.clear()
+                self.nbytes = 0
+                return
+
+            path = os.path.realpath(path)
+            for key in list(self._keys_by_path.get(path, ())):
+                self._discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The cache shared by all nodes of the process.
+FILE_CACHE = FileContentCache()
+
+
+def read_bytes(path: Union[str, Path]) -> bytes:
+    """Returns the contents of a file as bytes, using the shared file cache."""
+    return FILE_CACHE.read_bytes(path)
+
+
+def read_text(
+    path: Union[str, Path], encoding: str = "utf-8", errors: str = "strict"
+) -> str:
+    """Returns the contents of a file as text, using the shared file cache."""
+    return FILE_CACHE.read_text(path, encoding=encoding, errors=errors)
+
+
+def read_mmap(path: Union[str, Path]) -> memoryview:
+    """Returns a read only memory mapped view of a file, using the shared file cache."""
+    return FILE_CACHE.read_mmap(path)
@@ -1,6 +1,17 @@
 from __future__ import annotations
 
+import contextvars
+import fnmatch
+import hashlib
+import heapq
+import itertools
+import os
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
 from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
 from warnings import warn
 
 try:
@@ -11,36 +22,524 @@ try:
 except ImportError:
     WATCHDOG_IMPORTED = False
 
-from .node import Node
+from ._env import get_env_variable, register_env_variable
+from .file_cache import FILE_CACHE
+from .node import Batch, Node
 
-if WATCHDOG_IMPORTED:
+register_env_variable(
+    "NODIFY_FILE_WATCH_BACKEND",
+    default="auto",
+    process=str,
+    description="Backend to detect changes in files: 'watchdog', 'polling' or 'auto' (watchdog if installed, polling otherwise).",
+)
 
-    class CallbackHandler(watchdog.events.PatternMatchingEventHandler):
-        def __init__(self, callback_obj, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-            self.callback_obj = callback_obj
+register_env_variable(
+    "NODIFY_FILE_POLL_INTERVAL",
+    default=1.0,
+    description="Seconds between scans of the watched files when using the polling backend.",
+    process=float,
+)
 
-        def _run_method(self, method_name, event):
-            if not hasattr(self.callback_obj, "matches_path"):
-                return
-            if not self.callback_obj.matches_path(event.src_path):
-                return
 
-            func = getattr(self.callback_obj, method_name, None)
-            if callable(func):
-                return func(event)
+def _normalize_path(path: Union[str, Path]) -> str:
+    """Normalizes a path so that all the ways of referring to a file give the same string."""
+    return os.path.normcase(os.path.realpath(path))
+
+
+if WATCHDOG_IMPORTED:
+
+    class _DispatchHandler(watchdog.events.FileSystemEventHandler):
+        """Forwards the events of the observer to the watch service."""
+
+        def __init__(self, service: FileWatchService):
+            super().__init__()
+            self.service = service
 
         def on_modified(self, event):
-            self._run_method("on_file_modified", event)
+            self.service.dispatch("on_file_modified", event)
 
         def on_created(self, event):
-            self._run_method("on_file_created", event)
+            self.service.dispatch("on_file_created", event)
 
         def on_moved(self, event):
-            self._run_method("on_file_moved", event)
+            self.service.dispatch("on_file_moved", event)
 
         def on_deleted(self, event):
-            self._run_method("on_file_deleted", event)
+            self.service.dispatch("on_file_deleted", event)
+
+
+class FileWatchService(ABC):
+    """Process-wide service that watches files for changes.
+
+    Files are watched by watching their directories. Each directory is watched
+    only once, and the watch is removed when no subscriber needs it anymore.
+    Events are dispatched to the subscribers of the path that changed by looking
+    them up in an index, without asking every subscriber.
+
+    Subscribers are objects (e.g. ``FileNode``) that implement any of the methods
+    ``on_file_modified``, ``on_file_created``, ``on_file_moved`` and ``on_file_deleted``.
+    They are held through weak references. It is also possible to subscribe to a
+    directory, to be notified about the changes of any file in it.
+
+    This is the base class, subclasses implement how directories are watched.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Watches of directories and the number of subscriptions that need them.
+        self._watches: Dict[str, list] = {}
+        # Subscribers of each (normalized) path, stored by id.
+        self._subscribers: Dict[str, weakref.WeakValueDictionary] = {}
+        # Subscribers to all the files of each (normalized) directory, stored by id.
+        self._directory_subscribers: Dict[str, weakref.WeakValueDictionary] = {}
+        # Finalizers that remove the subscriptions of garbage collected subscribers.
+        self._finalizers: Dict[tuple, weakref.finalize] = {}
+
+    @abstractmethod
+    def _watch_directory(self, directory: str) -> Any:
+        """Starts watching a directory, returning a handle for the watch."""
+        ...
+
+    @abstractmethod
+    def _unwatch_directory(self, directory: str, handle: Any):
+        """Stops watching a directory."""
+        ...
+
+    def subscribe(
+        self, path: Union[str, Path], subscriber: object, directory: bool = False
+    ) -> bool:
+        """Starts notifying a subscriber about the changes of a file.
+
+        Parameters
+        ----------
+        path:
+            The path of the file.
+        subscriber:
+            The object to notify.
+        directory:
+            Whether the path is a directory and the subscriber should be
+            notified about the changes of all the files inside it.
+
+        Returns
+        -------
+        bool
+            Whether the file is being watched. It can't be watched if
+            its directory does not exist.
+        """
+        path = _normalize_path(path)
+        key = (path, id(subscriber), directory)
+        index = self._directory_subscribers if directory else self._subscribers
+        directory = path if directory else os.path.dirname(path)
+
+        with self._lock:
+            if key in self._finalizers:
+                return True
+
+            if directory not in self._watches:
+                try:
+                    handle = self._watch_directory(directory)
+                except OSError as e:
+                    warn(f"Could not watch directory '{directory}': {e}")
+                    return False
+                self._watches[directory] = [handle, 0]
+            self._watches[directory][1] += 1
+
+            index.setdefault(path, weakref.WeakValueDictionary())[
+                id(subscriber)
+            ] = subscriber
+            self._finalizers[key] = weakref.finalize(
+                subscriber, self._remove_subscription, *key
+            )
+
+        return True
+
+    def unsubscribe(
+        self, path: Union[str, Path], subscriber: object, directory: bool = False
+    ):
+        """Stops notifying a subscriber about the changes of a file (or directory)."""
+        path = _normalize_path(path)
+        with self._lock:
+            finalizer = self._finalizers.get((path, id(subscriber), directory))
+            if finalizer is not None:
+                finalizer()
+
+    def _remove_subscription(self, path: str, subscriber_id: int, directory: bool):
+        with self._lock:
+            self._finalizers.pop((path, subscriber_id, directory), None)
+
+            index = self._directory_subscribers if directory else self._subscribers
+            subscribers = index.get(path)
+            if subscribers is not None:
+                subscribers.pop(subscriber_id, None)
+                if len(subscribers) == 0:
+                    del index[path]
+
+            directory = path if directory else os.path.dirname(path)
+            watch = self._watches.get(directory)
+            if watch is None:
+                return
+            watch[1] -= 1
+            if watch[1] <= 0:
+                del self._watches[directory]
+                try:
+                    self._unwatch_directory(directory, watch[0])
+                except (KeyError, OSError):
+                    pass
+
+    def subscribers(self, path: Union[str, Path]) -> List[object]:
+        """Returns the subscribers of a path, including those of its directory."""
+        path = _normalize_path(path)
+        with self._lock:
+            subscribers = {}
+            for index, key in (
+                (self._subscribers, path),
+                (self._directory_subscribers, os.path.dirname(path)),
+            ):
+                if key in index:
+                    subscribers.update(index[key].items())
+            return list(subscribers.values())
+
+    def dispatch(self, method_name: str, event):
+        """Notifies the subscribers of the paths involved in an event."""
+        paths = [event.src_path]
+        dest_path = getattr(event, "dest_path", None)
+        if dest_path:
+            paths.append(dest_path)
+
+        for path in paths:
+            for subscriber in self.subscribers(path):
+                func = getattr(subscriber, method_name, None)
+                if callable(func):
+                    func(event)
+
+
+class WatchdogWatchService(FileWatchService):
+    """File watch service that uses a single watchdog observer (and thread)."""
+
+    def __init__(self):
+        if not WATCHDOG_IMPORTED:
+            raise ImportError("watchdog is required to use WatchdogWatchService")
+
+        super().__init__()
+        self._observer = None
+        self._handler = None
+
+    def _watch_directory(self, directory: str):
+        if self._observer is None:
+            self._handler = _DispatchHandler(self)
+            self._observer = watchdog.observers.Observer()
+            self._observer.daemon = True
+            self._observer.start()
+
+        return self._observer.schedule(self._handler, directory)
+
+    def _unwatch_directory(self, directory: str, handle):
+        self._observer.unschedule(handle)
+
+
+class _PollingEvent:
+    """File event detected by polling, mimicking the events of watchdog."""
+
+    __slots__ = ("event_type", "src_path")
+
+    is_directory = False
+    dest_path = None
+
+    def __init__(self, event_type: str, src_path: str):
+        self.event_type = event_type
+        self.src_path = src_path
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}: event_type={self.event_type}, src_path={self.src_path!r}>"
+
+
+class PollingWatchService(FileWatchService):
+    """File watch service that periodically checks the state of the watched files.
+
+    This is useful where watchdog can't be used or is unreliable, e.g. in network
+    filesystems. A single background thread scans all the watched directories
+    every ``interval`` seconds, with one ``os.scandir`` call per directory. Files
+    are considered changed when their ``(st_mtime_ns, st_size, st_ino)`` changes.
+
+    Parameters
+    ----------
+    interval:
+        Seconds between scans. If None, it is taken from the
+        "NODIFY_FILE_POLL_INTERVAL" environment variable.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        super().__init__()
+
+        if interval is None:
+            interval = get_env_variable("NODIFY_FILE_POLL_INTERVAL")
+        self.interval = interval
+
+        # Last known state of the subscribed files of each directory, along
+        # with whether all the files of the directory were scanned.
+        self._snapshots: Dict[
+            str, Tuple[bool, Dict[str, Optional[Tuple[int, int, int]]]]
+        ] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _scan(
+        directory: str, paths: List[str], full: bool = False
+    ) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        """Returns the state of some files of a directory (None if they don't exist).
+
+        If ``full`` is True, the state of all the files in the directory is returned.
+        """
+        state = dict.fromkeys(paths)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    path = os.path.normcase(os.path.join(directory, entry.name))
+                    if not full and path not in state:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    state[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            # The directory might have been removed.
+            pass
+        return state
+
+    def _watch_directory(self, directory: str):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No such directory: '{directory}'")
+
+        # The snapshot is taken on the next scan, files that already
+        # exist must not be reported as created.
+        self._snapshots[directory] = None
+
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="nodify-file-polling", daemon=True
+            )
+            self._thread.start()
+
+        return directory
+
+    def _unwatch_directory(self, directory: str, handle):
+        self._snapshots.pop(directory, None)
+
+    def poll(self):
+        """Scans all the watched directories, dispatching events for the changed files."""
+        with self._lock:
+            paths_by_directory: Dict[str, List[str]] = {
+                directory: [] for directory in self._watches
+            }
+            for path in self._subscribers:
+                paths_by_directory.setdefault(os.path.dirname(path), []).append(path)
+            # Directories whose files must all be checked.
+            full_directories = set(self._directory_subscribers)
+
+        for directory, paths in paths_by_directory.items():
+            full = directory in full_directories
+            state = self._scan(directory, paths, full=full)
+
+            with self._lock:
+                if directory not in self._snapshots:
+                    # Stopped watching the directory while scanning.
+                    continue
+                previous = self._snapshots[directory]
+                self._snapshots[directory] = (full, state)
+
+            if previous is None:
+                # The first scan of a directory only records its state.
+                continue
+            previous_full, previous = previous
+
+            for path in {**previous, **state}:
+                if path not in previous and not previous_full:
+                    # Subscribed after the previous scan, nothing to compare with.
+                    continue
+                if path not in state and not full:
+                    # Not subscribed anymore.
+                    continue
+                old_signature = previous.get(path)
+                signature = state.get(path)
+                if old_signature == signature:
+                    continue
+                elif old_signature is None:
+                    self.dispatch("on_file_created", _PollingEvent("created", path))
+                elif signature is None:
+                    self.dispatch("on_file_deleted", _PollingEvent("deleted", path))
+                else:
+                    self.dispatch("on_file_modified", _PollingEvent("modified", path))
+
+    def _run(self):
+        self.poll()
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                warn(f"Error while polling files: {e!r}")
+
+    def stop(self):
+        """Stops the background scanner."""
+        self._stop.set()
+
+
+class _Debouncer:
+    """Calls functions once their key has not been triggered for some time.
+
+    All the calls are made from a single background thread.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Deadline, function and context in which to call it for each key.
+        self._pending: Dict[
+            Hashable, Tuple[float, Callable[[], None], contextvars.Context]
+        ] = {}
+        # Heap of (deadline, counter, key). It can contain outdated entries.
+        self._heap: list = []
+        self._counter = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def call(self, key: Hashable, delay: float, func: Callable[[], None]):
+        """Calls ``func`` after ``delay`` seconds without new calls with the same key.
+
+        The function is called in a copy of the current context.
+        """
+        deadline = time.monotonic() + delay
+        ctx = contextvars.copy_context()
+        with self._condition:
+            self._pending[key] = (deadline, func, ctx)
+            heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="nodify-debouncer", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+
+                    deadline, _, key = self._heap[0]
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        self._condition.wait(remaining)
+                        continue
+
+                    heapq.heappop(self._heap)
+                    pending = self._pending.get(key)
+                    # Only the entry with the latest deadline for the key is valid.
+                    if pending is not None and pending[0] == deadline:
+                        del self._pending[key]
+                        break
+
+            try:
+                pending[2].run(pending[1])
+            except Exception as e:
+                warn(f"Error while handling file change: {e!r}")
+            # Don't keep the function alive while waiting.
+            pending = None
+
+
+_DEBOUNCER = _Debouncer()
+
+
+def file_signature(path: Union[str, Path]) -> Optional[Tuple[int, int, int]]:
+    """Returns (modification time in ns, size, inode) of a file, or None if it doesn't exist.
+
+    The inode changes when the file is replaced by another one, e.g. on atomic saves.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def file_hash(path: Union[str, Path], chunk_size: int = 1 << 20) -> Optional[bytes]:
+    """Computes a hash of the contents of a file, reading it in chunks.
+
+    Returns None if the file can't be read.
+    """
+    hasher = hashlib.blake2b()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hasher.update(chunk)
+    except OSError:
+        return None
+    return hasher.digest()
+
+
+def scan_directory(
+    path: Union[str, Path], pattern: str = "*"
+) -> List[Tuple[str, Tuple[int, int, int]]]:
+    """Lists the files of a directory whose name matches a pattern, with their signature.
+
+    A single ``os.scandir`` call is used, so the cost does not grow with the number
+    of ``os.stat`` calls needed. Files are sorted by name. If the directory
+    doesn't exist, an empty list is returned.
+
+    Parameters
+    ----------
+    path:
+        The directory.
+    pattern:
+        Glob pattern (as in ``fnmatch``) that the names of the files must match.
+    """
+    files = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if not fnmatch.fnmatch(entry.name, pattern):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append(
+                    (entry.path, (stat.st_mtime_ns, stat.st_size, stat.st_ino))
+                )
+    except OSError:
+        return []
+
+    files.sort()
+    return files
+
+
+_WATCH_SERVICE: Optional[FileWatchService] = None
+_WATCH_SERVICE_LOCK = threading.Lock()
+
+
+def get_watch_service() -> FileWatchService:
+    """Returns the file watch service of the process, creating it if needed.
+
+    The backend is chosen with the "NODIFY_FILE_WATCH_BACKEND" environment variable.
+    """
+    global _WATCH_SERVICE
+    with _WATCH_SERVICE_LOCK:
+        if _WATCH_SERVICE is None:
+            backend = get_env_variable("NODIFY_FILE_WATCH_BACKEND")
+            if backend == "auto":
+                backend = "watchdog" if WATCHDOG_IMPORTED else "polling"
+
+            if backend == "watchdog":
+                _WATCH_SERVICE = WatchdogWatchService()
+            elif backend == "polling":
+                _WATCH_SERVICE = PollingWatchService()
+            else:
+                raise ValueError(f"Unknown file watch backend: '{backend}'")
+        return _WATCH_SERVICE
 
 
 class FileNode(Node):
@@ -52,8 +551,15 @@ class FileNode(Node):
     Therefore, if autoupdate is enabled at some point down the tree, an
     update will be triggered.
 
-    This node requires `watchdog` to be installed in order to be fully
-    functional. Otherwise, it will not fail but it won't do anything.
+    Changes are detected with `watchdog` if it is installed. Otherwise (or if the
+    "NODIFY_FILE_WATCH_BACKEND" environment variable is set to "polling") the
+    watched files are polled periodically.
+
+    Events that come in bursts (e.g. while an editor saves a file) are
+    debounced for ``file_debounce`` seconds (a context key). Then, the node
+    is only marked as outdated if the modification time or the size of the
+    file have changed. If the ``file_hash`` context key is True, the contents
+    are also compared, so that rewriting the same contents has no effect.
 
     Parameters
     ----------
@@ -118,34 +624,37 @@ class FileNode(Node):
 
     """
 
+    # The contents of the file can change without the inputs changing.
+    _volatile = True
+
+    # The path that is currently being watched.
+    _watched_path: Optional[str] = None
+    # Signature (mtime, size, inode) and content hash of the file the last time it was checked.
+    _file_signature: Optional[Tuple[int, int, int]] = None
+    _file_hash: Optional[bytes] = None
+
     def setup(self, *args, **kwargs):
         super().setup(*args, **kwargs)
 
         self._setup_observer()
 
     def _setup_observer(self):
-        """Sets up the watchdog observer."""
-        if not WATCHDOG_IMPORTED:
-            warn(
-                f"Watchdog is not installed. {self.__class__.__name__} will not be able to detect changes in files."
-            )
-        else:
-            # Watchdog watches directories so we should watch the parent
-            parent_path = Path(self.inputs["path"]).parent
+        """Subscribes to the changes of the file in the watch service."""
+        path = self.inputs["path"]
+        if get_watch_service().subscribe(path, self):
+            self._watched_path = path
 
-            self.observer = watchdog.observers.Observer()
-            handler = CallbackHandler(self)
-            self.observer.schedule(handler, parent_path)
-            self.observer.start()
+        # Store the current state of the file, to compare with it when it changes.
+        self._file_signature = file_signature(path)
+        self._file_hash = file_hash(path) if self.context["file_hash"] else None
 
     def _update_observer(self):
-        """Updates the observer to watch the (possibly) new path."""
-        if not WATCHDOG_IMPORTED:
-            return
+        """Updates the subscription to watch the (possibly) new path."""
+        if self._watched_path is not None:
+            get_watch_service().unsubscribe(self._watched_path, self)
+            self._watched_path = None
 
-        self.observer.unschedule_all()
-        parent_path = Path(self.inputs["path"]).parent
-        self.observer.schedule(CallbackHandler(self), parent_path)
+        self._setup_observer()
 
     # Methods to interact with the observer
     def matches_path(self, path: str):
@@ -164,6 +673,31 @@ class FileNode(Node):
         self.on_file_change(event)
 
     def on_file_change(self, event):
+        # Events come in bursts, wait until they stop before checking the file.
+        debounce = self.context["file_debounce"]
+        if debounce:
+            _DEBOUNCER.call(id(self), debounce, self._check_file_changed)
+        else:
+            self._check_file_changed()
+
+    def _check_file_changed(self):
+        """Marks the node as outdated if the file has really changed."""
+        path = self.inputs["path"]
+
+        signature = file_signature(path)
+        if signature is not None and signature == self._file_signature:
+            return
+        self._file_signature = signature
+        # Free the memory used by the old contents in the shared file cache.
+        FILE_CACHE.invalidate(path)
+
+        if self.context["file_hash"]:
+            content_hash = file_hash(path)
+            if content_hash is not None and content_hash == self._file_hash:
+                # Only the metadata has changed (e.g. the file has been touched).
+                return
+            self._file_hash = content_hash
+
         self._receive_outdated()
 
     def update_inputs(self, **inputs):
@@ -176,3 +710,84 @@ class FileNode(Node):
     @staticmethod
     def function(path: str) -> Path:
         return Path(path)
+
+
+class DirectoryNode(FileNode):
+    """Node that lists the files of a directory and updates when they change.
+
+    The output is a ``Batch`` with the paths of the files in the directory whose
+    name matches ``pattern``, sorted by name. Each item of the batch is identified
+    by the path and the modification time, size and inode of the file. Therefore,
+    when a node receives the batch, it only recomputes for the files that have been
+    added or have changed since its last computation, and reuses its outputs for
+    the rest of files.
+
+    The directory is watched in the same way that files are watched by ``FileNode``.
+    Subdirectories are not listed.
+
+    Parameters
+    ----------
+    path:
+        The directory.
+    pattern:
+        Glob pattern (as in ``fnmatch``) that the names of the files must match.
+
+    Examples
+    --------
+
+    >>> from nodify import Node
+    >>> from nodify.file_nodes import DirectoryNode
+    >>>
+    >>> @Node.from_func
+    >>> def read(path):
+    >>>     return path.read_text()
+    >>>
+    >>> files = DirectoryNode("data", pattern="*.txt")
+    >>> contents = read(files)
+    >>> # Returns a batch with the contents of each file. When a file is
+    >>> # added to the directory, only that file is read.
+    >>> contents.get()
+    """
+
+    # Names and signatures of the listed files the last time they were checked.
+    _directory_signature: Optional[List[Tuple[str, Tuple[int, int, int]]]] = None
+
+    def _setup_observer(self):
+        """Subscribes to the changes of the files of the directory."""
+        path = self.inputs["path"]
+        if get_watch_service().subscribe(path, self, directory=True):
+            self._watched_path = path
+
+        self._directory_signature = scan_directory(path, self.inputs["pattern"])
+
+    def _update_observer(self):
+        if self._watched_path is not None:
+            get_watch_service().unsubscribe(self._watched_path, self, directory=True)
+            self._watched_path = None
+
+        self._setup_observer()
+
+    def _check_file_changed(self):
+        """Marks the node as outdated if the listed files have really changed."""
+        signature = scan_directory(self.inputs["path"], self.inputs["pattern"])
+        if signature == self._directory_signature:
+            return
+
+        # Free the memory used by the old contents of the changed files.
+        current = set(signature)
+        for file in self._directory_signature or ():
+            if file not in current:
+                FILE_CACHE.invalidate(file[0])
+        self._directory_signature = signature
+
+        self._receive_outdated()
+
+    def update_inputs(self, **inputs):
+        super().update_inputs(**inputs)
+        if "pattern" in inputs and "path" not in inputs:
+            self._update_observer()
+
+    @staticmethod
+    def function(path: str, pattern: str = "*") -> Batch:
+        files = scan_directory(path, pattern)
+        return Batch.keyed(files, (Path(file_path) for file_path, _ in files))
@@ -1,30 +1,59 @@
 from __future__ import annotations
 
+import copy
 import inspect
 import itertools
 import logging
+import threading
+import time
+import weakref
 from collections import ChainMap
+from contextvars import ContextVar
 from io import StringIO
 from typing import (
+    TYPE_CHECKING,
     Any,
     Callable,
     Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
     List,
     Literal,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Type,
     Union,
 )
 
-from .context import NODES_CONTEXT, NodeContext
-from .errors import NodeCalcError, NodeError
+from .cancellation import _CURRENT_TOKEN, CancellationToken, run_isolated
+from .context import NODES_CONTEXT, NodeContext, _VersionedDict
+from .errors import NodeCalcError, NodeCancelledError, NodeError
 from .operators import OperatorsMixin
 from .registry import REGISTRY
 
+if TYPE_CHECKING:
+    from .checkpoint import CheckpointStore
+    from .output_cache import OutputCache
+
 __all__ = ["Node", "Batch", "Constant", "ConstantNode"]
 
+# Generations of the per item caches of batched computations. A new generation starts
+# whenever the inputs that are not batches change, so that keys of items computed with
+# different inputs never collide.
+_batch_generations = itertools.count()
+# Placeholder for batch inputs when comparing the rest of the inputs.
+_BATCH_PLACEHOLDER = object()
+
+# Ids of the nodes that have already been evaluated during the outermost ``Node.get``
+# call of the current thread (or asyncio task). Nodes used by several others are
+# then evaluated once, instead of once for each path that leads to them.
+_EVALUATED: ContextVar[Optional[Set[int]]] = ContextVar(
+    "nodify_evaluated_nodes", default=None
+)
+
 
 class _TimeFilter(logging.Filter):
     """A helper class to keep the last time a log was emitted.
@@ -55,6 +84,70 @@ class _TimeFilter(logging.Filter):
         return True
 
 
+def _same_value(a: Any, b: Any) -> bool:
+    """Checks whether two (non-node) values are the same."""
+    if a is b:
+        return True
+
+    if type(a) != type(b):
+        return False
+    try:
+        if a == b:
+            return True
+        return False
+    except:
+        return False
+
+
+# Types whose values can't be modified in place.
+_IMMUTABLE_TYPES = (
+    type(None),
+    bool,
+    int,
+    float,
+    complex,
+    str,
+    bytes,
+    range,
+    frozenset,
+    type(Ellipsis),
+)
+
+
+def _unshared_value(value: Any) -> Any:
+    """Returns a shared value in a form that can't modify the original when modified.
+
+    Immutable values are returned as they are, arrays (anything with ``view`` and
+    ``setflags``, e.g. numpy arrays) as read only views, which don't copy the data,
+    and other values as deep copies. Containers that only hold immutable values
+    are copied shallowly, which is much cheaper than a deep copy.
+    """
+    if isinstance(value, (_IMMUTABLE_TYPES, Node)):
+        return value
+    if isinstance(value, tuple) and all(isinstance(v, _IMMUTABLE_TYPES) for v in value):
+        return value
+    if type(value) is bytearray:
+        return value.copy()
+    if type(value) in (list, set) and all(
+        isinstance(v, _IMMUTABLE_TYPES) for v in value
+    ):
+        return value.copy()
+    if type(value) is dict and all(
+        isinstance(v, _IMMUTABLE_TYPES) for v in value.values()
+    ):
+        return value.copy()
+
+    if hasattr(value, "view") and hasattr(value, "setflags"):
+        view = value.view()
+        view.setflags(write=False)
+        return view
+
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return value
+
+
 class Node(OperatorsMixin):
     """Generic class for nodes.
 
@@ -78,7 +171,7 @@ class Node(OperatorsMixin):
     # Variable containing settings regarding how the node must behave.
     # As an example, the context contains whether a node should be lazily computed or not.
     _cls_context: Dict[str, Any]
-    context: NodeContext = NodeContext({}, NODES_CONTEXT)
+    context: NodeContext = NodeContext(_VersionedDict(), NODES_CONTEXT)
 
     # Keys for variadic arguments, if present.
     _args_inputs_key: Optional[str] = None
@@ -92,6 +185,12 @@ class Node(OperatorsMixin):
     _prev_evaluated_inputs: Dict[str, Any]
     # Variable containing the last method used to handle batches.
     _prev_batch_iter: Literal["zip", "product"] = "zip"
+    # Outputs of the last batched computation, stored by the keys of the items
+    # that produced them, along with the inputs that were not batches and the
+    # generation of the cache. Only used when all batch inputs have item keys.
+    _batch_cache: Optional[Dict[Hashable, Any]] = None
+    _batch_cache_inputs: Optional[Dict[str, Any]] = None
+    _batch_cache_generation: int = 0
 
     # Current output value of the node
     _output: Any = _blank
@@ -100,16 +199,37 @@ class Node(OperatorsMixin):
     _input_nodes: Dict[str, Node]
     # Nodes to which the output of this node is connected
     _output_links: List[Node]
+    # Nodes that are informed when this node is outdated, without being kept
+    # alive by it, stored by id (see ``_receive_weak_output_link``).
+    _weak_output_links: Optional[Dict[int, weakref.ref]] = None
+    # Interned nodes derived from this node (e.g. node.attr, node[key], node + 1)
+    # It is only used if the "intern_derived" context key is True.
+    _derived_nodes: Optional[Dict[Tuple, Node]] = None
 
     # Number of times the node has been updated.
     _nupdates: int
     # Whether the node's output is currently outdated.
     _outdated: bool
+    # Number of times that the node has been marked as outdated.
+    _invalidations: int
     # Whether the node has errored during the last execution
     # with the current inputs.
     _errored: bool
     # The error that was raised during the last execution
     _error: Optional[NodeError] = None
+    # The inputs with which the last execution failed (if it did).
+    _failed_inputs: Optional[Dict[str, Any]] = None
+
+    # Lock held while computing the output.
+    _lock: threading.RLock
+    # Token that can cancel the computation that is currently running (if any).
+    _cancellation_token: Optional[CancellationToken] = None
+    # Store where the outputs of the node are persisted, and the key of the node in it.
+    # Workflows set it on their nodes when the "checkpoint_dir" context key is set.
+    _checkpoint: Optional[Tuple[CheckpointStore, str]] = None
+    # Cache of outputs shared with other nodes, and the key of the node in it.
+    # Workflows set it on their nodes when the "output_cache" context key is True.
+    _output_cache: Optional[Tuple[OutputCache, str]] = None
 
     # Logs of the node's execution.
     _logger: logging.Logger
@@ -119,6 +239,17 @@ class Node(OperatorsMixin):
     # Contains the raw function of the node.
     function: Callable
 
+    # Whether the output of the node can change even if its inputs don't
+    # (e.g. because it reads a file). Volatile nodes are never assumed to be constant.
+    _volatile: bool = False
+    # Whether the function of the node must run in the current process, even if
+    # a runner is set in the context (e.g. because it is trivial or needs other nodes).
+    _run_locally: bool = False
+    # Keys (as in _input_nodes) of the inputs that are always evaluated when computing
+    # the node. If None, all inputs are. Nodes that only evaluate some inputs depending
+    # on the values of others (e.g. conditionals) only list the ones that don't.
+    _eager_inputs: Optional[FrozenSet[str]] = None
+
     # Method that can be implemented to return the syntax of the node.
     get_syntax: Optional[Callable[[Any], str]] = None
 
@@ -158,9 +289,13 @@ class Node(OperatorsMixin):
         self._nupdates = 0
 
         self._outdated = True
+        self._invalidations = 0
         self._errored = False
         self._error = None
 
+        # Lock that makes sure that only one thread computes the output at a time.
+        self._lock = threading.RLock()
+
         self._logger = logging.getLogger(f"{__name__}.{id(self)!s}")
         self._log_formatter = logging.Formatter(
             fmt="%(asctime)s | %(levelname)-8s :: %(message)s"
@@ -168,7 +303,7 @@ class Node(OperatorsMixin):
         self._log_filter = _TimeFilter()
         self.logs = ""
 
-        self.context = self.__class__.context.new_child({})
+        self.context = self.__class__.context.new_child(_VersionedDict())
 
     def __init_subclass__(cls):
         # Assign a context to this node class. This is a chainmap that will
@@ -180,7 +315,7 @@ class Node(OperatorsMixin):
                 base_contexts.append(base.context.maps[0])
 
         if not hasattr(cls, "_cls_context") or cls._cls_context is None:
-            cls._cls_context = {}
+            cls._cls_context = _VersionedDict()
 
         cls.context = NodeContext(cls._cls_context, *base_contexts, NODES_CONTEXT)
 
@@ -315,28 +450,28 @@ class Node(OperatorsMixin):
                 return True
 
         # As a last resort, check for inequalities in the inputs.
-        def _is_equal(prev, curr):
-            if prev is curr:
-                return True
+        return not self._same_inputs(self._prev_evaluated_inputs, evaluated_inputs)
 
-            if type(prev) != type(curr):
-                return False
-            try:
-                if prev == curr:
-                    return True
-                return False
-            except:
-                return False
+    @staticmethod
+    def _same_inputs(prev_inputs: Dict[str, Any], curr_inputs: Dict[str, Any]) -> bool:
+        """Checks whether two sets of evaluated inputs are the same.
 
-        for key in self._prev_evaluated_inputs:
-            # Get the previous and current values
-            prev = self._prev_evaluated_inputs[key]
-            curr = evaluated_inputs[key]
+        Parameters
+        ----------
+        prev_inputs : Dict[str, Any]
+            The first set of evaluated inputs.
+        curr_inputs : Dict[str, Any]
+            The second set of evaluated inputs.
+        """
 
-            if not _is_equal(prev, curr):
-                return True
+        if set(prev_inputs) != set(curr_inputs):
+            return False
 
-        return False
+        for key in prev_inputs:
+            if not _same_value(prev_inputs[key], curr_inputs[key]):
+                return False
+
+        return True
 
     def map_inputs(
         self,
@@ -510,15 +645,46 @@ class Node(OperatorsMixin):
         args_keys = list(args_batch_inputs.keys())
         args_iters = [v for v in args_batch_inputs.values()]
 
-        if self.context["batch_iter"] == "zip":
-            vals_iterator = zip(*iters, *args_iters)
-        elif self.context["batch_iter"] == "product":
-            vals_iterator = itertools.product(*iters, *args_iters)
+        batch_iter = self.context["batch_iter"]
+        if batch_iter == "zip":
+            combine = zip
+        elif batch_iter == "product":
+            combine = itertools.product
         else:
-            raise ValueError(f"Invalid batch_iter mode: {self.context['batch_iter']}")
+            raise ValueError(f"Invalid batch_iter mode: {batch_iter}")
+
+        vals_iterator = combine(*iters, *args_iters)
+
+        # If all batches identify their items with keys, the outputs of items that were
+        # already computed with the same (non batch) inputs can be reused. The output
+        # for a combination of items doesn't depend on the batch_iter mode.
+        item_keys = [batch.item_keys for batch in [*iters, *args_iters]]
+        cache = None
+        if not self._volatile and all(k is not None for k in item_keys):
+            other_inputs = self.map_inputs(
+                evaluated_inputs,
+                func=lambda v: _BATCH_PLACEHOLDER if isinstance(v, Batch) else v,
+                only_nodes=True,
+            )
+            if self._batch_cache is None or not self._same_inputs(
+                self._batch_cache_inputs, other_inputs
+            ):
+                self._batch_cache = {}
+                self._batch_cache_inputs = other_inputs
+                self._batch_cache_generation = next(_batch_generations)
+            cache = self._batch_cache
+            keys_iterator = combine(*item_keys)
 
         outputs = []
+        new_cache = {}
         for vals in vals_iterator:
+            if cache is not None:
+                item_key = next(keys_iterator)
+                if item_key in cache:
+                    outputs.append(cache[item_key])
+                    new_cache[item_key] = cache[item_key]
+                    continue
+
             inps = {**evaluated_inputs, **dict(zip(keys, vals[: len(iters)]))}
             if self._args_inputs_key is not None and len(args_batch_inputs) > 0:
                 args_vals = vals[len(iters) :]
@@ -532,81 +698,293 @@ class Node(OperatorsMixin):
                     inps[self._kwargs_inputs_key][k] = inps.pop(k)
 
             args, kwargs = self._sanitize_inputs(inps)
-            outputs.append(self.function(*args, **kwargs))
+            outputs.append(self._checkpointed_call(args, kwargs))
+
+            if cache is not None:
+                new_cache[item_key] = outputs[-1]
 
-        return Batch(*outputs)
+        if cache is None:
+            return Batch(*outputs)
+
+        # Only the items of the current batch are kept.
+        self._batch_cache = new_cache
+        generation = self._batch_cache_generation
+        return Batch.keyed(((generation, key) for key in new_cache), outputs)
 
     def get(self):
         """Returns the output of the node, possibly running the computation.
 
         The computation of the node is only performed if the output is outdated,
         otherwise this function just returns the stored output.
+
+        This method is thread safe. If several threads request the output of an
+        outdated node at the same time, the computation is only performed once
+        and all of them receive the same output.
+
+        Each node is evaluated at most once during a call, even if several nodes
+        upstream use it.
         """
+        evaluated = _EVALUATED.get()
+        if evaluated is not None and id(self) in evaluated and not self._outdated:
+            return self._output
+
         self._logger.setLevel(getattr(logging, self.context["log_level"].upper()))
 
         logs = logging.StreamHandler(StringIO())
         logs.addFilter(self._log_filter)
+        logs.setFormatter(self._log_formatter)
         self._logger.addHandler(logs)
 
-        logs.setFormatter(self._log_formatter)
+        evaluated_token = _EVALUATED.set(set()) if evaluated is None else None
+        try:
+            self._logger.debug("Getting output from node...")
+            self._logger.debug(f"Raw inputs: {self._inputs}")
+
+            evaluated_inputs = self._get_evaluated_inputs(self._inputs)
+
+            self._logger.debug(f"Evaluated inputs: {evaluated_inputs}")
+
+            while True:
+                # Checking whether the output is up to date does not require the lock,
+                # so that getting an already computed output is never blocked.
+                if self._outdated or self.is_output_outdated(evaluated_inputs):
+                    with self._lock:
+                        # Another thread might have computed the output while we were
+                        # waiting for the lock, in which case we don't need to compute it again.
+                        if self._outdated or self.is_output_outdated(evaluated_inputs):
+                            self._raise_cached_error(evaluated_inputs)
+                            try:
+                                self._compute(evaluated_inputs)
+                            except NodeCancelledError as e:
+                                if e._error != CancellationToken.INVALIDATED:
+                                    raise
+                                # The inputs changed during the computation, so we
+                                # start again with the new inputs.
+                                self._logger.info(
+                                    "Computation cancelled because inputs changed, restarting."
+                                )
+                                evaluated_inputs = self._get_evaluated_inputs(
+                                    self._inputs
+                                )
+                                continue
+                        else:
+                            self._logger.info(f"Output computed by another thread.")
+                else:
+                    self._logger.info(f"No need to evaluate")
+                break
 
-        self._logger.debug("Getting output from node...")
-        self._logger.debug(f"Raw inputs: {self._inputs}")
+            self._logger.debug(f"Output: {self._output}.")
+            _EVALUATED.get().add(id(self))
+        finally:
+            if evaluated_token is not None:
+                _EVALUATED.reset(evaluated_token)
+            self._logger.removeHandler(logs)
+            self.logs += logs.stream.getvalue()
+            logs.close()
 
-        evaluated_inputs = self._get_evaluated_inputs(self._inputs)
+        return self._output
 
-        self._logger.debug(f"Evaluated inputs: {evaluated_inputs}")
+    def _raise_cached_error(self, evaluated_inputs: Dict[str, Any]):
+        """Raises the error of the last computation if it failed with the same inputs.
 
-        if self._outdated or self.is_output_outdated(evaluated_inputs):
-            try:
-                # Check if there are batches
-                any_batch = [False]
+        This avoids running again a computation that is known to fail. The error
+        is forgotten as soon as the node is marked as outdated.
 
-                def _is_batch(node):
-                    result = isinstance(node, Batch)
-                    if result:
-                        any_batch[0] = True
-                    return result
+        Parameters
+        ----------
+        evaluated_inputs : Dict[str, Any]
+            The inputs of the node, already evaluated.
+        """
+        if self._failed_inputs is None or not self.context["cache_errors"]:
+            return
+        if not self._same_inputs(self._failed_inputs, evaluated_inputs):
+            return
 
-                is_batch_input = self.map_inputs(evaluated_inputs, _is_batch)
+        self._logger.info(
+            "Inputs have not changed since the last error, raising it again."
+        )
 
-                self._prev_batch_iter = self.context["batch_iter"]
-                # If there are batches, gather them and return a batch object
-                if any_batch[0]:
-                    output = self._handle_batch(evaluated_inputs, is_batch_input)
-                else:
-                    args, kwargs = self._sanitize_inputs(evaluated_inputs)
-                    output = self.function(*args, **kwargs)
+        error = self._error
+        if not self.context["raise_custom_errors"]:
+            error = error._error
+        raise error.with_traceback(self._error._traceback)
 
-                self._output = output
+    def _compute(self, evaluated_inputs: Dict[str, Any]):
+        """Runs the computation of the node and stores the output.
 
-                self._logger.info(f"Evaluated because inputs changed.")
-            except Exception as e:
-                self._logger.exception(e)
-                self.logs += logs.stream.getvalue()
-                logs.close()
+        This function is ONLY called by the get method, while holding the node's lock.
+
+        Parameters
+        ----------
+        evaluated_inputs : Dict[str, Any]
+            The inputs of the node, already evaluated.
+        """
+        # Keep track of invalidations, because the node might be marked as outdated
+        # (e.g. from another thread) while the computation is running.
+        invalidations = self._invalidations
+
+        # Create the token that allows cancelling this computation, and make it
+        # available to the node function through check_cancelled.
+        token = CancellationToken(self, timeout=self.context["timeout"])
+        self._cancellation_token = token
+        token_reset = _CURRENT_TOKEN.set(token)
+
+        try:
+            # Check if there are batches
+            any_batch = [False]
+
+            def _is_batch(node):
+                result = isinstance(node, Batch)
+                if result:
+                    any_batch[0] = True
+                return result
+
+            is_batch_input = self.map_inputs(evaluated_inputs, _is_batch)
+
+            self._prev_batch_iter = self.context["batch_iter"]
+            # If there are batches, gather them and return a batch object
+            if any_batch[0]:
+                output = self._handle_batch(evaluated_inputs, is_batch_input)
+            else:
+                args, kwargs = self._sanitize_inputs(evaluated_inputs)
+                output = self._checkpointed_call(args, kwargs)
+
+            self._output = output
+
+            self._logger.info(f"Evaluated because inputs changed.")
+        except NodeCancelledError as e:
+            self._logger.info(str(e))
+            # Cancellations due to outdated inputs are not errors, the computation
+            # will simply be restarted.
+            if e._error != CancellationToken.INVALIDATED:
                 self._errored = True
-                self._error = NodeCalcError(self, e, evaluated_inputs)
+                self._error = e
+            raise
+        except Exception as e:
+            self._logger.exception(e)
+            self._errored = True
+            self._error = NodeCalcError(self, e, evaluated_inputs)
+            # Remember the inputs that made the computation fail, so that we don't
+            # run it again with the same inputs. Transient errors are not remembered.
+            if not self.context["transient"]:
+                self._failed_inputs = evaluated_inputs
+
+            if self.context["raise_custom_errors"]:
+                raise self._error
+            else:
+                raise e
+        finally:
+            _CURRENT_TOKEN.reset(token_reset)
+            self._cancellation_token = None
+
+        self._nupdates += 1
+        self._prev_evaluated_inputs = evaluated_inputs
+        self._outdated = self._invalidations != invalidations
+        self._errored = False
+        self._error = None
+        self._failed_inputs = None
 
-                if self.context["raise_custom_errors"]:
-                    raise self._error
-                else:
-                    raise e
+    def _checkpointed_call(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """Calls the node's function, reusing a cached or checkpointed output if possible.
 
-            self._nupdates += 1
-            self._prev_evaluated_inputs = evaluated_inputs
-            self._outdated = False
-            self._errored = False
-            self._error = None
-        else:
-            self._logger.info(f"No need to evaluate")
+        Parameters
+        ----------
+        args : Tuple[Any, ...]
+            Positional arguments for the function.
+        kwargs : Dict[str, Any]
+            Keyword arguments for the function.
+        """
+        # The output of volatile nodes can't be identified by their inputs.
+        if self._volatile:
+            return self._call_function(args, kwargs)
 
-        self._logger.debug(f"Output: {self._output}.")
+        if self._output_cache is None:
+            return self._load_or_call(args, kwargs)
 
-        self.logs += logs.stream.getvalue()
-        logs.close()
+        cache, key = self._output_cache
+        output, hit = cache.call(
+            key, self.function, args, kwargs, call=self._load_or_call
+        )
+        if hit:
+            self._logger.info(f"Output taken from the shared output cache.")
+        return output
 
-        return self._output
+    def _load_or_call(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """Loads the output from the node's checkpoint if there is one, otherwise calls the function.
+
+        Parameters
+        ----------
+        args : Tuple[Any, ...]
+            Positional arguments for the function.
+        kwargs : Dict[str, Any]
+            Keyword arguments for the function.
+        """
+        if self._checkpoint is None:
+            return self._call_function(args, kwargs)
+
+        store, key = self._checkpoint
+        output, loaded = store.call(
+            key, self.function, args, kwargs, call=self._call_function
+        )
+        if loaded:
+            self._logger.info(f"Output loaded from checkpoint.")
+        return output
+
+    def _call_function(self, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """Calls the node's function, in a separate process if the node is isolated.
+
+        If the node is transient, failed calls are retried with exponential backoff.
+
+        Parameters
+        ----------
+        args : Tuple[Any, ...]
+            Positional arguments for the function.
+        kwargs : Dict[str, Any]
+            Keyword arguments for the function.
+        """
+        token = self._cancellation_token
+
+        retries = self.context["retries"] if self.context["transient"] else 0
+        attempt = 0
+        while True:
+            if token is not None:
+                token.check()
+
+            try:
+                runner = self.context["runner"]
+                if runner is not None and not self._run_locally:
+                    return runner.call(self.function, args, kwargs, token)
+                if self.context["isolate"]:
+                    return run_isolated(self.function, args, kwargs, token)
+                return self.function(*args, **kwargs)
+            except Exception as e:
+                if attempt >= retries:
+                    raise
+
+                delay = self.context["retry_backoff"] * 2**attempt
+                attempt += 1
+                self._logger.warning(
+                    f"Attempt {attempt} failed ({e!r}), retrying in {delay:.2f} seconds."
+                )
+                if token is not None:
+                    token.wait(delay)
+                else:
+                    time.sleep(delay)
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancels the computation of this node, if it is running.
+
+        Node functions only stop if they call ``check_cancelled`` or if the node
+        runs in a separate process (``isolate`` context key).
+
+        Parameters
+        ----------
+        reason : str, optional
+            The reason for the cancellation, which will be shown in the error.
+        """
+        token = self._cancellation_token
+        if token is not None:
+            token.cancel(reason)
 
     def get_tree(self):
         tree = {
@@ -761,14 +1139,69 @@ class Node(OperatorsMixin):
     def __getitem__(self, key):
         from .syntax_nodes import GetItemNode
 
-        return GetItemNode(obj=self, key=key)
+        return self._derived_node(GetItemNode, obj=self, key=key)
 
     def __getattr__(self, key):
         if key.startswith("_"):
             raise super().__getattr__(key)
         from .syntax_nodes import GetAttrNode
 
-        return GetAttrNode(obj=self, key=key)
+        return self._derived_node(GetAttrNode, obj=self, key=key)
+
+    def _derived_node(self, node_cls: Type[Node], **inputs) -> Node:
+        """Creates a node derived from this one, e.g. for ``node.attr`` or ``node + 1``.
+
+        If the "intern_derived" context key is True, asking twice for the same
+        derived node (same class and same inputs) returns the node that was
+        created the first time, instead of creating a new one.
+
+        Parameters
+        ----------
+        node_cls : Type[Node]
+            The class of the derived node.
+        **inputs :
+            The inputs of the derived node.
+        """
+        if not self.context["intern_derived"]:
+            return node_cls(**inputs)
+
+        # Nodes are identified by their id, other inputs by their value.
+        key = [node_cls]
+        for k, v in sorted(inputs.items()):
+            if isinstance(v, Node):
+                key.append((k, "node", id(v)))
+            else:
+                key.append((k, type(v), v))
+        key = tuple(key)
+
+        try:
+            hash(key)
+        except TypeError:
+            # Some input is not hashable, we can't intern the node.
+            return node_cls(**inputs)
+
+        if self._derived_nodes is None:
+            self._derived_nodes = {}
+
+        node = self._derived_nodes.get(key)
+        if node is not None:
+            # Make sure that the inputs of the node have not been modified
+            # since it was interned (and that ids have not been reused).
+            node_inputs = node._inputs
+            if all(
+                k in node_inputs
+                and (
+                    node_inputs[k] is v
+                    if isinstance(v, Node)
+                    else _same_value(node_inputs[k], v)
+                )
+                for k, v in inputs.items()
+            ):
+                return node
+
+        node = node_cls(**inputs)
+        self._derived_nodes[key] = node
+        return node
 
     def _update_connections(self, inputs):
         def _update(key, value):
@@ -833,6 +1266,18 @@ class Node(OperatorsMixin):
                 del self._output_links[i]
                 break
 
+    def _receive_weak_output_link(self, node):
+        """Informs a node when we are outdated, without keeping it alive.
+
+        The node is not connected to our output (e.g. it doesn't appear in
+        ``_output_links``), it is only informed until it is garbage collected.
+        """
+        if self._weak_output_links is None:
+            self._weak_output_links = {}
+        links = self._weak_output_links
+        key = id(node)
+        links[key] = weakref.ref(node, lambda _: links.pop(key, None))
+
     def _inform_outdated(self):
         """Informs nodes that are linked to our output that they are outdated.
 
@@ -842,10 +1287,31 @@ class Node(OperatorsMixin):
         for linked_node in self._output_links:
             linked_node._receive_outdated()
 
-    def _receive_outdated(self):
-        # Mark the node as outdated
+        if self._weak_output_links:
+            for ref in list(self._weak_output_links.values()):
+                linked_node = ref()
+                if linked_node is not None:
+                    linked_node._receive_outdated()
+
+    def _outdated_by_inputs(self) -> bool:
+        """Whether the node is outdated when some of its input nodes are outdated.
+
+        Nodes that don't use all their inputs (e.g. conditionals) can override it
+        to ignore changes in the inputs that they don't need.
+        """
+        return True
+
+    def _mark_outdated(self):
+        """Marks the node as outdated, without informing the nodes that use it."""
         self._outdated = True
+        self._invalidations += 1
+        self._failed_inputs = None
+        # If the output is being computed, it will be thrown away, so stop the computation.
+        self.cancel(CancellationToken.INVALIDATED)
         self._errored = False
+
+    def _receive_outdated(self):
+        self._mark_outdated()
         # If automatic recalculation is turned on, recalculate output
         self._maybe_autoupdate()
         # Inform to the nodes that use our input that they are outdated
@@ -853,9 +1319,16 @@ class Node(OperatorsMixin):
         self._inform_outdated()
 
     def _maybe_autoupdate(self):
-        """Makes this node recalculate its output if automatic recalculation is turned on"""
+        """Makes this node recalculate its output if automatic recalculation is turned on
+
+        If there is a scheduler in the context, the recalculation is left to it.
+        """
         if not self.context["lazy"]:
-            self.get()
+            scheduler = self.context["scheduler"]
+            if scheduler is None:
+                self.get()
+            else:
+                scheduler.schedule(self)
 
     def get_diagram_label(self):
         """Returns the label to be used in diagrams when displaying this node."""
@@ -869,6 +1342,32 @@ class Batch(Node):
     for each value in the batch.
     """
 
+    # Keys that identify each item of the batch (e.g. the path and modification time
+    # of a file). Nodes that receive a batch with item keys reuse their outputs
+    # for the items that they have already computed.
+    item_keys: Optional[Tuple[Hashable, ...]] = None
+
+    @classmethod
+    def keyed(cls, keys: Iterable[Hashable], items: Iterable[Any]) -> Batch:
+        """Creates a batch whose items are identified by keys.
+
+        Two items must have the same key only if they are the same value.
+
+        Parameters
+        ----------
+        keys:
+            The key of each item.
+        items:
+            The items of the batch.
+        """
+        batch = cls(*items)
+        batch.item_keys = tuple(keys)
+        if len(batch.item_keys) != len(batch._inputs.get("items", ())):
+            raise ValueError(
+                "There must be exactly one key for each item of the batch."
+            )
+        return batch
+
     @staticmethod
     def function(*items):
         return items
@@ -880,6 +1379,8 @@ class Batch(Node):
 class DummyInputValue(Node):
     """A dummy node that can be used as a placeholder for input values."""
 
+    _run_locally = True
+
     @property
     def input_key(self):
         return self._inputs["input_key"]
@@ -18,7 +18,7 @@ def _comparison_method(name):
     def func(self, other):
         from .syntax_nodes import CompareNode
 
-        return CompareNode(left=self, right=other, op=name)
+        return self._derived_node(CompareNode, left=self, right=other, op=name)
 
     func.__name__ = f"__{name}__"
     return func
@@ -30,14 +30,14 @@ def _binary_operation(name):
     def func(self, other):
         from .syntax_nodes import BinaryOperationNode
 
-        return BinaryOperationNode(left=self, op=name, right=other)
+        return self._derived_node(BinaryOperationNode, left=self, op=name, right=other)
 
     func.__name__ = f"__{name}__"
 
     def reflected_func(self, other):
         from .syntax_nodes import BinaryOperationNode
 
-        return BinaryOperationNode(left=other, op=name, right=self)
+        return self._derived_node(BinaryOperationNode, left=other, op=name, right=self)
 
     reflected_func.__name__ = f"__r{name}__"
 
@@ -50,7 +50,7 @@ def _unary_method(name):
     def func(self):
         from .syntax_nodes import UnaryOperationNode
 
-        return UnaryOperationNode(op=name, operand=self)
+        return self._derived_node(UnaryOperationNode, op=name, operand=self)
 
     func.__name__ = f"__{name}__"
     return func
@@ -0,0 +1,217 @@
+"""Optimization passes over graphs of nodes."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, Iterable, List, Set, Union
+
+from .node import DummyInputValue, Node
+
+__all__ = ["eliminate_common_subexpressions", "find_constant_nodes"]
+
+
+class _NodeRef:
+    """Placeholder for a node input when computing structural keys."""
+
+    __slots__ = ("node",)
+
+    def __init__(self, node: Node):
+        self.node = node
+
+
+def _hashable_value(value: Any) -> Hashable:
+    """Returns a hashable representation of an input value."""
+    if isinstance(value, _NodeRef):
+        return ("node", id(value.node))
+
+    key = ("value", type(value), value)
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable values can only be considered the same if they are the same object.
+        key = ("id", id(value))
+    return key
+
+
+def _topological_order(nodes: Iterable[Node]) -> List[Node]:
+    """Returns all nodes upstream of the given ones, with inputs before the nodes that use them."""
+    order = []
+    visited = set()
+
+    for root in nodes:
+        if id(root) in visited:
+            continue
+        stack = [(root, False)]
+        while stack:
+            node, inputs_done = stack.pop()
+            if inputs_done:
+                order.append(node)
+                continue
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+
+            stack.append((node, True))
+            # Reversed, so that inputs are visited in order.
+            for input_node in reversed(node._input_nodes.values()):
+                if id(input_node) not in visited:
+                    stack.append((input_node, False))
+
+    return order
+
+
+def _eager_nodes(nodes: Iterable[Node]) -> Set[int]:
+    """Returns the ids of the nodes that are always evaluated to compute the given ones.
+
+    These are the given nodes and, recursively, the inputs that they always
+    evaluate (see ``Node._eager_inputs``). Inputs that nodes only evaluate for
+    some values of other inputs (e.g. the branches of a conditional) are left out.
+    """
+    eager = set()
+    stack = []
+    for node in nodes:
+        if id(node) not in eager:
+            eager.add(id(node))
+            stack.append(node)
+
+    while stack:
+        node = stack.pop()
+        for key, input_node in node._input_nodes.items():
+            if node._eager_inputs is not None and key not in node._eager_inputs:
+                continue
+            if id(input_node) not in eager:
+                eager.add(id(input_node))
+                stack.append(input_node)
+
+    return eager
+
+
+def _structural_key(
+    node: Node, representatives: Dict[int, Node]
+) -> Union[Hashable, None]:
+    """Key that is equal for nodes that compute exactly the same thing.
+
+    Returns None if the node should never be merged with another one.
+    """
+    if isinstance(node, DummyInputValue):
+        return None
+
+    # Nodes with a context of their own may behave differently.
+    own_context = node.context.maps[0] if len(node.context.maps) > 0 else {}
+    context_key = tuple(sorted((k, _hashable_value(v)) for k, v in own_context.items()))
+
+    mapped = node.map_inputs(
+        node._inputs,
+        func=lambda input_node: _NodeRef(
+            representatives.get(id(input_node), input_node)
+        ),
+        only_nodes=True,
+    )
+
+    inputs_key = []
+    for k, v in sorted(mapped.items()):
+        if k == node._args_inputs_key:
+            v = tuple(_hashable_value(item) for item in v)
+        elif k == node._kwargs_inputs_key:
+            v = tuple(sorted((kw, _hashable_value(item)) for kw, item in v.items()))
+        else:
+            v = _hashable_value(v)
+        inputs_key.append((k, v))
+
+    return (type(node), tuple(inputs_key), context_key)
+
+
+def _replace_node(old: Node, new: Node):
+    """Makes all nodes that use the output of ``old`` use the output of ``new`` instead.
+
+    ``old`` is also disconnected from its inputs. Since both nodes compute the
+    same thing, nodes that used ``old`` are not marked as outdated.
+    """
+    for linked_node in list(old._output_links):
+        mapped = linked_node.map_inputs(
+            linked_node._inputs,
+            func=lambda input_node: new if input_node is old else input_node,
+            only_nodes=True,
+        )
+        linked_node._inputs.update(mapped)
+        linked_node._update_connections(linked_node._inputs)
+
+    for input_node in old._input_nodes.values():
+        input_node._receive_output_unlink(old)
+    old._input_nodes = {}
+
+
+def eliminate_common_subexpressions(nodes: Iterable[Node]) -> Dict[int, Node]:
+    """Merges nodes that are structurally identical.
+
+    Two nodes are structurally identical if they are of the same class, have the
+    same context and the same inputs, where input nodes are compared by identity
+    (after merging them). Since nodes are pure functions, such nodes always compute
+    the same output, so only one of them is needed.
+
+    All nodes upstream of ``nodes`` are considered. For each group of identical nodes,
+    the first one found is kept and the nodes that used the others are connected to
+    it instead. Removed nodes are disconnected from their inputs.
+
+    Parameters
+    ----------
+    nodes : Iterable[Node]
+        The nodes of the graph to optimize.
+
+    Returns
+    -------
+    Dict[int, Node]
+        Mapping from the id of each removed node to the node that replaces it.
+        Its length is the number of nodes that were removed.
+    """
+    representatives: Dict[int, Node] = {}
+    seen: Dict[Hashable, Node] = {}
+
+    for node in _topological_order(nodes):
+        key = _structural_key(node, representatives)
+        if key is None:
+            continue
+
+        kept = seen.setdefault(key, node)
+        if kept is not node:
+            _replace_node(node, kept)
+            representatives[id(node)] = kept
+
+    return representatives
+
+
+def find_constant_nodes(inputs: Iterable[Node], nodes: Iterable[Node]) -> Set[int]:
+    """Finds the nodes whose output will never change.
+
+    These are the nodes that don't depend on any of the given inputs, nor
+    on any volatile node (a node whose output can change even if its inputs
+    don't, e.g. a node that reads a file).
+
+    Parameters
+    ----------
+    inputs : Iterable[Node]
+        The nodes whose value can change, e.g. the inputs of a workflow.
+    nodes : Iterable[Node]
+        The nodes of the graph to analyze.
+
+    Returns
+    -------
+    Set[int]
+        The ids of the constant nodes.
+    """
+    order = _topological_order(nodes)
+
+    variable = {id(node) for node in inputs}
+    constant = set()
+    for node in order:
+        if id(node) in variable:
+            continue
+        if node._volatile or isinstance(node, DummyInputValue):
+            variable.add(id(node))
+        elif any(
+            id(input_node) in variable for input_node in node._input_nodes.values()
+        ):
+            variable.add(id(node))
+        else:
+            constant.add(id(node))
+
+    return constant
@@ -0,0 +1,188 @@
+"""In-memory cache of node outputs, shared by all the instances of a workflow class."""
+
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from ._env import get_env_variable, register_env_variable
+from .checkpoint import _function_id, fingerprint
+from .node import _unshared_value
+
+__all__ = ["OutputCache"]
+
+register_env_variable(
+    "NODIFY_OUTPUT_CACHE_SIZE",
+    default=512 * 1024**2,
+    description="Maximum number of bytes of node outputs kept in the output cache of each workflow class.",
+    process=int,
+)
+
+
+def _sizeof(obj: Any) -> int:
+    """Approximate size in bytes of an output.
+
+    Objects that report their size (e.g. numpy arrays, through ``nbytes``) are
+    measured accurately, for the rest ``sys.getsizeof`` is used.
+    """
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    try:
+        return sys.getsizeof(obj)
+    except TypeError:
+        return 0
+
+
+class OutputCache:
+    """Cache of node outputs, keyed by the node key and a fingerprint of its inputs.
+
+    Each workflow class has its own cache, which all its instances consult when
+    the "output_cache" context key is True. Instances that receive the same values
+    for some inputs then compute the nodes that only depend on them once.
+
+    Fingerprints are computed from the pickled function and inputs, so nodes with
+    inputs that can't be pickled are never cached. If several threads need the
+    same output at the same time, it is computed only once.
+
+    Since cached outputs are shared, callers receive them in a form that can't
+    modify the cached value: mutable outputs are copied, and arrays are received
+    as read only views (see ``nodify.node._unshared_value``).
+
+    The least recently used outputs are discarded when the cached outputs take
+    more than ``max_bytes`` (approximately), or when there are more than
+    ``max_entries`` of them.
+
+    Parameters
+    ----------
+    max_bytes:
+        Maximum total size (in bytes) of the cached outputs. If None, it is taken
+        from the "NODIFY_OUTPUT_CACHE_SIZE" environment variable.
+    max_entries:
+        Maximum number of cached outputs. If None, there is no limit.
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int] = None, max_entries: Optional[int] = None
+    ):
+        if max_bytes is None:
+            max_bytes = get_env_variable("NODIFY_OUTPUT_CACHE_SIZE")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # Cached outputs, from least to most recently used. The values
+        # are (output, size in bytes).
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        # Locks of the outputs that are being computed, so that they are computed only once.
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self.nbytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable) -> Tuple[Any, bool]:
+        """Returns the cached output (and whether it was found), must be called with the lock."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0], True
+        return None, False
+
+    def call(
+        self,
+        key: str,
+        function: Callable,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        call: Callable[[Tuple[Any, ...], Dict[str, Any]], Any],
+    ) -> Tuple[Any, bool]:
+        """Returns the output of a call, taking it from the cache if possible.
+
+        Parameters
+        ----------
+        key:
+            The key of the node.
+        function:
+            The function that is called, which is part of the fingerprint.
+        args, kwargs:
+            The arguments of the call.
+        call:
+            Function that performs the call if the output is not cached.
+
+        Returns
+        -------
+        output:
+            The output of the call, which can be modified without affecting the
+            cached one (unless it is an array, which can't be modified).
+        hit:
+            Whether the output was taken from the cache.
+        """
+        call_fingerprint = fingerprint(
+            _function_id(function), args, sorted(kwargs.items())
+        )
+        if call_fingerprint is None:
+            return call(args, kwargs), False
+        cache_key = (key, call_fingerprint)
+
+        with self._lock:
+            output, hit = self._lookup(cache_key)
+            if hit:
+                return _unshared_value(output), True
+            loading = self._loading.setdefault(cache_key, threading.Lock())
+
+        with loading:
+            # Another thread might have computed the output while we were waiting.
+            with self._lock:
+                output, hit = self._lookup(cache_key)
+                if hit:
+                    return _unshared_value(output), True
+                self.misses += 1
+
+            try:
+                output = call(args, kwargs)
+                self._store(cache_key, output)
+            finally:
+                with self._lock:
+                    self._loading.pop(cache_key, None)
+
+        return _unshared_value(output), False
+
+    def _store(self, key: Hashable, output: Any):
+        size = _sizeof(output)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (output, size)
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes or (
+                self.max_entries is not None and len(self._entries) > self.max_entries
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Hits, misses, number of entries and size in bytes of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+            }
+
+    def clear(self):
+        """Discards all the cached outputs and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
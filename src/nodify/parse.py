@@ -1,12 +1,23 @@
+from __future__ import annotations
+
 import ast
 import inspect
+import itertools
 import textwrap
 from types import FunctionType
-from typing import Any, Callable, Optional, Type, Union
+from typing import Any, Callable, List, Optional, Set, Tuple, Type, Union
 from warnings import warn
 
 from .node import ConstantNode, Node
-from .syntax_nodes import ConditionalExpressionNode, DictNode, ListNode, TupleNode
+from .syntax_nodes import (
+    BoolOpNode,
+    CompareNode,
+    ConditionalExpressionNode,
+    DictNode,
+    ListNode,
+    SwitchNode,
+    TupleNode,
+)
 
 __all__ = ["NodeConverter", "nodify_func", "nodify_code"]
 
@@ -46,6 +57,52 @@ class NodeConverter(ast.NodeTransformer):
         self.nodify_constant_assignments = nodify_constant_assignments
         self.remove_function_annotations = remove_function_annotations
 
+        # Counter to generate unique names for the subjects of match statements.
+        self._n_match_subjects = 0
+        # Names of the variables that have been bound by the statements visited so far.
+        self._bound_names: Set[str] = set()
+        # Ids of the if/match statements after which the function always returns.
+        self._terminal_statements: Set[int] = set()
+
+    @staticmethod
+    def _names_bound_by(node: ast.AST) -> Set[str]:
+        """Returns the names of the variables that a statement might bind.
+
+        Names bound inside nested functions, classes and comprehensions belong
+        to their own scope, so they are not included.
+        """
+        names = set()
+        nodes = [node]
+        while nodes:
+            child = nodes.pop()
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+                names.add(child.id)
+            elif isinstance(child, ast.alias):
+                names.add((child.asname or child.name).split(".")[0])
+            elif isinstance(
+                child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            ):
+                names.add(child.name)
+                continue
+            elif child is not node and isinstance(
+                child,
+                (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp),
+            ):
+                continue
+            nodes.extend(ast.iter_child_nodes(child))
+        return names
+
+    def visit(self, node: ast.AST) -> Any:
+        if not isinstance(node, ast.stmt):
+            return super().visit(node)
+
+        # Statements are visited in order, so this keeps track of the variables
+        # that are bound before each statement.
+        names = self._names_bound_by(node)
+        new_node = super().visit(node)
+        self._bound_names.update(names)
+        return new_node
+
     def visit_Call(self, node):
         """Converts some_module.some_attr(some_args) into Node.from_func(some_module.some_attr)(some_args)"""
         node2 = ast.Call(
@@ -98,20 +155,27 @@ class NodeConverter(ast.NodeTransformer):
         elif self.assign_fn is None:
             return self.generic_visit(node)
         else:
-            node.value = ast.Call(
+            return self._assign(node.targets[0].id, self.visit(node.value))
+
+    def _assign(self, var_name: str, value: ast.expr) -> ast.Assign:
+        """Assigns an (already transformed) value to a variable, passing it through assign_fn."""
+        if self.assign_fn is not None:
+            value = ast.Call(
                 func=ast.Name(id=self.assign_fn, ctx=ast.Load()),
                 args=[],
                 keywords=[
-                    ast.keyword(arg="value", value=self.visit(node.value)),
-                    ast.keyword(
-                        arg="var_name", value=ast.Constant(value=node.targets[0].id)
-                    ),
+                    ast.keyword(arg="value", value=value),
+                    ast.keyword(arg="var_name", value=ast.Constant(value=var_name)),
                 ],
             )
 
-            ast.fix_missing_locations(node.value)
+        new_node = ast.Assign(
+            targets=[ast.Name(id=var_name, ctx=ast.Store())], value=value
+        )
 
-            return node
+        ast.fix_missing_locations(new_node)
+
+        return new_node
 
     def visit_List(self, node):
         """Converts the list syntax into a call to the ListNode."""
@@ -179,6 +243,386 @@ class NodeConverter(ast.NodeTransformer):
 
         return new_node
 
+    def visit_BoolOp(self, node: ast.BoolOp) -> Any:
+        """Converts and/or expressions into a call to the BoolOpNode."""
+        new_node = ast.Call(
+            func=ast.Name(id="BoolOpNode", ctx=ast.Load()),
+            args=[
+                ast.Constant(value="and" if isinstance(node.op, ast.And) else "or"),
+                *[self.visit(value) for value in node.values],
+            ],
+            keywords=[],
+        )
+
+        ast.fix_missing_locations(new_node)
+
+        return new_node
+
+    @staticmethod
+    def _switch_target(bodies: List[List[ast.stmt]]) -> Optional[str]:
+        """Checks whether some branches of code can be converted into a SwitchNode.
+
+        This is only possible if the body of each branch is a single return statement,
+        or a single assignment to the same variable in all branches.
+
+        Returns
+        -------
+        "return" if all branches are returns, the name of the variable if all branches
+        are assignments to it, None otherwise.
+        """
+        if not all(len(body) == 1 for body in bodies):
+            return None
+        stmts = [body[0] for body in bodies]
+
+        if all(isinstance(stmt, ast.Return) for stmt in stmts):
+            return "return"
+
+        names = set()
+        for stmt in stmts:
+            if not (
+                isinstance(stmt, ast.Assign)
+                and len(stmt.targets) == 1
+                and isinstance(stmt.targets[0], ast.Name)
+            ):
+                return None
+            names.add(stmt.targets[0].id)
+
+        return names.pop() if len(names) == 1 else None
+
+    def _switch(
+        self,
+        target: str,
+        cases: List[Tuple[ast.AST, List[ast.stmt]]],
+        default: Optional[List[ast.stmt]],
+        transform_test: Callable[[ast.AST], ast.expr],
+        default_value: Optional[ast.expr] = None,
+    ) -> ast.stmt:
+        """Converts branches of code into a statement that uses a SwitchNode.
+
+        Parameters
+        ----------
+        target :
+            The output of ``_switch_target`` for these branches.
+        cases :
+            List of (test, body) for each branch.
+        default :
+            Body of the branch to take if no test is true, if any.
+        transform_test :
+            Function that converts the test of each branch into the transformed
+            expression that computes it.
+        default_value :
+            The (already transformed) value to use as the default, instead of the
+            one of ``default``.
+        """
+        args = []
+        for test, body in cases:
+            value = body[0].value
+            if value is None:
+                value = ast.Constant(value=None)
+            args.extend([transform_test(test), self.visit(value)])
+
+        if default_value is not None:
+            pass
+        elif default is not None:
+            default_value = default[0].value or ast.Constant(value=None)
+            default_value = self.visit(default_value)
+        elif target == "return":
+            # Not taking any branch means that the function returns None
+            # (the statement must be the last one of the function, see ``_can_switch``).
+            default_value = ast.Constant(value=None)
+        else:
+            # Not taking any branch means that the variable keeps its value
+            # (it must be bound before the statement, see ``_can_switch``).
+            default_value = ast.Name(id=target, ctx=ast.Load())
+
+        switch_call = ast.Call(
+            func=ast.Name(id="SwitchNode", ctx=ast.Load()),
+            args=args,
+            keywords=[ast.keyword(arg="default", value=default_value)],
+        )
+
+        if target == "return":
+            new_node = ast.Return(value=switch_call)
+        else:
+            new_node = self._assign(target, switch_call)
+
+        ast.fix_missing_locations(new_node)
+
+        return new_node
+
+    def _can_switch(
+        self, node: ast.stmt, target: Optional[str], has_default: bool
+    ) -> bool:
+        """Whether a statement whose branches have a ``_switch_target`` can become a SwitchNode.
+
+        Without a default branch, returns can only be converted if the function
+        returns after the statement, and assignments if the variable was already
+        bound before it. Otherwise, the statement is left as it is.
+        """
+        if target is None:
+            return False
+        if has_default:
+            return True
+        if target == "return":
+            return id(node) in self._terminal_statements
+        return target in self._bound_names
+
+    def _hoist_default(
+        self, used: List[ast.AST], default: Optional[List[ast.stmt]]
+    ) -> Optional[Tuple[List[ast.stmt], ast.expr]]:
+        """Splits a default branch with several statements that ends with a return.
+
+        The statements before the return only create nodes, which are lazy, so they
+        can be moved before the SwitchNode without computing anything. This is not
+        possible if they bind names that the tests or the other branches use.
+
+        Parameters
+        ----------
+        used :
+            The tests and bodies of the other branches.
+        default :
+            The body of the default branch.
+
+        Returns
+        -------
+        The transformed statements to place before the SwitchNode and the transformed
+        value to return by default, or None if the branch can't be split.
+        """
+        if (
+            default is None
+            or len(default) < 2
+            or not isinstance(default[-1], ast.Return)
+        ):
+            return None
+
+        bound = set()
+        for stmt in default[:-1]:
+            bound.update(self._names_bound_by(stmt))
+        for tree in used:
+            for child in ast.walk(tree):
+                if isinstance(child, ast.Name) and child.id in bound:
+                    return None
+
+        prefix = []
+        for stmt in default[:-1]:
+            new_stmt = self.visit(stmt)
+            if isinstance(new_stmt, list):
+                prefix.extend(new_stmt)
+            elif new_stmt is not None:
+                prefix.append(new_stmt)
+
+        value = default[-1].value or ast.Constant(value=None)
+        return prefix, self.visit(value)
+
+    def visit_If(self, node: ast.If) -> Any:
+        """Converts if/elif/else chains into a SwitchNode, if possible.
+
+        See ``_switch_target`` for the chains that can be converted.
+        """
+        # Flatten the elif chain.
+        branches = [node]
+        while len(branches[-1].orelse) == 1 and isinstance(
+            branches[-1].orelse[0], ast.If
+        ):
+            branches.append(branches[-1].orelse[0])
+        default = branches[-1].orelse or None
+
+        cases = [(branch.test, branch.body) for branch in branches]
+
+        bodies = [body for _, body in cases]
+        target = self._switch_target(bodies + ([default] if default else []))
+        if target is None and self._switch_target(bodies) == "return":
+            hoisted = self._hoist_default(
+                [branch.test for branch in branches] + [*itertools.chain(*bodies)],
+                default,
+            )
+            if hoisted is not None:
+                prefix, default_value = hoisted
+                switch = self._switch(
+                    "return",
+                    cases,
+                    None,
+                    transform_test=self.visit,
+                    default_value=default_value,
+                )
+                return [*prefix, switch]
+
+        if not self._can_switch(node, target, default is not None):
+            return self.generic_visit(node)
+
+        return self._switch(target, cases, default, transform_test=self.visit)
+
+    @staticmethod
+    def _is_literal_pattern(pattern: ast.pattern) -> bool:
+        """Whether a pattern of a match statement just compares with literals."""
+        if isinstance(pattern, ast.MatchOr):
+            return all(
+                isinstance(alternative, (ast.MatchValue, ast.MatchSingleton))
+                for alternative in pattern.patterns
+            )
+        return isinstance(pattern, (ast.MatchValue, ast.MatchSingleton))
+
+    def _match_test(self, subject: ast.expr, pattern: ast.pattern) -> ast.expr:
+        """Returns the test that checks whether the subject matches a literal pattern."""
+        if isinstance(pattern, ast.MatchOr):
+            values = [
+                alternative.value
+                for alternative in pattern.patterns
+                if isinstance(alternative, ast.MatchValue)
+            ]
+            # Singletons (None, True, False) are compared by identity, as python does.
+            tests = [
+                self._match_test(subject, alternative)
+                for alternative in pattern.patterns
+                if isinstance(alternative, ast.MatchSingleton)
+            ]
+            if values:
+                # Note that the operands of "contains" are (container, item)
+                contains = ast.Call(
+                    func=ast.Name(id="CompareNode", ctx=ast.Load()),
+                    args=[
+                        self.visit(ast.Tuple(elts=values, ctx=ast.Load())),
+                        ast.Constant(value="contains"),
+                        subject,
+                    ],
+                    keywords=[],
+                )
+                tests.insert(0, contains)
+            if len(tests) == 1:
+                return tests[0]
+            return ast.Call(
+                func=ast.Name(id="BoolOpNode", ctx=ast.Load()),
+                args=[ast.Constant(value="or"), *tests],
+                keywords=[],
+            )
+        elif isinstance(pattern, ast.MatchValue):
+            args = [subject, ast.Constant(value="eq"), self.visit(pattern.value)]
+        else:
+            args = [subject, ast.Constant(value="is_"), ast.Constant(pattern.value)]
+
+        return ast.Call(
+            func=ast.Name(id="CompareNode", ctx=ast.Load()),
+            args=args,
+            keywords=[],
+        )
+
+    def visit_Match(self, node: ast.Match) -> Any:
+        """Converts match statements into a SwitchNode, if possible.
+
+        Only literal patterns without guards are supported, optionally with a
+        wildcard (``case _:``) as the last case. The bodies of the cases must be
+        convertible as explained in ``_switch_target``.
+        """
+        match_cases = list(node.cases)
+        default = None
+        last_pattern = match_cases[-1].pattern
+        if (
+            isinstance(last_pattern, ast.MatchAs)
+            and last_pattern.pattern is None
+            and last_pattern.name is None
+            and match_cases[-1].guard is None
+        ):
+            default = match_cases.pop().body
+
+        if not all(
+            match_case.guard is None and self._is_literal_pattern(match_case.pattern)
+            for match_case in match_cases
+        ):
+            return self.generic_visit(node)
+
+        cases = [(match_case.pattern, match_case.body) for match_case in match_cases]
+
+        bodies = [body for _, body in cases]
+        target = self._switch_target(bodies + ([default] if default else []))
+        hoisted = None
+        if target is None and self._switch_target(bodies) == "return":
+            hoisted = self._hoist_default(
+                [node.subject, *itertools.chain(*bodies)], default
+            )
+            if hoisted is None:
+                return self.generic_visit(node)
+            target = "return"
+        elif not self._can_switch(node, target, default is not None):
+            return self.generic_visit(node)
+
+        prefix, default_value = hoisted if hoisted is not None else ([], None)
+
+        # The subject is assigned to a variable, so that it is computed only once.
+        subject_name = f"__match_subject_{self._n_match_subjects}"
+        self._n_match_subjects += 1
+        subject_assign = ast.Assign(
+            targets=[ast.Name(id=subject_name, ctx=ast.Store())],
+            value=self.visit(node.subject),
+        )
+        ast.fix_missing_locations(subject_assign)
+
+        subject = ast.Name(id=subject_name, ctx=ast.Load())
+        switch = self._switch(
+            target,
+            cases,
+            None if hoisted is not None else default,
+            transform_test=lambda pattern: self._match_test(subject, pattern),
+            default_value=default_value,
+        )
+
+        return [subject_assign, *prefix, switch]
+
+    def _fold_fallthrough_returns(self, body: List[ast.stmt]) -> List[ast.stmt]:
+        """Moves the statements that follow an if/match statement into its default branch.
+
+        E.g. ``if a: return b`` followed by ``return c`` is equivalent to
+        ``if a: return b else: return c``, which can then be converted into a
+        SwitchNode. This is only done when the last statement of all branches is
+        a return and there is no default branch, so that the meaning of the code
+        is not changed. If the remaining statements are not a single return, the
+        statement can't be converted, but it still has the same meaning.
+
+        If/match statements that end up being the last statement of the function
+        are registered as terminal.
+        """
+
+        def _always_returns(stmts):
+            return len(stmts) > 0 and isinstance(stmts[-1], ast.Return)
+
+        has_match = hasattr(ast, "Match")
+
+        for i, stmt in enumerate(body):
+            rest = body[i + 1 :]
+            if isinstance(stmt, ast.If):
+                last = stmt
+                branches = [stmt]
+                while len(last.orelse) == 1 and isinstance(last.orelse[0], ast.If):
+                    last = last.orelse[0]
+                    branches.append(last)
+                if len(last.orelse) == 0 and all(
+                    _always_returns(branch.body) for branch in branches
+                ):
+                    if len(rest) > 0:
+                        last.orelse = self._fold_fallthrough_returns(rest)
+                    self._terminal_statements.add(id(stmt))
+                    return body[: i + 1]
+            elif has_match and isinstance(stmt, ast.Match):
+                last_pattern = stmt.cases[-1].pattern
+                has_default = (
+                    isinstance(last_pattern, ast.MatchAs)
+                    and last_pattern.pattern is None
+                    and stmt.cases[-1].guard is None
+                )
+                if not has_default and all(
+                    _always_returns(case.body) for case in stmt.cases
+                ):
+                    if len(rest) > 0:
+                        stmt.cases.append(
+                            ast.match_case(
+                                pattern=ast.MatchAs(pattern=None, name=None),
+                                body=self._fold_fallthrough_returns(rest),
+                            )
+                        )
+                    self._terminal_statements.add(id(stmt))
+                    return body[: i + 1]
+
+        return body
+
     def visit_Constant(self, node: ast.Constant) -> Any:
         if self.nodify_constants:
             new_node = ast.Call(
@@ -211,7 +655,21 @@ class NodeConverter(ast.NodeTransformer):
 
             node.returns = None
 
-        return self.generic_visit(node)
+        # The function has its own scope, in which the arguments are bound
+        # before the body.
+        outer_bound_names = self._bound_names
+        self._bound_names = set()
+        for arg in [*node.args.posonlyargs, *node.args.args, *node.args.kwonlyargs]:
+            self._bound_names.add(arg.arg)
+        for arg in (node.args.vararg, node.args.kwarg):
+            if arg is not None:
+                self._bound_names.add(arg.arg)
+
+        try:
+            node.body = self._fold_fallthrough_returns(node.body)
+            return self.generic_visit(node)
+        finally:
+            self._bound_names = outer_bound_names
 
     # def visit_Compare(self, node: ast.Compare) -> Any:
     #     """Converts the comparison syntax into CompareNode call."""
@@ -365,8 +823,10 @@ def nodify_code(
             "TupleNode": TupleNode,
             "DictNode": DictNode,
             "ConditionalExpressionNode": ConditionalExpressionNode,
+            "SwitchNode": SwitchNode,
+            "BoolOpNode": BoolOpNode,
+            "CompareNode": CompareNode,
             "ConstantNode": ConstantNode,
-            # "CompareNode": CompareNode,
             **namespace,
         }
     )
@@ -0,0 +1,332 @@
+"""Execution of node functions in a pool of local worker processes."""
+
+from __future__ import annotations
+
+import contextvars
+import multiprocessing
+import pickle
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+from multiprocessing import resource_tracker, shared_memory
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .cancellation import CancellationToken
+    from .node import Node
+
+__all__ = ["ProcessRunner"]
+
+# Description of a buffer stored in shared memory: (name of the block, size in bytes).
+_BufferSpec = Tuple[str, int]
+
+
+def _dumps(obj: Any, threshold: int) -> Tuple[bytes, List[_BufferSpec]]:
+    """Pickles an object, moving the large buffers that it contains to shared memory.
+
+    Objects that support out-of-band buffers (pickle protocol 5), like numpy
+    arrays, don't have their data copied into the pickle. The caller owns the
+    created shared memory blocks.
+    """
+    blocks: List[shared_memory.SharedMemory] = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        view = buffer.raw()
+        if view.nbytes < threshold:
+            # Keep it in the pickle.
+            return True
+        shm = shared_memory.SharedMemory(create=True, size=max(view.nbytes, 1))
+        shm.buf[: view.nbytes] = view
+        blocks.append(shm)
+        return False
+
+    try:
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    except BaseException:
+        _release(blocks, unlink=True)
+        raise
+
+    specs = [(shm.name, shm.size) for shm in blocks]
+    for shm in blocks:
+        shm.close()
+    return data, specs
+
+
+def _attach(specs: List[_BufferSpec]) -> List[shared_memory.SharedMemory]:
+    return [shared_memory.SharedMemory(name=name) for name, _ in specs]
+
+
+def _unlink(specs: List[_BufferSpec]):
+    """Removes shared memory blocks, ignoring the ones that have already been removed."""
+    for name, _ in specs:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        _release([shm], unlink=True)
+
+
+def _release(blocks: List[shared_memory.SharedMemory], unlink: bool):
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            # Some object still uses the memory, it is released when the process exits.
+            pass
+        if unlink:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _run_task(
+    data: bytes, specs: List[_BufferSpec], threshold: int
+) -> Tuple[bytes, List[_BufferSpec]]:
+    """Runs a pickled call in a worker process, returning the pickled result."""
+    # The process that submitted the task unlinks the blocks of the inputs,
+    # and the blocks of the result once it has read them.
+    blocks = _attach(specs)
+    try:
+        buffers = [shm.buf[:size] for shm, (_, size) in zip(blocks, specs)]
+        function, args, kwargs = pickle.loads(data, buffers=buffers)
+        del buffers
+
+        result = function(*args, **kwargs)
+        del function, args, kwargs
+
+        result_data, result_specs = _dumps(result, threshold)
+        del result
+    finally:
+        _release(blocks, unlink=False)
+
+    return result_data, result_specs
+
+
+def _loads(data: bytes, specs: List[_BufferSpec]) -> Any:
+    """Unpickles a result, copying its buffers out of shared memory and unlinking them."""
+    blocks = _attach(specs)
+    try:
+        buffers = [bytearray(shm.buf[:size]) for shm, (_, size) in zip(blocks, specs)]
+        return pickle.loads(data, buffers=buffers)
+    finally:
+        _release(blocks, unlink=True)
+
+
+class ProcessRunner:
+    """Runs node functions in a pool of local worker processes.
+
+    When a runner is set as the "runner" key of the context of the nodes, node
+    functions are sent to the worker processes of the runner instead of running
+    in the current process. Workflows also compute all their nodes that are ready
+    (their inputs are computed) at the same time, so that independent nodes run
+    in different processes.
+
+    Workers take the next task from a single queue as soon as they are free, so
+    the load is balanced between them. Each task only contains the function of a
+    node and the values of its inputs. Large buffers (e.g. the data of numpy arrays)
+    are not pickled, they are passed through shared memory.
+
+    Functions that can't be pickled run in the current process. Otherwise, the
+    function, its inputs and its output must be picklable.
+
+    Parameters
+    ----------
+    max_workers:
+        Number of worker processes. If None, the number of CPUs is used.
+    start_method:
+        The multiprocessing start method ("fork", "spawn" or "forkserver"). If None,
+        the default one is used.
+    shm_threshold:
+        Buffers of at least this number of bytes are passed through shared memory.
+
+    Examples
+    --------
+
+    >>> from nodify import temporal_context
+    >>> from nodify.runner import ProcessRunner
+    >>>
+    >>> with ProcessRunner(max_workers=4) as runner:
+    >>>     with temporal_context(runner=runner):
+    >>>         my_workflow(a=2).get()
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        start_method: Optional[str] = None,
+        shm_threshold: int = 1 << 16,
+    ):
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        self.max_workers = max_workers
+        self.start_method = start_method
+        self.shm_threshold = shm_threshold
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Start the resource tracker before the workers, so that they share it.
+            # Otherwise, shared memory blocks that workers create or attach to would be
+            # considered leaked by their own tracker, even if this process unlinks them.
+            resource_tracker.ensure_running()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self._pool
+
+    def call(
+        self,
+        function: Callable,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+        token: Optional[CancellationToken] = None,
+        poll_interval: float = 0.05,
+    ) -> Any:
+        """Runs a function in a worker process and returns its output.
+
+        Parameters
+        ----------
+        function:
+            The function to run.
+        args:
+            Positional arguments for the function.
+        kwargs:
+            Keyword arguments for the function.
+        token:
+            The cancellation token of the computation. If it is cancelled, the
+            output is not waited for.
+        poll_interval:
+            How often (in seconds) the token is checked while waiting for the output.
+        """
+        try:
+            data, specs = _dumps((function, args, kwargs), self.shm_threshold)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return function(*args, **kwargs)
+
+        def release_inputs(future: Optional[Future]):
+            _unlink(specs)
+
+        def release_result(future: Future):
+            if not future.cancelled() and future.exception() is None:
+                _unlink(future.result()[1])
+
+        try:
+            future = self._get_pool().submit(_run_task, data, specs, self.shm_threshold)
+        except BaseException:
+            release_inputs(None)
+            raise
+        # Inputs are released as soon as the worker is done with them.
+        future.add_done_callback(release_inputs)
+
+        try:
+            while True:
+                if token is not None:
+                    token.check()
+                try:
+                    result_data, result_specs = future.result(timeout=poll_interval)
+                    break
+                except FutureTimeoutError:
+                    continue
+        except BaseException:
+            # Nobody will read the result.
+            if not future.cancel():
+                future.add_done_callback(release_result)
+            raise
+        finally:
+            # Done callbacks might run after the result is received, so
+            # release the inputs now if the worker doesn't need them anymore.
+            if future.done():
+                release_inputs(future)
+
+        return _loads(result_data, result_specs)
+
+    def compute(self, nodes: Sequence[Node]):
+        """Computes some nodes, running at the same time all the ones that are ready.
+
+        A node is ready when all its inputs that are in ``nodes`` have been computed.
+        Node outputs are stored in the nodes as if they had been computed with ``get``.
+
+        Nodes that the others only use for some values of their inputs (e.g. the
+        branches of a conditional, see ``Node._eager_inputs``) are not computed
+        in advance, they are computed if the nodes that use them need them.
+
+        Parameters
+        ----------
+        nodes:
+            The nodes to compute.
+        """
+        from .optimize import _eager_nodes
+
+        # Nodes that are not used by any of the others must be computed, and
+        # from them we find the rest of the nodes that are always needed.
+        used = {id(inp) for node in nodes for inp in node._input_nodes.values()}
+        eager = _eager_nodes(node for node in nodes if id(node) not in used)
+        nodes = [node for node in nodes if id(node) in eager]
+
+        ids = {id(node) for node in nodes}
+        # Number of inputs that each node is waiting for, and the nodes that use each node.
+        waiting: Dict[int, int] = {}
+        consumers: Dict[int, List[Node]] = {id(node): [] for node in nodes}
+        ready: List[Node] = []
+        for node in nodes:
+            inputs = {
+                id(inp): inp for inp in node._input_nodes.values() if id(inp) in ids
+            }
+            waiting[id(node)] = len(inputs)
+            for inp in inputs.values():
+                consumers[id(inp)].append(node)
+            if len(inputs) == 0:
+                ready.append(node)
+
+        def compute(node: Node):
+            if node._outdated or node._output is node._blank:
+                node.get()
+            return node
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="nodify-runner"
+        ) as threads:
+            running: Dict[Future, Node] = {}
+
+            def submit(node: Node):
+                # Each computation sees the temporal contexts of the caller.
+                future = threads.submit(contextvars.copy_context().run, compute, node)
+                running[future] = node
+
+            for node in ready:
+                submit(node)
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    if future.exception() is not None:
+                        # Don't start any other computation, and wait for the
+                        # running ones to finish before raising the error.
+                        wait(running)
+                        raise future.exception()
+
+                    for consumer in consumers[id(node)]:
+                        waiting[id(consumer)] -= 1
+                        if waiting[id(consumer)] == 0:
+                            submit(consumer)
+
+    def close(self):
+        """Shuts down the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "ProcessRunner":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,217 @@
+"""Scheduling of the recomputations of non-lazy nodes."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from typing import Dict, List, Literal, Optional, Tuple
+
+from .errors import NodeError
+from .node import Node
+from .optimize import _topological_order
+
+__all__ = ["ReactiveScheduler"]
+
+_logger = logging.getLogger(__name__)
+
+
+class ReactiveScheduler:
+    """Recomputes non-lazy nodes in batches, after their inputs have settled.
+
+    By default, a non-lazy node recomputes as soon as it is marked as outdated,
+    while the outdated signal is still being propagated. Therefore, a node with
+    two outdated ancestors can recompute twice, the first time with a view of the
+    graph that is only partly updated.
+
+    When a scheduler is set as the "scheduler" key of the context of the nodes,
+    outdated non-lazy nodes are instead collected by the scheduler. Once no new
+    node has been collected for ``debounce`` seconds, all collected nodes are
+    recomputed, each of them exactly once and in topological order.
+
+    Parameters
+    ----------
+    debounce:
+        Seconds to wait without new outdated nodes before recomputing.
+    backend:
+        Where the recomputations run. If "thread", they run on a background thread
+        owned by the scheduler. If "asyncio", they run on an asyncio event loop.
+    loop:
+        The event loop to use for the "asyncio" backend. If not provided, the
+        running loop when the scheduler is created is used. Recomputations are
+        run in the loop's default executor, so that they don't block the loop.
+
+    Examples
+    --------
+
+    >>> from nodify import NODES_CONTEXT
+    >>> from nodify.scheduler import ReactiveScheduler
+    >>>
+    >>> NODES_CONTEXT["scheduler"] = ReactiveScheduler(debounce=0.1)
+    """
+
+    def __init__(
+        self,
+        debounce: float = 0.05,
+        backend: Literal["thread", "asyncio"] = "thread",
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        if backend not in ("thread", "asyncio"):
+            raise ValueError(f"Unknown scheduler backend: {backend}")
+
+        self.debounce = debounce
+        self.backend = backend
+
+        # Nodes waiting to be recomputed, stored by id to keep them unique, with
+        # the context in which they were scheduled.
+        self._pending: Dict[int, Tuple[Node, contextvars.Context]] = {}
+        # Time at which the pending nodes should be recomputed.
+        self._deadline = 0.0
+        # Whether a flush is currently running.
+        self._flushing = False
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._thread: Optional[threading.Thread] = None
+
+        self._loop = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        if backend == "asyncio":
+            self._loop = loop if loop is not None else asyncio.get_running_loop()
+
+    def schedule(self, node: Node):
+        """Adds a node to the nodes that should be recomputed."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The scheduler has been closed.")
+
+            # Recomputations run in another thread, so they must see the context
+            # variables (e.g. temporal contexts) of the code that outdated the node.
+            self._pending[id(node)] = (node, contextvars.copy_context())
+            self._deadline = time.monotonic() + self.debounce
+
+            if self.backend == "thread":
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run_thread, name="nodify-scheduler", daemon=True
+                    )
+                    self._thread.start()
+                self._condition.notify_all()
+
+        if self.backend == "asyncio":
+            self._loop.call_soon_threadsafe(self._reset_timer)
+
+    def _take_pending(self) -> List[Tuple[Node, contextvars.Context]]:
+        """Returns the pending nodes in topological order, emptying the queue.
+
+        Each node is returned with the context in which it was scheduled.
+        Must be called with the condition's lock held.
+        """
+        pending = self._pending
+        self._pending = {}
+        nodes = _topological_order(node for node, _ in pending.values())
+        return [pending[id(node)] for node in nodes if id(node) in pending]
+
+    def flush(self):
+        """Recomputes all pending nodes now, in the calling thread."""
+        with self._condition:
+            nodes = self._take_pending()
+            self._flushing = True
+
+        try:
+            self._recompute(nodes)
+        finally:
+            with self._condition:
+                self._flushing = False
+                self._condition.notify_all()
+
+    def _recompute(self, nodes: List[Tuple[Node, contextvars.Context]]):
+        for node, ctx in nodes:
+            # The node might have been computed already if it is an input of
+            # another node of the batch.
+            if not node._outdated:
+                continue
+            try:
+                ctx.run(node.get)
+            except (Exception, NodeError) as e:
+                # Errors are already stored in the node, we just don't let them
+                # stop the recomputation of the other nodes.
+                _logger.debug(f"Scheduled recomputation of {node} failed: {e!r}")
+
+    def _run_thread(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                # Wait until no new nodes have arrived for the debounce time.
+                while True:
+                    remaining = self._deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return
+
+            self.flush()
+
+    def _reset_timer(self):
+        # Runs in the event loop.
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._loop.call_later(self.debounce, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        with self._condition:
+            remaining = self._deadline - time.monotonic()
+        if remaining > 0:
+            # New nodes arrived since the timer was set.
+            self._timer = self._loop.call_later(remaining, self._on_timer)
+            return
+        self._flush_task = self._loop.create_task(
+            self._flush_in_executor(self._flush_task)
+        )
+
+    async def _flush_in_executor(self, previous: Optional[asyncio.Task]):
+        # Runs in the event loop, the recomputations run in the executor.
+        if previous is not None:
+            # Batches are recomputed one after the other, as in the thread backend.
+            await asyncio.wait([previous])
+        ctx = contextvars.copy_context()
+        await self._loop.run_in_executor(None, ctx.run, self.flush)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until there are no pending nodes and no recomputation is running.
+
+        This can't be used from the event loop of the "asyncio" backend.
+
+        Parameters
+        ----------
+        timeout:
+            Maximum number of seconds to wait.
+
+        Returns
+        -------
+        bool
+            Whether the scheduler is idle.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._flushing, timeout
+            )
+
+    def close(self):
+        """Stops the scheduler. Pending nodes are not recomputed."""
+        with self._condition:
+            self._closed = True
+            self._pending = {}
+            self._condition.notify_all()
+
+        if self._timer is not None:
+            self._loop.call_soon_threadsafe(self._timer.cancel)
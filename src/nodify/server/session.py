@@ -9,6 +9,7 @@ from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 from nodify import ConstantNode, Node, Workflow, nodify_module
 from nodify.conversions import node_to_python_script, python_script_to_nodes
+from nodify.optimize import eliminate_common_subexpressions
 from nodify.utils import (
     traverse_tree_backward,
     traverse_tree_forward,
@@ -602,6 +603,55 @@ class Session:
 
         node.get()
 
+    def cancel_node(self, key: Union[str, int]):
+        """Cancels the computation of the node that corresponds to the given key.
+
+        Parameters
+        ----------
+        key : Union[str, int]
+            The key of the node. If it is a string, it will be interpreted as the name of the node.
+            If it is an integer, it will be interpreted as the ID of the node.
+
+        See Also
+        --------
+        get_node, Node.cancel
+        """
+        node = self.get_node(key)
+
+        node.cancel()
+
+    @updates("nodes")
+    def eliminate_common_subexpressions(self) -> int:
+        """Merges the nodes of the session that are structurally identical.
+
+        Removed nodes are also removed from the session, and their names are
+        kept as aliases of the node that replaces them.
+
+        Returns
+        -------
+        int
+            The number of nodes that were removed.
+
+        See Also
+        --------
+        nodify.optimize.eliminate_common_subexpressions
+        """
+        replaced = eliminate_common_subexpressions(
+            [node_info["node"] for node_info in self.nodes.values()]
+        )
+
+        for old_id, new_node in replaced.items():
+            old_info = self.nodes.pop(old_id, None)
+            if old_info is None:
+                continue
+
+            if id(new_node) not in self.nodes:
+                # The replacement was not in the session, it takes the place of the removed node.
+                self.nodes[id(new_node)] = {**old_info, "node": new_node}
+            self._name_to_id[old_info["name"]] = id(new_node)
+
+        return len(replaced)
+
     def get_compatible_following_nodes(
         self, node_key: Union[str, int], return_id: bool = False
     ) -> List[Union[Type[Node], int]]:
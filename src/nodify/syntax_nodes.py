@@ -1,5 +1,5 @@
 import operator
-from typing import Any, Dict, Literal
+from typing import Any, Dict, Literal, Optional, Set
 
 from .node import Node
 
@@ -8,6 +8,8 @@ __all__ = [
     "TupleNode",
     "DictNode",
     "ConditionalExpressionNode",
+    "SwitchNode",
+    "BoolOpNode",
     "CompareNode",
     "BinaryOperationNode",
     "UnaryOperationNode",
@@ -19,6 +21,8 @@ __all__ = [
 class ListNode(Node):
     """Creates a list"""
 
+    _run_locally = True
+
     @staticmethod
     def function(*items):
         return list(items)
@@ -28,6 +32,8 @@ class ListNode(Node):
 
 
 class TupleNode(Node):
+    _run_locally = True
+
     @staticmethod
     def function(*items):
         return tuple(items)
@@ -37,6 +43,8 @@ class TupleNode(Node):
 
 
 class DictNode(Node):
+    _run_locally = True
+
     @staticmethod
     def function(**items):
         return items
@@ -46,7 +54,9 @@ class DictNode(Node):
 
 
 class ConditionalExpressionNode(Node):
+    _run_locally = True
     _outdate_due_to_inputs: bool = False
+    _eager_inputs = frozenset({"test"})
 
     def get_syntax(self, test: bool, true: Any, false: Any):
         return f"{repr(true)} if {repr(test)} else {repr(false)}"
@@ -111,23 +121,25 @@ class ConditionalExpressionNode(Node):
             self._outdate_due_to_inputs = False
             raise
 
-    def _receive_outdated(self):
-        # Relevant inputs have been updated, mark this node as outdated.
-        if self._outdate_due_to_inputs:
-            return super()._receive_outdated()
-
+    def _outdated_by_inputs(self) -> bool:
         # We avoid marking this node as outdated if the outdated input
         # is not the one being returned.
         for k in self._input_nodes:
             if self._input_nodes[k]._outdated:
                 if k == "test":
-                    return super()._receive_outdated()
+                    return True
                 elif k == "true":
                     if self._prev_evaluated_inputs["test"]:
-                        return super()._receive_outdated()
+                        return True
                 elif k == "false":
                     if not self._prev_evaluated_inputs["test"]:
-                        return super()._receive_outdated()
+                        return True
+        return False
+
+    def _receive_outdated(self):
+        # Relevant inputs have been updated, mark this node as outdated.
+        if self._outdate_due_to_inputs or self._outdated_by_inputs():
+            return super()._receive_outdated()
 
     @staticmethod
     def function(test: bool, true: Any, false: Any):
@@ -138,10 +150,204 @@ class ConditionalExpressionNode(Node):
         return "if/else"
 
 
+class _LazyInputsNode(Node):
+    """Base class for nodes that only evaluate some of their inputs.
+
+    Subclasses must store, when evaluating the inputs, the keys (as in
+    ``_input_nodes``) of the inputs that they used in ``_used_input_keys``.
+    Changes in inputs that were not used in the last evaluation don't mark the
+    node as outdated.
+    """
+
+    # Keys (as in _input_nodes) of the inputs that were used in the last evaluation.
+    # If None, all inputs are considered to be used.
+    _used_input_keys: Optional[Set[str]] = None
+    _outdate_due_to_inputs: bool = False
+
+    def _evaluate_input(self, key: str, value: Any) -> Any:
+        """Evaluates an input, registering it as used."""
+        self._used_input_keys.add(key)
+        return self.evaluate_input_node(value) if isinstance(value, Node) else value
+
+    def update_inputs(self, **inputs):
+        # Updating the variadic inputs always outdates the node, while updating
+        # other inputs only does if they were used in the last evaluation. The flag
+        # is then used in _receive_outdated, which is called by super().update_inputs().
+        used = self._used_input_keys
+        self._outdate_due_to_inputs = (
+            used is None
+            or self._args_inputs_key in inputs
+            or any(k in used for k in inputs)
+        )
+
+        try:
+            super().update_inputs(**inputs)
+        finally:
+            self._outdate_due_to_inputs = False
+
+    def _outdated_by_inputs(self) -> bool:
+        # Only outdated input nodes that were used matter.
+        used = self._used_input_keys
+        return any(
+            input_node._outdated and (used is None or k in used)
+            for k, input_node in self._input_nodes.items()
+        )
+
+    def _receive_outdated(self):
+        # Relevant inputs have been updated, mark this node as outdated.
+        if self._outdate_due_to_inputs or self._outdated_by_inputs():
+            return super()._receive_outdated()
+
+
+class SwitchNode(_LazyInputsNode):
+    """Returns the value of the first case whose test is true.
+
+    Cases are passed as alternating tests and values, i.e.
+    ``SwitchNode(test1, value1, test2, value2, default=value3)`` is the
+    equivalent of an ``if/elif/else`` chain. Tests are evaluated in order,
+    and only the value of the case that is taken is evaluated.
+
+    Inputs that were not needed in the last evaluation don't mark the node as
+    outdated when they change.
+    """
+
+    _run_locally = True
+    _eager_inputs = frozenset({"cases[0]"})
+
+    def get_syntax(self, *cases: Any, default: Any = None):
+        syntax = repr(default)
+        for test, value in reversed(list(zip(cases[::2], cases[1::2]))):
+            syntax = f"{repr(value)} if {repr(test)} else {syntax}"
+        return syntax
+
+    def _get_evaluated_inputs(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate the inputs of this node.
+
+        Tests are evaluated until one of them is true, and then only the value
+        of that case is evaluated. Inputs that are not evaluated keep the value
+        of the previous evaluation, so that they don't count as changed.
+
+        Parameters
+        ----------
+        inputs : dict
+            The inputs to this node.
+        """
+        self._used_input_keys = set()
+        _evaluate = self._evaluate_input
+
+        cases = inputs.get("cases", ())
+        prev_cases = self._prev_evaluated_inputs.get("cases", ())
+        if len(prev_cases) == len(cases):
+            evaluated_cases = list(prev_cases)
+        else:
+            evaluated_cases = [None] * len(cases)
+
+        evaluated = {}
+
+        taken = False
+        for i in range(0, len(cases) - 1, 2):
+            evaluated_cases[i] = _evaluate(f"cases[{i}]", cases[i])
+            if evaluated_cases[i]:
+                evaluated_cases[i + 1] = _evaluate(f"cases[{i + 1}]", cases[i + 1])
+                taken = True
+                break
+        evaluated["cases"] = tuple(evaluated_cases)
+
+        if "default" in inputs:
+            if taken:
+                evaluated["default"] = self._prev_evaluated_inputs.get("default")
+            else:
+                evaluated["default"] = _evaluate("default", inputs["default"])
+
+        return evaluated
+
+    @staticmethod
+    def function(*cases: Any, default: Any = None):
+        if len(cases) % 2 != 0:
+            raise ValueError(
+                f"SwitchNode needs pairs of test and value, but {len(cases)} cases were given."
+            )
+
+        for i in range(0, len(cases), 2):
+            if cases[i]:
+                return cases[i + 1]
+        return default
+
+    def get_diagram_label(self):
+        """Returns the label to be used in diagrams when displaying this node."""
+        return "switch"
+
+
+_BoolOp = Literal["and", "or"]
+
+
+class BoolOpNode(_LazyInputsNode):
+    """Boolean operation (``and``/``or``) between values, with short-circuiting.
+
+    As in python, values are evaluated in order until the result is known, and
+    the last evaluated value is returned. Values that were not evaluated don't
+    mark the node as outdated when they change.
+    """
+
+    _run_locally = True
+    _eager_inputs = frozenset({"op", "values[0]"})
+
+    def get_syntax(self, op: _BoolOp, *values: Any):
+        if not isinstance(op, str):
+            raise ValueError(f"Invalid operator: {op}")
+        return f" {op} ".join(repr(value) for value in values)
+
+    def _get_evaluated_inputs(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Evaluate the inputs of this node, stopping as soon as the result is known.
+
+        Values that are not evaluated keep the value of the previous evaluation,
+        so that they don't count as changed.
+
+        Parameters
+        ----------
+        inputs : dict
+            The inputs to this node.
+        """
+        self._used_input_keys = set()
+
+        op = self._evaluate_input("op", inputs["op"])
+
+        values = inputs.get("values", ())
+        prev_values = self._prev_evaluated_inputs.get("values", ())
+        if len(prev_values) == len(values):
+            evaluated_values = list(prev_values)
+        else:
+            evaluated_values = [None] * len(values)
+
+        for i, value in enumerate(values):
+            evaluated_values[i] = self._evaluate_input(f"values[{i}]", value)
+            if bool(evaluated_values[i]) == (op == "or"):
+                break
+
+        return {"op": op, "values": tuple(evaluated_values)}
+
+    @staticmethod
+    def function(op: _BoolOp, *values: Any):
+        if op not in ("and", "or"):
+            raise ValueError(f"Invalid operator: {op}")
+        if len(values) == 0:
+            raise ValueError("BoolOpNode needs at least one value.")
+
+        for value in values[:-1]:
+            if bool(value) == (op == "or"):
+                return value
+        return values[-1]
+
+    def get_diagram_label(self):
+        """Returns the label to be used in diagrams when displaying this node."""
+        return self._prev_evaluated_inputs.get("op")
+
+
 _CompareOp = Literal["eq", "ne", "gt", "lt", "ge", "le", "is_", "is_not", "contains"]
 
 
 class CompareNode(Node):
+    _run_locally = True
     _op_to_symbol = {
         "eq": "==",
         "ne": "!=",
@@ -186,6 +392,7 @@ _BynaryOp = Literal[
 
 
 class BinaryOperationNode(Node):
+    _run_locally = True
 
     _op_to_symbol = {
         "add": "+",
@@ -220,6 +427,7 @@ _UnaryOp = Literal["invert", "neg", "pos"]
 
 
 class UnaryOperationNode(Node):
+    _run_locally = True
     _op_to_symbol = {
         "invert": "~",
         "neg": "-",
@@ -241,6 +449,8 @@ class UnaryOperationNode(Node):
 
 
 class GetItemNode(Node):
+    _run_locally = True
+
     @staticmethod
     def function(obj: Any, key: Any):
         return obj[key]
@@ -250,6 +460,8 @@ class GetItemNode(Node):
 
 
 class GetAttrNode(Node):
+    _run_locally = True
+
     @staticmethod
     def function(obj: Any, key: str):
         return getattr(obj, key)
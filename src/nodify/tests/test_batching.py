@@ -98,4 +98,40 @@ def test_multiple_batches(some_func):
         assert list(result.get()) == [6, 9, 9, 12]
 
 
+def test_keyed_batch_reuses_items():
+    calls = []
+
+    @Node.from_func
+    def scale(value, factor=1):
+        calls.append(value)
+        return value * factor
+
+    @Node.from_func
+    def add_one(value):
+        calls.append(value)
+        return value + 1
+
+    batch = Batch.keyed(["a", "b"], [1, 2])
+    scaled = scale(batch, factor=2)
+    result = add_one(scaled)
+
+    assert list(result.get()) == [3, 5]
+    assert calls == [1, 2, 2, 4]
+
+    # Only the new item is computed, in all the nodes downstream.
+    calls.clear()
+    scaled.update_inputs(value=Batch.keyed(["a", "b", "c"], [1, 2, 3]))
+    assert list(result.get()) == [3, 5, 7]
+    assert calls == [3, 6]
+
+    # If other inputs change, all items are computed again.
+    calls.clear()
+    scaled.update_inputs(factor=3)
+    assert list(result.get()) == [4, 7, 10]
+    assert calls == [1, 2, 3, 3, 6, 9]
+
+    with pytest.raises(ValueError):
+        Batch.keyed(["a"], [1, 2])
+
+
 # Implement batch.apply(). Or more generally node.apply(func, key, *args, **kwargs)
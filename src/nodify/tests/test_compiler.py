@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import pytest
+
+from nodify import Node, Workflow
+from nodify.compiler import compile_node
+from nodify.node import Batch, ConstantNode
+from nodify.syntax_nodes import BoolOpNode, ConditionalExpressionNode, SwitchNode
+from nodify.workflow import WorkflowInput
+
+
+@Node.from_func
+def args_function(*args, kwarg=None):
+    return tuple(args) if args else kwarg
+
+
+@Node.from_func
+def kwargs_function(a=None, **kwargs):
+    return kwargs if kwargs else a
+
+
+def test_compile_node_tree():
+    a = ConstantNode(2)
+    b = args_function(a, 3, kwarg=4)
+    c = kwargs_function(a=b, c=a, d=ConstantNode({"x": 1}))
+    output = c["d"]["x"] + a
+
+    compiled = compile_node(output)
+
+    assert compiled() == output.get()
+    assert hasattr(compiled, "__nodify_source__")
+
+
+def test_compile_shared_nodes():
+    calls = []
+
+    @Node.from_func
+    def expensive(a):
+        calls.append(a)
+        return a * 2
+
+    shared = expensive(3)
+    output = args_function(shared, shared)
+
+    compiled = compile_node(output)
+
+    assert compiled() == (6, 6)
+    # The shared node must be computed only once.
+    assert calls == [3]
+
+
+def test_compile_inputs_are_parameters():
+    a = WorkflowInput(input_key="a", value=Node._blank)
+    b = WorkflowInput(input_key="b", value=3)
+    output = args_function(a, b)
+
+    compiled = compile_node(output)
+
+    assert compiled(a=1) == (1, 3)
+    assert compiled(a=1, b=5) == (1, 5)
+    with pytest.raises(TypeError):
+        compiled(1)
+
+
+def test_compile_conditional_only_takes_branch():
+    @Node.from_func
+    def fail():
+        raise ValueError("This branch should not be computed.")
+
+    node = ConditionalExpressionNode(test=True, true=ConstantNode(1), false=fail())
+
+    assert compile_node(node)() == node.get() == 1
+
+
+def test_compile_batch_not_supported():
+    with pytest.raises(NotImplementedError):
+        compile_node(Batch(1, 2) + 1)
+
+    a = WorkflowInput(input_key="a", value=Node._blank)
+    compiled = compile_node(a + 1)
+    assert compiled(a=1) == 2
+    with pytest.raises(NotImplementedError):
+        compiled(a=Batch(1, 2))
+
+
+def test_compile_workflow():
+    def my_sum(a, b):
+        return a + b
+
+    with pytest.warns():
+
+        @Workflow.from_func
+        def triple_sum(a, b, c=3):
+            first_sum = my_sum(a, b)
+            return my_sum(first_sum, c)
+
+    compiled = compile_node(triple_sum)
+
+    assert compiled(1, 2) == triple_sum(1, 2).get() == 6
+    assert compiled(1, 2, c=5) == triple_sum(1, 2, c=5).get() == 8
+    # Compiled functions of workflow classes are cached.
+    assert compile_node(triple_sum) is compiled
+
+    def multiply(a, b):
+        return a * b
+
+    with pytest.warns():
+
+        @Workflow.from_func
+        def nested(a, b, c):
+            return multiply(triple_sum(a, b, c), b)
+
+    assert compile_node(nested)(1, 2, 3) == nested(1, 2, 3).get() == 12
+
+
+def test_compile_switch_only_takes_case():
+    @Node.from_func
+    def fail():
+        raise ValueError("This case should not be computed.")
+
+    a = WorkflowInput(input_key="a", value=Node._blank)
+    node = SwitchNode(a == 1, fail(), a == 2, ConstantNode(2), fail(), 3, default=4)
+
+    compiled = compile_node(node)
+
+    assert compiled(a=2) == 2
+    with pytest.raises(ValueError):
+        compiled(a=3)
+
+
+def test_compile_bool_op_short_circuits():
+    @Node.from_func
+    def fail():
+        raise ValueError("This value should not be computed.")
+
+    a = WorkflowInput(input_key="a", value=Node._blank)
+
+    assert compile_node(BoolOpNode("and", a, fail()))(a=0) == 0
+    assert compile_node(BoolOpNode("or", a, fail()))(a=3) == 3
+    assert compile_node(BoolOpNode("or", a, 0, 5))(a=0) == 5
+
+
+def test_compile_long_chains():
+    a = WorkflowInput(input_key="a", value=Node._blank)
+
+    # More cases than nested blocks python can compile.
+    cases = []
+    for i in range(150):
+        cases.extend([a == i, ConstantNode(i * 2)])
+    switch = SwitchNode(*cases, default=-1)
+    bool_op = BoolOpNode("and", *[a + i for i in range(150)])
+
+    compiled_switch = compile_node(switch)
+    assert compiled_switch(a=120) == 240
+    assert compiled_switch(a=200) == -1
+
+    compiled_bool_op = compile_node(bool_op)
+    assert compiled_bool_op(a=1) == 150
+    assert compiled_bool_op(a=-3) == 0
@@ -3,7 +3,7 @@ from __future__ import annotations
 import pytest
 
 from nodify import Node, Workflow
-from nodify.context import temporal_context
+from nodify.context import NODES_CONTEXT, NodeContext, temporal_context
 
 
 def test_node():
@@ -123,3 +123,126 @@ def test_default_context(lazy_init):
     assert my_alert._nupdates == init_nupdates
     val.update_inputs(val=2)
     assert my_alert._nupdates == init_nupdates + 1
+
+
+def test_context_changes_invalidate_cache():
+    """Context values are cached, but any change to a context must be seen immediately."""
+
+    @Node.from_func
+    def calc(val: int):
+        return val
+
+    node = calc(1)
+
+    # Resolve the value once, so that it gets cached.
+    assert node.context["log_level"] == "INFO"
+
+    # Changes in the class context.
+    calc.context.update(log_level="DEBUG")
+    assert node.context["log_level"] == "DEBUG"
+
+    # Changes in the global context, even if the dictionary is modified directly.
+    del calc.context["log_level"]
+    NODES_CONTEXT["log_level"] = "WARNING"
+    try:
+        assert node.context["log_level"] == "WARNING"
+    finally:
+        NODES_CONTEXT["log_level"] = "INFO"
+    assert node.context["log_level"] == "INFO"
+
+    # Temporal contexts.
+    with temporal_context(log_level="ERROR"):
+        assert node.context["log_level"] == "ERROR"
+    assert node.context["log_level"] == "INFO"
+
+    # And changes in the instance context.
+    node.context.update(log_level="CRITICAL")
+    assert node.context["log_level"] == "CRITICAL"
+    node.context.pop("log_level")
+    assert node.context["log_level"] == "INFO"
+
+    # Even if the instance dictionary is modified directly.
+    node.context.maps[0]["log_level"] = "DEBUG"
+    assert node.context["log_level"] == "DEBUG"
+    del node.context.maps[0]["log_level"]
+    assert node.context["log_level"] == "INFO"
+
+
+def test_user_class_context():
+    """The dictionary passed as the context of a node class is used as it is."""
+    context = {"log_level": "WARNING"}
+
+    def calc(val: int):
+        return val
+
+    calc_node = Node.from_func(calc, context=context)
+    node = calc_node(1)
+    assert node.context["log_level"] == "WARNING"
+
+    context["log_level"] = "ERROR"
+    assert calc_node.context["log_level"] == "ERROR"
+    assert node.context["log_level"] == "ERROR"
+
+
+def test_temporal_context_is_thread_local():
+    """A temporal context entered in one thread must not leak into other threads."""
+    import threading
+
+    @Node.from_func
+    def calc(val: int):
+        return val
+
+    node = calc(1)
+
+    entered = threading.Event()
+    release = threading.Event()
+
+    def other_thread():
+        with temporal_context(lazy=False):
+            with temporal_context(context=calc.context, log_level="DEBUG"):
+                entered.set()
+                release.wait(5)
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    try:
+        assert entered.wait(5)
+        assert node.context["lazy"] is True
+        assert node.context["log_level"] == "INFO"
+        # The class context dictionary has not been modified.
+        assert "log_level" not in calc.context.maps[0]
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_temporal_context_is_task_local():
+    import asyncio
+
+    @Node.from_func
+    def calc(val: int):
+        return val
+
+    node = calc(1)
+
+    async def check(lazy):
+        with temporal_context(lazy=lazy):
+            await asyncio.sleep(0.01)
+            return node.context["lazy"]
+
+    async def main():
+        return await asyncio.gather(check(True), check(False), check(True))
+
+    assert asyncio.run(main()) == [True, False, True]
+
+
+def test_temporal_context_explicit_dict():
+    context = {"lazy": True}
+    node_context = NodeContext(context, NODES_CONTEXT)
+
+    with temporal_context(context=context, lazy=False):
+        # The value is seen through node contexts, but the dictionary is not modified.
+        assert node_context["lazy"] is False
+        assert context["lazy"] is True
+
+    assert node_context["lazy"] is True
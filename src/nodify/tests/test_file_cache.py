@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import os
+import threading
+
+import pytest
+
+from nodify import FileNode
+from nodify.file_cache import FILE_CACHE, FileContentCache
+
+
+def test_file_cache_reads_once(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+
+    cache = FileContentCache(max_bytes=1024)
+
+    assert cache.read_text(path) == "contents"
+    assert cache.read_text(str(path)) == "contents"
+    assert cache.read_bytes(path) == b"contents"
+    assert bytes(cache.read_mmap(path)) == b"contents"
+
+    # Each representation of the file is read once.
+    assert cache.misses == 3
+    assert cache.hits == 1
+    assert cache.nbytes == 3 * len("contents")
+
+    # Invalidating a file discards all its representations, and only them.
+    other = tmp_path / "other.txt"
+    other.write_text("other")
+    cache.read_text(other)
+
+    cache.invalidate(path)
+    assert len(cache) == 1
+    assert cache.nbytes == len("other")
+    assert list(cache._keys_by_path) == [os.path.realpath(other)]
+
+
+def test_file_cache_modified_file(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+
+    cache = FileContentCache(max_bytes=1024)
+    assert cache.read_text(path) == "contents"
+
+    path.write_text("new contents")
+    assert cache.read_text(path) == "new contents"
+
+    with pytest.raises(FileNotFoundError):
+        cache.read_text(tmp_path / "missing.txt")
+
+
+def test_file_cache_budget(tmp_path):
+    cache = FileContentCache(max_bytes=10)
+
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"file_{i}.txt"
+        path.write_bytes(b"x" * 4)
+        paths.append(path)
+        cache.read_bytes(path)
+
+    # The least recently used file has been evicted.
+    assert len(cache) == 2
+    assert cache.nbytes == 8
+    cache.read_bytes(paths[0])
+    assert cache.misses == 4
+
+    # Files larger than the budget are not cached.
+    big = tmp_path / "big.txt"
+    big.write_bytes(b"x" * 20)
+    assert cache.read_bytes(big) == b"x" * 20
+    assert cache.nbytes <= 10
+
+    # Evicted files are not indexed anymore.
+    assert len(cache._keys_by_path) == len(cache)
+
+    cache.invalidate()
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_file_cache_concurrent_reads(tmp_path, monkeypatch):
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+
+    cache = FileContentCache(max_bytes=1024)
+
+    reads = []
+    original_open = open
+
+    def slow_open(file, *args, **kwargs):
+        if os.fspath(file) == os.path.realpath(path):
+            reads.append(file)
+            threading.Event().wait(0.05)
+        return original_open(file, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", slow_open)
+
+    threads = [threading.Thread(target=cache.read_text, args=(path,)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(reads) == 1
+    assert cache.hits == 4
+
+
+def test_file_node_invalidates_cache(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+
+    FILE_CACHE.read_text(path)
+    assert any(key[0] == os.path.realpath(path) for key in FILE_CACHE._entries)
+
+    n = FileNode(str(path))
+    path.write_text("new contents")
+    n._check_file_changed()
+
+    assert not any(key[0] == os.path.realpath(path) for key in FILE_CACHE._entries)
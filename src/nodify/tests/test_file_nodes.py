@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import contextvars
 import tempfile
+import threading
 import time
 from pathlib import Path
 
 import pytest
 
 from nodify import FileNode
+from nodify.file_nodes import _Debouncer
 
 
 def test_file_node_return():
@@ -30,3 +33,251 @@ def test_file_node_update():
     time.sleep(0.2)
 
     assert n._outdated
+
+
+def test_file_nodes_share_watches(tmp_path):
+    pytest.importorskip("watchdog")
+
+    import gc
+
+    from nodify.file_nodes import get_watch_service
+
+    service = get_watch_service()
+
+    first_path = tmp_path / "first.txt"
+    second_path = tmp_path / "second.txt"
+    first_path.write_text("")
+    second_path.write_text("")
+
+    nodes = [FileNode(str(first_path)) for _ in range(3)]
+    other = FileNode(str(second_path))
+
+    # A single watch for the directory, shared by all subscriptions.
+    assert service._watches[str(tmp_path.resolve())][1] == 4
+    assert len(service.subscribers(first_path)) == 3
+
+    for node in [*nodes, other]:
+        node.get()
+
+    first_path.write_text("test")
+    time.sleep(0.2)
+
+    assert all(node._outdated for node in nodes)
+    assert not other._outdated
+
+    # Garbage collected nodes are unsubscribed.
+    del nodes
+    gc.collect()
+    assert len(service.subscribers(first_path)) == 0
+    assert service._watches[str(tmp_path.resolve())][1] == 1
+
+    # Changing the path moves the subscription.
+    other.update_inputs(path=str(first_path))
+    assert str(tmp_path.resolve()) in service._watches
+    assert [id(node) for node in service.subscribers(first_path)] == [id(other)]
+    assert len(service.subscribers(second_path)) == 0
+
+
+def test_file_node_debounce(tmp_path):
+    pytest.importorskip("watchdog")
+
+    path = tmp_path / "file.txt"
+    path.write_text("")
+
+    n = FileNode(str(path))
+    n.get()
+
+    invalidations = n._invalidations
+    for i in range(5):
+        path.write_text("a" * i)
+
+    time.sleep(0.3)
+
+    assert n._outdated
+    assert n._invalidations == invalidations + 1
+
+
+def test_debouncer_keeps_context():
+    request = contextvars.ContextVar("request", default=None)
+    seen = []
+    done = threading.Event()
+
+    def func():
+        seen.append(request.get())
+        done.set()
+
+    debouncer = _Debouncer()
+    token = request.set("first")
+    debouncer.call("key", 0.01, func)
+    request.reset(token)
+
+    assert done.wait(timeout=5)
+    assert seen == ["first"]
+
+
+def test_file_node_same_content(tmp_path):
+    pytest.importorskip("watchdog")
+
+    class HashedFileNode(FileNode):
+        _cls_context = {"file_hash": True}
+
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+
+    n = HashedFileNode(str(path))
+    n.get()
+
+    # Rewriting the same contents doesn't outdate the node.
+    path.write_text("contents")
+    time.sleep(0.3)
+    assert not n._outdated
+
+    path.write_text("new contents")
+    time.sleep(0.3)
+    assert n._outdated
+
+
+def test_polling_watch_service(tmp_path):
+    import os
+
+    from nodify.file_nodes import PollingWatchService
+
+    class Subscriber:
+        def __init__(self):
+            self.events = []
+
+        def on_file_modified(self, event):
+            self.events.append(("modified", event.src_path))
+
+        def on_file_created(self, event):
+            self.events.append(("created", event.src_path))
+
+        def on_file_deleted(self, event):
+            self.events.append(("deleted", event.src_path))
+
+    service = PollingWatchService(interval=10)
+
+    existing = tmp_path / "existing.txt"
+    existing.write_text("")
+    new = tmp_path / "new.txt"
+
+    subscriber = Subscriber()
+    assert service.subscribe(existing, subscriber)
+    assert service.subscribe(new, subscriber)
+    # Only the directory is scanned, once for both files.
+    assert len(service._watches) == 1
+
+    # The first scan only records the state of the files.
+    service.poll()
+    assert subscriber.events == []
+
+    new.write_text("")
+    existing.write_text("changed")
+    service.poll()
+    assert sorted(subscriber.events) == [
+        ("created", os.path.normcase(str(new.resolve()))),
+        ("modified", os.path.normcase(str(existing.resolve()))),
+    ]
+
+    subscriber.events.clear()
+    service.poll()
+    assert subscriber.events == []
+
+    existing.unlink()
+    service.poll()
+    assert subscriber.events == [("deleted", os.path.normcase(str(existing.resolve())))]
+
+    # Subscribers of a directory are notified about any file in it.
+    directory_subscriber = Subscriber()
+    assert service.subscribe(tmp_path, directory_subscriber, directory=True)
+    service.poll()
+    other = tmp_path / "other.txt"
+    other.write_text("")
+    service.poll()
+    assert directory_subscriber.events == [
+        ("created", os.path.normcase(str(other.resolve())))
+    ]
+
+    # Directories that don't exist can't be watched.
+    with pytest.warns():
+        assert not service.subscribe(tmp_path / "missing" / "file.txt", subscriber)
+
+    service.stop()
+
+
+def test_file_node_polling(tmp_path, monkeypatch):
+    from nodify import file_nodes
+
+    service = file_nodes.PollingWatchService(interval=0.05)
+    monkeypatch.setattr(file_nodes, "_WATCH_SERVICE", service)
+
+    path = tmp_path / "file.txt"
+    path.write_text("")
+
+    n = FileNode(str(path))
+    n.get()
+
+    time.sleep(0.2)
+    assert not n._outdated
+
+    path.write_text("test")
+    time.sleep(0.4)
+    assert n._outdated
+
+    service.stop()
+
+
+def test_directory_node_incremental(tmp_path):
+    from nodify import DirectoryNode, Node
+
+    calls = []
+
+    @Node.from_func
+    def read_file(path):
+        calls.append(path.name)
+        return path.read_text()
+
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.txt").write_text("b")
+    (tmp_path / "ignored.csv").write_text("")
+
+    files = DirectoryNode(str(tmp_path), pattern="*.txt")
+    contents = read_file(files)
+
+    assert list(contents.get()) == ["a", "b"]
+    assert calls == ["a.txt", "b.txt"]
+
+    # Only new or changed files are processed.
+    calls.clear()
+    (tmp_path / "c.txt").write_text("c")
+    (tmp_path / "a.txt").write_text("new a")
+    files._check_file_changed()
+
+    assert files._outdated
+    assert list(contents.get()) == ["new a", "b", "c"]
+    assert sorted(calls) == ["a.txt", "c.txt"]
+
+    # Removing a file doesn't need any computation.
+    calls.clear()
+    (tmp_path / "b.txt").unlink()
+    files._check_file_changed()
+
+    assert list(contents.get()) == ["new a", "c"]
+    assert calls == []
+
+
+def test_directory_node_watch(tmp_path):
+    pytest.importorskip("watchdog")
+
+    from nodify import DirectoryNode
+
+    (tmp_path / "a.txt").write_text("a")
+
+    files = DirectoryNode(str(tmp_path))
+    assert [path.name for path in files.get()] == ["a.txt"]
+
+    (tmp_path / "b.txt").write_text("b")
+    time.sleep(0.3)
+
+    assert files._outdated
+    assert [path.name for path in files.get()] == ["a.txt", "b.txt"]
@@ -359,3 +359,238 @@ def test_op_update(sum_node):
     result = abs(node)
 
     assert result(input2=-3) == 2
+
+
+def test_concurrent_get_single_flight():
+    """Concurrent calls to get on an outdated node should compute only once."""
+    import threading
+    import time
+
+    calls = []
+
+    @Node.from_func
+    def slow(a):
+        calls.append(a)
+        time.sleep(0.1)
+        return [a]
+
+    node = slow(1)
+
+    results = []
+
+    def get():
+        results.append(node.get())
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert node._nupdates == 1
+    assert len(results) == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_get_up_to_date_doesnt_lock(sum_node):
+    """Getting an output that is up to date should not wait for the node's lock."""
+    import threading
+
+    node = sum_node(1, 2)
+    assert node.get() == 3
+
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with node._lock:
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    try:
+        assert acquired.wait(5)
+        assert node.get() == 3
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_invalidation_during_computation():
+    """If a node is marked as outdated while computing, it should remain outdated."""
+
+    @Node.from_func
+    def invalidating(a):
+        node._receive_outdated()
+        return a
+
+    node = invalidating(1)
+
+    assert node.get() == 1
+    assert node._outdated
+
+
+def _sleep_forever():
+    import time
+
+    time.sleep(60)
+
+
+def test_timeout_cooperative():
+    import time
+
+    from nodify import check_cancelled
+    from nodify.errors import NodeTimeoutError
+
+    @Node.from_func(context={"timeout": 0.1})
+    def long_running():
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    node = long_running()
+
+    with pytest.raises(NodeTimeoutError):
+        node.get()
+
+    assert node._errored
+    assert node._outdated
+
+
+def test_timeout_isolated():
+    import time
+
+    from nodify.errors import NodeTimeoutError
+
+    node = Node.from_func(_sleep_forever, context={"timeout": 0.2, "isolate": True})()
+
+    start = time.monotonic()
+    with pytest.raises(NodeTimeoutError):
+        node.get()
+    assert time.monotonic() - start < 10
+
+
+def _divmod(a, b):
+    return divmod(a, b)
+
+
+def test_isolated_result():
+    node = Node.from_func(_divmod, context={"isolate": True})(7, 2)
+
+    assert node.get() == (3, 1)
+
+
+def test_invalidation_cancels_computation():
+    """Invalidating a node while it computes restarts the computation with the new inputs."""
+    import threading
+    import time
+
+    from nodify import check_cancelled
+
+    started = threading.Event()
+    calls = []
+
+    @Node.from_func
+    def slow(a):
+        calls.append(a)
+        started.set()
+        # Only the first computation is slow.
+        for _ in range(500 if a == 1 else 0):
+            check_cancelled()
+            time.sleep(0.01)
+        return a
+
+    node = slow(1)
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(node.get()))
+    thread.start()
+
+    assert started.wait(5)
+    node.update_inputs(a=2)
+    thread.join()
+
+    assert calls == [1, 2]
+    assert results == [2]
+    assert not node._outdated
+
+
+def test_errors_are_cached():
+    """A failed computation is not repeated until the inputs change."""
+    calls = []
+
+    @Node.from_func
+    def fails(a):
+        calls.append(a)
+        raise ValueError(a)
+
+    node = fails(1)
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            node.get()
+    assert calls == [1]
+
+    node.update_inputs(a=2)
+    with pytest.raises(ValueError):
+        node.get()
+    assert calls == [1, 2]
+
+    with temporal_context(cache_errors=False):
+        with pytest.raises(ValueError):
+            node.get()
+    assert calls == [1, 2, 2]
+
+
+def test_transient_retries():
+    calls = []
+
+    @Node.from_func(context={"transient": True, "retries": 2, "retry_backoff": 0})
+    def flaky(a):
+        calls.append(a)
+        if len(calls) < 3:
+            raise OSError("Not available yet.")
+        return a
+
+    node = flaky(1)
+
+    assert node.get() == 1
+    assert calls == [1, 1, 1]
+
+    # When all retries fail, the error is raised and it is not cached.
+    calls.clear()
+    node.update_inputs(a=2)
+    with temporal_context(retries=0):
+        with pytest.raises(OSError):
+            node.get()
+        with pytest.raises(OSError):
+            node.get()
+    assert calls == [2, 2]
+
+
+def test_intern_derived_nodes(sum_node):
+    node = sum_node(1, 2)
+
+    assert node[0] is not node[0]
+
+    with temporal_context(intern_derived=True):
+        item = node[0]
+        assert node[0] is item
+        assert node[1] is not item
+        assert node.real is node.real
+        assert node + 1 is node + 1
+        assert 1 + node is not node + 1
+        # Unhashable inputs are not interned
+        assert node[[0]] is not node[[0]]
+
+        # The number of links doesn't grow when asking for the same node.
+        n_links = len(node._output_links)
+        for _ in range(10):
+            node[0]
+        assert len(node._output_links) == n_links
+
+        # A node whose inputs have been modified is no longer returned.
+        item.update_inputs(key=1)
+        assert node[0] is not item
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import pytest
+
+from nodify import FileNode, Node, Workflow, temporal_context
+from nodify.node import ConstantNode
+from nodify.optimize import eliminate_common_subexpressions, find_constant_nodes
+from nodify.workflow import FoldedNode, WorkflowInput, WorkflowNodes, WorkflowOutput
+
+
+@Node.from_func
+def add(a, b=1):
+    return a + b
+
+
+def test_merge_identical_nodes():
+    a = ConstantNode(2)
+    first = add(a, 3)
+    second = add(a, 3)
+    different = add(a, 4)
+    output = add(add(first, second), add(second, different))
+
+    replaced = eliminate_common_subexpressions([output])
+
+    assert list(replaced) == [id(second)]
+    assert replaced[id(second)] is first
+    assert output.get() == 5 + 5 + 5 + 6
+    assert len(a._output_links) == 2
+    assert len(first._output_links) == 2
+    assert len(second._output_links) == 0
+
+
+def test_merge_propagates_downstream():
+    a = ConstantNode(2)
+    output = add(add(add(a)), add(add(a)))
+
+    assert len(eliminate_common_subexpressions([output])) == 2
+    assert output._input_nodes["a"] is output._input_nodes["b"]
+
+
+def test_different_context_not_merged():
+    a = ConstantNode(2)
+    first = add(a)
+    second = add(a)
+    second.context["lazy"] = True
+
+    assert eliminate_common_subexpressions([first, second]) == {}
+
+
+def test_workflow_merges_nodes():
+    calls = []
+
+    def expensive(a):
+        calls.append(a)
+        return a * 2
+
+    def f(a):
+        x = expensive(a)
+        y = expensive(a)
+        return x + y
+
+    with temporal_context(context=Workflow.context, merge_identical_nodes=True):
+        workflow_cls = Workflow.from_func(f)
+
+    assert len(workflow_cls.dryrun_nodes.workers) == 2
+    assert (
+        workflow_cls.dryrun_nodes.named_vars["x"]
+        == workflow_cls.dryrun_nodes.named_vars["y"]
+    )
+
+    calls.clear()
+    assert workflow_cls(3).get() == 12
+    assert calls == [3]
+
+    def g(a):
+        x = expensive(a)
+        y = expensive(a)
+        return x + y
+
+    # Nodes are not merged by default.
+    workflow_cls = Workflow.from_func(g)
+
+    assert len(workflow_cls.dryrun_nodes.workers) == 3
+
+
+def test_find_constant_nodes():
+    a = ConstantNode(2)
+    constant = add(a)
+    variable = add(WorkflowInput(input_key="b", value=1), constant)
+    volatile = add(FileNode("some_file"))
+
+    found = find_constant_nodes([], [variable, volatile])
+
+    assert found == {id(a), id(constant)}
+
+
+def test_dependency_index_constants():
+    inp = WorkflowInput(input_key="b", value=1)
+    a = ConstantNode(2)
+    constant = add(a)
+    variable = add(inp, constant)
+    volatile = add(FileNode("some_file"))
+    output = WorkflowOutput(value=add(variable, volatile))
+
+    nodes = WorkflowNodes.from_workflow_run(
+        inputs={"b": inp}, output=output, named_vars={}
+    )
+    keys = {id(node): key for key, node in nodes.workers.items()}
+
+    # The index finds the same constants as find_constant_nodes.
+    index = nodes.dependency_index()
+    assert set(index.constant()) == {keys[id(a)], keys[id(constant)]}
+    assert nodes.fold_constants() == 2
+
+    dependencies = nodes.input_dependencies()
+    assert dependencies[keys[id(constant)]] == frozenset()
+    assert dependencies[keys[id(variable)]] == frozenset({"b"})
+    assert dependencies[keys[id(volatile)]] is None
+    assert index.is_volatile("output")
+
+
+def test_workflow_shares_constant_nodes():
+    calls = []
+
+    def expensive(a):
+        calls.append(a)
+        return a * 2
+
+    def f(a):
+        x = expensive(3)
+        y = expensive(x)
+        return a + y
+
+    workflow_cls = Workflow.from_func(f)
+
+    assert len(workflow_cls.dryrun_nodes.folded) == 2
+
+    calls.clear()
+    first, second = workflow_cls(1), workflow_cls(2)
+    assert first.get() == 13
+    assert second.get() == 14
+    assert calls == [3, 6]
+
+    assert isinstance(first.nodes.workers[first.nodes.named_vars["y"]], FoldedNode)
+    # Nodes that are handed out are the instance's own nodes.
+    y = first.nodes.y
+    assert not isinstance(y, FoldedNode)
+    assert all(link is not y for link in workflow_cls.dryrun_nodes.x._output_links)
+    assert first.nodes.x.get() == 6
+
+
+def test_shared_outputs_are_not_modified():
+    def make_list(n):
+        return list(range(n))
+
+    def append_to(values, a):
+        values.append(a)
+        return values
+
+    def f(a):
+        values = make_list(3)
+        return append_to(values, a)
+
+    workflow_cls = Workflow.from_func(f)
+    assert "make_list" in workflow_cls.dryrun_nodes.folded
+
+    # Each instance receives its own copy of the shared list.
+    assert workflow_cls(1).get() == [0, 1, 2, 1]
+    assert workflow_cls(2).get() == [0, 1, 2, 2]
+
+    np = pytest.importorskip("numpy")
+
+    def make_array(n):
+        return np.arange(n)
+
+    def g(a):
+        return make_array(3) + a
+
+    workflow = Workflow.from_func(g)(1)
+    assert workflow.get().tolist() == [1, 2, 3]
+    # Nodes handed out by workflow.nodes are the instance's own, so go through the workers.
+    shared = workflow.nodes.workers["make_array"].get()
+    assert not shared.flags.writeable
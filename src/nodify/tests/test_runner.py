@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import pickle
+import time
+
+import pytest
+
+from nodify import Node, Workflow, temporal_context
+from nodify.runner import ProcessRunner
+
+# Functions must be defined at module level so that they can be pickled.
+
+
+def get_pid(a):
+    return os.getpid()
+
+
+def slow_add(a, b):
+    time.sleep(0.3)
+    return a + b
+
+
+def buffer_sum(buffer):
+    return sum(memoryview(buffer).cast("B")), bytearray(buffer)
+
+
+def fail(a):
+    raise ValueError("Failed")
+
+
+def two_branches(a, b):
+    x = slow_add(a, 1)
+    y = slow_add(b, 1)
+    return x + y
+
+
+def inv(b):
+    return 1 / b
+
+
+def guarded(a, b):
+    first = slow_add(a, 1)
+    return 0 if b == 0 else inv(b) + first
+
+
+@pytest.fixture(scope="module")
+def runner():
+    with ProcessRunner(max_workers=2) as runner:
+        yield runner
+
+
+def test_runner_call(runner):
+    assert runner.call(slow_add, (1, 2), {}) == 3
+    assert runner.call(get_pid, (None,), {}) != os.getpid()
+
+    with pytest.raises(ValueError):
+        runner.call(fail, (1,), {})
+
+    # Functions that can't be pickled run in this process.
+    assert runner.call(lambda a: os.getpid(), (None,), {}) == os.getpid()
+
+
+def test_runner_shared_memory(runner):
+    data = bytearray(b"\x01" * (1 << 17))
+
+    total, copy = runner.call(buffer_sum, (pickle.PickleBuffer(data),), {})
+
+    assert total == 1 << 17
+    assert copy == data
+    # Shared memory blocks are removed when they are not needed anymore.
+    if os.path.isdir("/dev/shm"):
+        assert not any(name.startswith("psm_") for name in os.listdir("/dev/shm"))
+
+
+def test_runner_numpy(runner):
+    np = pytest.importorskip("numpy")
+
+    array = np.arange(1 << 16, dtype=float)
+    assert runner.call(np.sum, (array,), {}) == array.sum()
+    assert np.array_equal(runner.call(np.negative, (array,), {}), -array)
+
+
+def test_runner_nodes(runner):
+    node = Node.from_func(get_pid)(1)
+
+    with temporal_context(runner=runner):
+        assert node.get() != os.getpid()
+
+
+def test_runner_workflow(runner):
+    workflow_cls = Workflow.from_func(two_branches)
+
+    with temporal_context(runner=runner):
+        wf = workflow_cls(1, 2)
+
+        start = time.time()
+        assert wf.get() == 5
+        # The two branches ran at the same time.
+        assert time.time() - start < 0.55
+
+        wf.update_inputs(b=3)
+        assert wf.get() == 6
+
+
+def test_runner_untaken_branches(runner, monkeypatch):
+    calls = []
+    call = runner.call
+
+    def spy(function, *args, **kwargs):
+        calls.append(function.__name__)
+        return call(function, *args, **kwargs)
+
+    monkeypatch.setattr(runner, "call", spy)
+
+    workflow_cls = Workflow.from_func(guarded)
+
+    with temporal_context(runner=runner):
+        wf = workflow_cls(1, 0)
+        # Branches that are not taken are not computed, even if they are passed.
+        runner.compute(list(wf.nodes.workers.values()))
+        assert wf.get() == 0
+        # Syntax nodes (e.g. the comparison) run in this process.
+        assert calls == []
+
+        wf.update_inputs(b=2)
+        assert wf.get() == 2.5
+        assert sorted(calls) == ["inv", "slow_add"]
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+
+from nodify import Node, temporal_context
+from nodify.node import ConstantNode
+from nodify.scheduler import ReactiveScheduler
+
+
+def _diamond(calls):
+    @Node.from_func(context={"lazy": False})
+    def combine(a, b):
+        calls.append((a, b))
+        return a + b
+
+    a = ConstantNode(1)
+    b = ConstantNode(2)
+    return a, b, combine(a, b)
+
+
+def test_without_scheduler_recomputes_twice():
+    calls = []
+    a, b, node = _diamond(calls)
+    calls.clear()
+
+    a.update_inputs(value=3)
+    b.update_inputs(value=4)
+
+    assert calls == [(3, 2), (3, 4)]
+
+
+def test_scheduler_coalesces():
+    calls = []
+    scheduler = ReactiveScheduler(debounce=0.05)
+
+    with temporal_context(scheduler=scheduler):
+        a, b, node = _diamond(calls)
+        node.get()
+        calls.clear()
+
+        a.update_inputs(value=3)
+        b.update_inputs(value=4)
+
+    assert calls == []
+    assert scheduler.wait(timeout=5)
+    assert calls == [(3, 4)]
+    assert not node._outdated
+
+    scheduler.close()
+
+
+def test_scheduler_topological_order():
+    order = []
+
+    @Node.from_func(context={"lazy": False})
+    def record(value, name):
+        order.append(name)
+        return value
+
+    scheduler = ReactiveScheduler(debounce=10)
+
+    with temporal_context(scheduler=scheduler):
+        a = ConstantNode(1)
+        first = record(a, "first")
+        second = record(first, "second")
+        second.get()
+        order.clear()
+
+        a.update_inputs(value=2)
+        scheduler.flush()
+
+    assert order == ["first", "second"]
+    assert second.get() == 2
+
+    scheduler.close()
+
+
+_REQUEST = contextvars.ContextVar("request", default=None)
+
+
+def test_scheduler_keeps_context():
+    seen = []
+
+    @Node.from_func(context={"lazy": False})
+    def record(value):
+        seen.append(_REQUEST.get())
+        return value
+
+    scheduler = ReactiveScheduler(debounce=0.01)
+
+    with temporal_context(scheduler=scheduler):
+        a = ConstantNode(1)
+        node = record(a)
+        node.get()
+        seen.clear()
+
+        token = _REQUEST.set("first")
+        a.update_inputs(value=2)
+        _REQUEST.reset(token)
+
+    assert scheduler.wait(timeout=5)
+    assert seen == ["first"]
+
+    scheduler.close()
+
+
+def test_scheduler_asyncio():
+    calls = []
+
+    async def main():
+        scheduler = ReactiveScheduler(debounce=0.01, backend="asyncio")
+
+        with temporal_context(scheduler=scheduler):
+            a, b, node = _diamond(calls)
+            node.get()
+            calls.clear()
+
+            a.update_inputs(value=3)
+            b.update_inputs(value=4)
+
+        assert calls == []
+        await asyncio.sleep(0.1)
+
+        scheduler.close()
+
+    asyncio.run(main())
+
+    assert calls == [(3, 4)]
+
+
+def test_scheduler_asyncio_does_not_block_loop():
+    threads = []
+
+    @Node.from_func(context={"lazy": False})
+    def record(value):
+        threads.append(threading.get_ident())
+        return value
+
+    async def main():
+        scheduler = ReactiveScheduler(debounce=0.01, backend="asyncio")
+
+        with temporal_context(scheduler=scheduler):
+            a = ConstantNode(1)
+            node = record(a)
+            node.get()
+            threads.clear()
+
+            a.update_inputs(value=2)
+
+        await asyncio.sleep(0.1)
+        scheduler.close()
+
+        return node
+
+    node = asyncio.run(main())
+
+    # The recomputation ran in the executor, not in the thread of the loop.
+    assert len(threads) == 1
+    assert threads[0] != threading.get_ident()
+    assert node.get() == 2
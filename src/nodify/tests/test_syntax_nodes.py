@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import importlib.util
+import sys
+import textwrap
+
+import pytest
+
 from nodify.node import ConstantNode
 from nodify.syntax_nodes import (
+    BoolOpNode,
     CompareNode,
     ConditionalExpressionNode,
     DictNode,
     ListNode,
+    SwitchNode,
     TupleNode,
 )
 from nodify.workflow import Workflow
@@ -80,3 +88,223 @@ def test_workflow_with_syntax():
         return a != b
 
     assert Workflow.from_func(f)(1, 2).get() == True
+
+
+def test_switch_node():
+    node = SwitchNode(False, 1, True, 2, default=3)
+
+    assert node.get() == 2
+    node.update_inputs(cases=(False, 1, False, 2))
+    assert node._outdated
+    assert node.get() == 3
+
+    # Check that only the path that is taken is evaluated.
+    input1 = ConstantNode(1)
+    input2 = ConstantNode(2)
+    default = ConstantNode(3)
+
+    node = SwitchNode(False, input1, True, input2, default=default)
+
+    assert node.get() == 2
+    assert input1._nupdates == 0
+    assert input2._nupdates == 1
+    assert default._nupdates == 0
+
+    # Changes in unused inputs don't outdate the node.
+    input1.update_inputs(value=4)
+    default.update_inputs(value=5)
+    node.update_inputs(default=6)
+    assert not node._outdated
+
+    input2.update_inputs(value=7)
+    assert node._outdated
+    assert node.get() == 7
+
+
+def test_workflow_with_switch():
+    calls = []
+
+    def heavy(b):
+        calls.append(b)
+        return b * 10
+
+    def f(a, b):
+        if a > 2:
+            return heavy(b)
+        elif a < 0:
+            return -b
+        return 0
+
+    workflow = Workflow.from_func(f)(1, 2)
+    calls.clear()
+
+    assert workflow.get() == 0
+    assert calls == []
+
+    workflow.update_inputs(a=3)
+    assert workflow.get() == 20
+    assert calls == [2]
+
+    workflow.update_inputs(a=-1)
+    assert workflow.get() == -2
+
+    # Guards followed by more statements keep running them.
+    def g(a, b):
+        if a:
+            return a
+        c = b * 2
+        return c
+
+    workflow_cls = Workflow.from_func(g)
+    assert workflow_cls(0, 5).get() == 10
+    assert workflow_cls(3, 5).get() == 3
+
+    # A variable that is only assigned in a branch is not used as the default.
+    def h(a):
+        if a > 0:
+            x = 1
+        return a
+
+    assert Workflow.from_func(h)(2).get() == 2
+
+    # Names bound inside nested functions don't count as bound in the outer one.
+    def k(a):
+        def inner():
+            x = 2
+            return x
+
+        if a > 0:
+            x = inner()
+        return a
+
+    assert Workflow.from_func(k)(2).get() == 2
+
+
+def _function_from_source(tmp_path, source: str, name: str):
+    """Defines a function from its source, in a module so that its source can be inspected."""
+    path = tmp_path / f"{name}_module.py"
+    path.write_text(textwrap.dedent(source))
+
+    spec = importlib.util.spec_from_file_location(f"{name}_module", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 10), reason="match statements require python 3.10"
+)
+def test_workflow_with_match(tmp_path):
+    # The source is in a string so that the tests can be collected in python 3.9
+    f = _function_from_source(
+        tmp_path,
+        """
+        def f(a, b):
+            x = b
+            if a:
+                x = b * 2
+            match a:
+                case 1 | 2:
+                    y = x
+                case None:
+                    y = 0
+                case _:
+                    y = 3
+            return y
+        """,
+        "f",
+    )
+    workflow_cls = Workflow.from_func(f)
+
+    assert workflow_cls(1, 5).get() == 10
+    assert workflow_cls(None, 5).get() == 0
+    assert workflow_cls(0, 5).get() == 3
+    assert "y" in workflow_cls.dryrun_nodes.named_vars
+
+    # Cases that return, followed by more statements.
+    g = _function_from_source(
+        tmp_path,
+        """
+        def g(a, b):
+            match a:
+                case 1:
+                    return b
+            c = b * 2
+            return c
+        """,
+        "g",
+    )
+    workflow_cls = Workflow.from_func(g)
+
+    assert workflow_cls(1, 5).get() == 5
+    assert workflow_cls(2, 5).get() == 10
+
+    # Singletons are compared by identity, also as alternatives.
+    h = _function_from_source(
+        tmp_path,
+        """
+        def h(a):
+            match a:
+                case None | True:
+                    return "singleton"
+                case 2 | False:
+                    return "other"
+                case _:
+                    return "default"
+        """,
+        "h",
+    )
+    workflow_cls = Workflow.from_func(h)
+
+    assert workflow_cls(None).get() == "singleton"
+    assert workflow_cls(True).get() == "singleton"
+    assert workflow_cls(1).get() == "default"
+    assert workflow_cls(False).get() == "other"
+    assert workflow_cls(0).get() == "default"
+    assert workflow_cls(2).get() == "other"
+
+
+def test_bool_op_node():
+    assert BoolOpNode("and", 1, 2).get() == 2
+    assert BoolOpNode("and", 0, 2).get() == 0
+    assert BoolOpNode("or", 0, 2).get() == 2
+    assert BoolOpNode("or", 1, 2).get() == 1
+
+    # Check that evaluation stops as soon as the result is known.
+    input1 = ConstantNode(0)
+    input2 = ConstantNode(2)
+
+    node = BoolOpNode("and", input1, input2)
+
+    assert node.get() == 0
+    assert input2._nupdates == 0
+
+    # Unevaluated values don't outdate the node.
+    input2.update_inputs(value=3)
+    assert not node._outdated
+
+    input1.update_inputs(value=1)
+    assert node._outdated
+    assert node.get() == 3
+    assert input2._nupdates == 1
+
+
+def test_workflow_with_bool_op():
+    calls = []
+
+    def expensive(x):
+        calls.append(x)
+        return x > 10
+
+    def f(x):
+        return x > 0 and expensive(x)
+
+    workflow = Workflow.from_func(f)(-1)
+    calls.clear()
+
+    assert workflow.get() is False
+    assert calls == []
+
+    workflow.update_inputs(x=20)
+    assert workflow.get() is True
+    assert calls == [20]
@@ -326,3 +326,540 @@ def test_errored(triple_sum):
 
     wf.update_inputs(a={"c": "m"})
     assert wf._errored == False
+
+
+def test_copy_on_write_instances():
+    from nodify import temporal_context
+    from nodify.workflow import FoldedNode
+
+    calls = []
+
+    def expensive(value):
+        calls.append(value)
+        return value * 2
+
+    def sweep(a, b=3):
+        x = expensive(b)
+        return x + a
+
+    workflow_cls = Workflow.from_func(sweep)
+
+    with temporal_context(context=Workflow.context, copy_on_write=True):
+        instances = [workflow_cls(a) for a in range(3)]
+        assert [wf.get() for wf in instances] == [6, 7, 8]
+        # Nodes that only depend on inputs with their default values are shared.
+        assert calls == [3]
+        x_key = workflow_cls.dryrun_nodes.named_vars["x"]
+        assert isinstance(instances[0].nodes.workers[x_key], FoldedNode)
+
+        # Instances with different values don't share them.
+        calls.clear()
+        assert workflow_cls(1, b=4).get() == 9
+        assert calls == [4]
+
+    # Updating an input copies the shared nodes that depend on it.
+    calls.clear()
+    instances[0].update_inputs(b=5)
+    assert not isinstance(instances[0].nodes.workers[x_key], FoldedNode)
+    assert instances[0].get() == 10
+    assert calls == [5]
+    assert instances[1].get() == 7
+    assert workflow_cls.dryrun_nodes.inputs["b"].value == 3
+
+
+@pytest.mark.parametrize("copy_on_write", [True, False])
+def test_update_instance_nodes(copy_on_write):
+    from nodify import temporal_context
+
+    def add_first(a, b):
+        return a + b
+
+    def double(a, b=2):
+        first = add_first(a, b)
+        return first * 2
+
+    workflow_cls = Workflow.from_func(double)
+
+    with temporal_context(context=Workflow.context, copy_on_write=copy_on_write):
+        wf = workflow_cls(a=2)
+        assert wf.get() == 8
+
+        # Nodes are handed out as nodes of the instance, which can be modified.
+        wf.nodes.first.update_inputs(b=5)
+        assert wf.nodes.first.get() == 7
+        assert wf.get() == 14
+
+        # The workflow class and other instances are not affected.
+        assert workflow_cls(a=2).get() == 8
+
+
+def test_gather_large_graph():
+    from nodify import Node
+    from nodify.workflow import WorkflowInput, WorkflowNodes, WorkflowOutput
+
+    @Node.from_func
+    def add(a, b):
+        return a + b
+
+    inp = WorkflowInput(input_key="a", value=1)
+    # A long chain in which each node is used twice, which would make
+    # a traversal without a visited set explode.
+    node = add(inp, inp)
+    for _ in range(3000):
+        node = add(node, node)
+    output = WorkflowOutput(value=node)
+
+    workers = WorkflowNodes.gather_from_inputs_and_output([inp], output=output)
+
+    assert len(workers) == 3001
+    assert list(workers)[:3] == ["add", "add_1", "add_2"]
+    assert "add_3000" in workers
+
+
+def test_deep_diamonds():
+    from nodify import Node
+
+    @Node.from_func
+    def left(a):
+        return a + 1
+
+    @Node.from_func
+    def right(a):
+        return a - 1
+
+    @Node.from_func
+    def join(a, b):
+        return (a + b) // 2
+
+    # A chain of diamonds, which has an exponential number of paths
+    # from the input to the output.
+    node = join(left(1), right(1))
+    for _ in range(22):
+        node = join(left(node), right(node))
+
+    workflow_cls = Workflow.from_node_tree(node)
+    wf = workflow_cls(left_a=5, right_a=5)
+
+    assert wf.get() == 5
+    assert len(wf.nodes.workers) == 23 * 3
+    # Instances keep the order of the workers of the class.
+    assert list(wf.nodes.workers) == list(workflow_cls.dryrun_nodes.workers)
+
+
+def test_parallel_workflow():
+    import threading
+
+    from nodify import temporal_context
+
+    # Both nodes must be running at the same time to get past the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def first(a):
+        barrier.wait()
+        return a + 1
+
+    def second(a):
+        barrier.wait()
+        return a * 2
+
+    def fail(a):
+        raise ValueError("Failed")
+
+    def parallel(a):
+        x = first(a)
+        y = second(a)
+        return x + y
+
+    workflow_cls = Workflow.from_func(parallel)
+
+    assert workflow_cls.dryrun_nodes.dependency_levels() == [
+        ["first", "second"],
+        ["BinaryOperationNode"],
+    ]
+
+    with temporal_context(max_workers=2):
+        wf = workflow_cls(3)
+        assert wf.get() == 10
+
+        wf.update_inputs(a=4)
+        assert wf.get() == 13
+
+    def add_one(a):
+        return a + 1
+
+    def failing(a):
+        return add_one(a) + fail(a)
+
+    failing_cls = Workflow.from_func(failing)
+    with temporal_context(max_workers=2):
+        wf = failing_cls(3)
+        with pytest.raises(ValueError):
+            wf.get()
+        assert wf._errored
+
+
+def test_parallel_workflow_untaken_branches():
+    from nodify import temporal_context
+
+    def plus_one(a):
+        return a + 1
+
+    def inv(b):
+        return 1 / b
+
+    def guarded(a, b):
+        first = plus_one(a)
+        return 0 if b == 0 else inv(b) + first
+
+    workflow_cls = Workflow.from_func(guarded)
+
+    # Branches of the conditional are only computed if they are taken.
+    levels = workflow_cls.dryrun_nodes.dependency_levels()
+    assert "inv" not in [key for level in levels for key in level]
+
+    with temporal_context(max_workers=4):
+        wf = workflow_cls(1, b=0)
+        assert wf.get() == 0
+
+        wf.update_inputs(b=2)
+        assert wf.get() == 2.5
+
+
+def test_checkpoint_fingerprints():
+    import os
+    import subprocess
+    import sys
+
+    import nodify
+    from nodify.checkpoint import _function_id, fingerprint
+
+    def same(f, g):
+        return fingerprint(_function_id(f)) == fingerprint(_function_id(g))
+
+    def offset_adder(offset):
+        def add(x):
+            return x + offset
+
+        return add
+
+    # Functions with the same bytecode are told apart by their constants,
+    # (nested code included), names, defaults and variables of enclosing scopes.
+    assert not same(lambda x: x + 1, lambda x: x + 2)
+    assert not same(lambda: (lambda: 1), lambda: (lambda: 2))
+    assert not same(lambda x: min(x), lambda x: max(x))
+    assert not same(lambda x, y=1: x + y, lambda x, y=2: x + y)
+    assert not same(offset_adder(1), offset_adder(2))
+    assert same(offset_adder(1), offset_adder(1))
+
+    # Fingerprints of sets and dictionaries don't depend on their order,
+    # which for strings changes between processes.
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+    code = "from nodify.checkpoint import fingerprint; print(fingerprint({'x', 'y', 'z', 'w'}))"
+    fingerprints = {
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env={
+                **os.environ,
+                "PYTHONHASHSEED": str(seed),
+                "PYTHONPATH": os.path.dirname(os.path.dirname(nodify.__file__)),
+            },
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in range(4)
+    }
+    assert len(fingerprints) == 1
+
+
+def test_workflow_checkpoints(tmp_path):
+    from nodify import temporal_context
+
+    calls = []
+    fail = [True]
+
+    def step_one(a):
+        calls.append("one")
+        return a + 1
+
+    def step_two(x):
+        calls.append("two")
+        if fail[0]:
+            raise ValueError("Crashed")
+        return x * 2
+
+    def long_run(a):
+        x = step_one(a)
+        return step_two(x)
+
+    workflow_cls = Workflow.from_func(long_run)
+
+    with temporal_context(checkpoint_dir=str(tmp_path), copy_on_write=False):
+        with pytest.raises(ValueError):
+            workflow_cls(1).get()
+        assert calls == ["one", "two"]
+
+        # Running again resumes from the last step that succeeded.
+        calls.clear()
+        fail[0] = False
+        assert workflow_cls(1).get() == 4
+        assert calls == ["two"]
+
+        calls.clear()
+        assert workflow_cls(1).get() == 4
+        assert calls == []
+
+        # Different inputs are computed.
+        assert workflow_cls(2).get() == 6
+        assert calls == ["one", "two"]
+
+
+def test_workflow_sweep():
+    calls = []
+
+    def slow_square(value):
+        calls.append(value)
+        return value**2
+
+    def sweep_sum(a, b, c=1):
+        a2 = slow_square(a)
+        b2 = slow_square(b)
+        return a2 + b2 + c
+
+    workflow_cls = Workflow.from_func(sweep_sum)
+
+    points = [{"a": a, "b": b} for a in range(3) for b in range(4)]
+    outputs = dict(workflow_cls.sweep(points))
+    assert outputs == {i: p["a"] ** 2 + p["b"] ** 2 + 1 for i, p in enumerate(points)}
+    # Each node is computed once for each distinct value of the inputs it depends on.
+    assert sorted(calls) == sorted([*range(3), *range(4)])
+
+    # Points computed concurrently share intermediate outputs too.
+    calls.clear()
+    points = [{"a": 1, "b": 2, "c": c} for c in range(10)]
+    outputs = dict(workflow_cls.sweep(points, max_workers=4))
+    assert outputs == {i: 5 + i for i in range(10)}
+    assert sorted(calls) == [1, 2]
+
+    # Points share nodes only if their values are the same, and of the same type.
+    # Unhashable values are supported too.
+    values = [1, True, 1.0, 1, [1], [1], [2]]
+    outputs = workflow_cls.dryrun_nodes.expand(
+        [{"a": a, "b": 0, "c": 0} for a in values]
+    )
+    shared_with = [
+        next(i for i, other in enumerate(outputs) if other is output)
+        for output in outputs
+    ]
+    assert shared_with == [0, 1, 2, 0, 4, 4, 6]
+
+    with pytest.raises(TypeError):
+        list(workflow_cls.sweep([{"a": 1}]))
+    with pytest.raises(TypeError):
+        list(workflow_cls.sweep([{"a": 1, "b": 2, "d": 3}]))
+
+
+# Calls of the function used in test_workflow_output_cache. Values of enclosing
+# scopes identify the function in the cache, so this can't be a local variable.
+_parse_structure_calls = []
+
+
+def test_workflow_output_cache():
+    from nodify import temporal_context
+
+    calls = _parse_structure_calls
+    calls.clear()
+
+    def parse_structure(path):
+        _parse_structure_calls.append(path)
+        return path.upper()
+
+    def run_simulation(structure, param):
+        return f"{structure}-{param}"
+
+    def simulate(path, param):
+        structure = parse_structure(path)
+        return run_simulation(structure, param)
+
+    workflow_cls = Workflow.from_func(simulate)
+
+    with temporal_context(output_cache=True):
+        outputs = [workflow_cls("file.xyz", param).get() for param in range(3)]
+        assert outputs == [f"FILE.XYZ-{param}" for param in range(3)]
+        # The structure is parsed once for all instances.
+        assert calls == ["file.xyz"]
+
+        stats = workflow_cls.output_cache.stats
+        assert stats["hits"] == 2
+        assert stats["entries"] == 4
+
+        # Updating the inputs of an instance also uses the cache.
+        wf = workflow_cls("other.xyz", 0)
+        wf.get()
+        wf.update_inputs(path="file.xyz")
+        assert wf.get() == "FILE.XYZ-0"
+        assert calls == ["file.xyz", "other.xyz"]
+
+    # The cache is opt-in.
+    workflow_cls("file.xyz", 0).get()
+    assert calls == ["file.xyz", "other.xyz", "file.xyz"]
+
+    # Old outputs are discarded when the cache is full.
+    workflow_cls.output_cache.clear()
+    workflow_cls.output_cache.max_entries = 2
+    with temporal_context(output_cache=True):
+        for param in range(3):
+            workflow_cls("file.xyz", param).get()
+    assert len(workflow_cls.output_cache) == 2
+    assert workflow_cls.output_cache.stats["misses"] == 4
+
+
+def test_output_cache_outputs_are_not_modified():
+    from nodify.output_cache import OutputCache
+
+    def make_list(n):
+        return list(range(n))
+
+    def call(args, kwargs):
+        return make_list(*args, **kwargs)
+
+    cache = OutputCache()
+
+    # Each caller receives its own copy of the cached list.
+    output, hit = cache.call("make_list", make_list, (3,), {}, call=call)
+    assert not hit
+    output.append(3)
+
+    output, hit = cache.call("make_list", make_list, (3,), {}, call=call)
+    assert hit
+    assert output == [0, 1, 2]
+
+    np = pytest.importorskip("numpy")
+
+    def make_array(n):
+        return np.arange(n)
+
+    cache.call("make_array", make_array, (3,), {}, call=lambda a, k: make_array(*a))
+    output, hit = cache.call(
+        "make_array", make_array, (3,), {}, call=lambda a, k: make_array(*a)
+    )
+    assert hit
+    assert not output.flags.writeable
+
+
+def test_dependency_index():
+    calls = []
+
+    def scale(value, factor):
+        calls.append("scale")
+        return value * factor
+
+    def shift(value, offset):
+        calls.append("shift")
+        return value + offset
+
+    def pick(x, y, use_x):
+        scaled = scale(x, 2)
+        shifted = shift(y, 1)
+        return scaled if use_x else shifted
+
+    workflow_cls = Workflow.from_func(pick)
+
+    index = workflow_cls.dryrun_nodes.dependency_index()
+    assert index.inputs_of("scale") == ["x"]
+    assert index.inputs_of("output") == ["x", "y", "use_x"]
+    assert workflow_cls.affected_by("x") == [
+        "scale",
+        "ConditionalExpressionNode",
+        "output",
+    ]
+    assert workflow_cls.affected_by("x", "y") == [
+        "scale",
+        "shift",
+        "ConditionalExpressionNode",
+        "output",
+    ]
+    with pytest.raises(KeyError):
+        workflow_cls.affected_by("z")
+
+    wf = workflow_cls(1, 2, True)
+    assert wf.get() == 2
+    calls.clear()
+    # Instances have the workers of the class, in the same order.
+    assert list(wf.nodes.workers) == list(workflow_cls.dryrun_nodes.workers)
+
+    # Only the nodes that depend on the input are outdated.
+    invalidations = wf.nodes.shift._invalidations
+    wf.update_inputs(x=3)
+    assert wf.nodes.scale._outdated
+    assert wf.nodes.shift._invalidations == invalidations
+    assert wf._outdated
+    assert wf.get() == 6
+    assert calls == ["scale"]
+
+    # Inputs of branches that are not taken don't outdate the output.
+    wf.update_inputs(y=5)
+    assert wf.nodes.shift._invalidations == invalidations + 1
+    assert not wf.nodes.ConditionalExpressionNode._outdated
+    assert not wf._outdated
+
+
+def test_workflow_external_nodes():
+    from nodify import Node
+
+    @Node.from_func
+    def ext_val(x):
+        return x + 1
+
+    def plus(a, b):
+        return a + b
+
+    external = ext_val(x=1)
+
+    def uses_external(a):
+        return plus(a, plus(external, 10))
+
+    workflow_cls = Workflow.from_func(uses_external)
+
+    # The external node is used by the workflow, but it is not part of it.
+    assert all(
+        node is not external for node in workflow_cls.dryrun_nodes.workers.values()
+    )
+    assert workflow_cls.dryrun_nodes.dependency_index().is_volatile("plus_1")
+    assert "plus_1" not in workflow_cls.dryrun_nodes.folded
+
+    wf = workflow_cls(1)
+    assert wf.get() == 13
+
+    # Instances see the updates of the external node.
+    external.update_inputs(x=100)
+    assert wf.get() == 112
+    assert workflow_cls(1).get() == 112
+
+
+def test_folded_nodes_follow_shared_node():
+    import gc
+    import weakref
+
+    def plus(a, b):
+        return a + b
+
+    def add_constant(a):
+        return plus(a, plus(1, 2))
+
+    workflow_cls = Workflow.from_func(add_constant)
+    assert "plus_1" in workflow_cls.dryrun_nodes.folded
+
+    wf = workflow_cls(1)
+    assert wf.get() == 4
+
+    # Instances are outdated when the shared node is.
+    workflow_cls.dryrun_nodes.workers["plus_1"].update_inputs(b=5)
+    assert wf._outdated
+    assert wf.get() == 7
+
+    # The shared node doesn't keep the instances alive.
+    folded = weakref.ref(wf.nodes.workers["plus_1"])
+    del wf
+    gc.collect()
+    assert folded() is None
@@ -1,17 +1,45 @@
 from __future__ import annotations
 
+import contextvars
 import html
 import inspect
+import logging
 from collections import ChainMap
-from typing import Any, Dict, Iterable, List, Sequence, Tuple, Type, Union
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 from warnings import warn
 
 from ._env import get_env_variable, register_env_variable
+from .checkpoint import CheckpointStore
 from .context import temporal_context
-from .node import DummyInputValue, Node
+from .node import DummyInputValue, Node, _same_value, _unshared_value
+from .optimize import (
+    _eager_nodes,
+    _replace_node,
+    _topological_order,
+    eliminate_common_subexpressions,
+)
+from .output_cache import OutputCache
 from .parse import nodify_func
 from .utils import traverse_tree_backward, traverse_tree_forward
 
+_logger = logging.getLogger(__name__)
+
 register_env_variable(
     "NODIFY_EXPORT_VIS",
     default=False,
@@ -24,11 +52,53 @@ class WorkflowInput(DummyInputValue):
 
 
 class WorkflowOutput(Node):
+    _run_locally = True
+
     @staticmethod
     def function(value: Any) -> Any:
         return value
 
 
+class _SharedRef:
+    """Holds a reference to a node without being linked to it."""
+
+    __slots__ = ("node",)
+
+    def __init__(self, node: Node):
+        self.node = node
+
+    def __repr__(self):
+        return f"<shared {self.node!r}>"
+
+
+class FoldedNode(Node):
+    """Returns the output of a node that is shared between all instances of a workflow.
+
+    Nodes of a workflow that don't depend on its inputs compute the same output
+    in every instance, so instead of copying them, instances use a FoldedNode
+    that points to the node of the workflow class. It is computed only once, the
+    first time that any instance needs it.
+
+    So that an instance that modifies the output in place doesn't affect the
+    others, each instance receives its own copy of mutable outputs (arrays are
+    received as read only views instead, see ``nodify.node._unshared_value``).
+    The copy is kept until the shared node is outdated, which outdates the
+    FoldedNode as well.
+    """
+
+    # The shared node lives in this process.
+    _run_locally = True
+
+    def setup(self, *args, **kwargs):
+        super().setup(*args, **kwargs)
+        # The shared node must not keep the instances alive.
+        self.inputs["shared"].node._receive_weak_output_link(self)
+
+    @staticmethod
+    def function(shared: _SharedRef) -> Any:
+        return _unshared_value(shared.node.get())
+
+
 class NetworkDescriptor:
     def __get__(self, instance, owner):
         return Network(owner)
@@ -550,11 +620,114 @@ class Network:
         return self._show_pyvis(net, notebook=notebook, to_export=to_export)
 
 
+class DependencyIndex:
+    """Static index of the inputs of a workflow on which each of its nodes depends.
+
+    Each input is assigned a bit, and each worker node (and the output) a bitset
+    (an integer) with the bits of all the inputs on which it depends, directly or
+    through other nodes. This makes it cheap to find all the nodes that an update
+    of some inputs affects.
+
+    Nodes that depend on a volatile node (a node whose output can change even if
+    its inputs don't, e.g. a node that reads a file) have the ``volatile`` bit set
+    as well. Nodes that are not part of the workflow (e.g. a node in a global
+    variable that the workflow uses) are considered volatile, since they can be
+    updated from outside. Therefore, nodes with an empty bitset are constant.
+
+    Parameters
+    ----------
+    nodes:
+        The nodes of the workflow, usually the dryrun nodes of the workflow class.
+    """
+
+    # Bit assigned to each input.
+    bits: Dict[str, int]
+    # Bit of the nodes that depend on a volatile node.
+    volatile: int
+    # Bitset of the inputs on which each worker (and the output) depends.
+    masks: Dict[str, int]
+    # Keys of the workers (and the output), with inputs before the nodes that use them.
+    order: List[str]
+
+    def __init__(self, nodes: WorkflowNodes):
+        self.bits = {key: 1 << i for i, key in enumerate(nodes.inputs)}
+        self.volatile = 1 << len(self.bits)
+
+        ids_to_key = {id(node): key for key, node in nodes.workers.items()}
+        ids_to_key[id(nodes.output)] = "output"
+
+        node_masks: Dict[int, int] = {}
+        self.masks = {}
+        self.order = []
+        for node in _topological_order([*nodes.workers.values(), nodes.output]):
+            if isinstance(node, WorkflowInput):
+                mask = self.bits[node.input_key]
+            elif id(node) not in ids_to_key:
+                mask = self.volatile
+            else:
+                mask = 0
+                for input_node in node._input_nodes.values():
+                    mask |= node_masks[id(input_node)]
+                if node._volatile or isinstance(node, DummyInputValue):
+                    mask |= self.volatile
+            node_masks[id(node)] = mask
+
+            key = ids_to_key.get(id(node))
+            if key is not None:
+                self.masks[key] = mask
+                self.order.append(key)
+
+    def mask(self, input_keys: Iterable[str]) -> int:
+        """Returns the bitset of some inputs."""
+        mask = 0
+        for key in input_keys:
+            if key not in self.bits:
+                raise KeyError(f"{key} is not an input of the workflow")
+            mask |= self.bits[key]
+        return mask
+
+    def inputs_of(self, key: str) -> List[str]:
+        """Returns the keys of the inputs on which a node depends."""
+        mask = self.masks[key]
+        return [input_key for input_key, bit in self.bits.items() if mask & bit]
+
+    def is_volatile(self, key: str) -> bool:
+        """Returns whether a node depends on a volatile node."""
+        return bool(self.masks[key] & self.volatile)
+
+    def constant(self) -> List[str]:
+        """Returns the keys of the nodes that depend neither on the inputs nor on volatile nodes."""
+        return [key for key in self.order if self.masks[key] == 0]
+
+    def affected_by(self, *input_keys: str) -> List[str]:
+        """Returns the keys of the nodes whose output may change if some inputs change.
+
+        Keys are sorted so that nodes come after the nodes that they use. The key
+        "output" is included if the output of the workflow depends on the inputs.
+        """
+        mask = self.mask(input_keys)
+        return [key for key in self.order if self.masks[key] & mask]
+
+
 class WorkflowNodes:
     inputs: Dict[str, WorkflowInput]
     workers: Dict[str, Node]
     output: WorkflowOutput
     named_vars: Dict[str, str]
+    # Keys of the workers that are shared between copies.
+    folded: Tuple[str, ...] = ()
+    # For copies, the nodes from which they were copied (e.g. the dryrun nodes of a
+    # workflow class) and the keys of the workers that are still shared with them
+    # because their inputs are the same in the copy (see ``copy``).
+    _template: Optional["WorkflowNodes"] = None
+    _shared_keys: FrozenSet[str] = frozenset()
+    # Called with the key and the node of each worker that a copy stops sharing
+    # with its template (see ``_own_nodes``).
+    _on_copy: Optional[Callable[[str, Node], None]] = None
+    # Keys of the workers needed by the output, grouped by dependency level.
+    _levels: Optional[List[List[str]]] = None
+    # Inputs on which each worker depends, as bitsets.
+    _index: Optional[DependencyIndex] = None
 
     def __init__(
         self,
@@ -577,17 +750,20 @@ class WorkflowNodes:
         inputs: Dict[str, WorkflowInput],
         output: WorkflowOutput,
         named_vars: Dict[str, Node],
+        internal: Optional[Set[int]] = None,
     ):
         # Gather all worker nodes inside the workflow.
-        workers = cls.gather_from_inputs_and_output(inputs.values(), output=output)
+        workers = cls.gather_from_inputs_and_output(
+            inputs.values(), output=output, internal=internal
+        )
 
         # Construct the table that will map from "human friendly" names to node keys.
-        _named_vars = {}
-        for k, v in named_vars.items():
-            for node_key, node in workers.items():
-                if node is v:
-                    _named_vars[k] = node_key
-                    break
+        ids_to_key = {}
+        for node_key, node in workers.items():
+            ids_to_key.setdefault(id(node), node_key)
+        _named_vars = {
+            k: ids_to_key[id(v)] for k, v in named_vars.items() if id(v) in ids_to_key
+        }
 
         return cls(
             inputs=inputs, workers=workers, output=output, named_vars=_named_vars
@@ -678,12 +854,12 @@ class WorkflowNodes:
     def __getitem__(self, key):
         if key in self.named_vars:
             key = self.named_vars[key]
-        return self._all_nodes[key]
+        return self._own_node(key)
 
     def __getattr__(self, key):
         if key in self.named_vars:
             key = self.named_vars[key]
-        return self._all_nodes[key]
+        return self._own_node(key)
 
     def items(self):
         return self._all_nodes.items()
@@ -694,49 +870,326 @@ class WorkflowNodes:
     def get(self, key):
         if key in self.named_vars:
             key = self.named_vars[key]
-        return self._all_nodes.get(key)
+        if key not in self._all_nodes:
+            return None
+        return self._own_node(key)
 
     def __str__(self):
         return f"Inputs: {self.inputs}\n\nWorkers: {self.workers}\n\nOutput: {self.output}\n\nNamed nodes: {self.named_vars}"
 
     @staticmethod
     def gather_from_inputs_and_output(
-        inputs: Sequence[WorkflowInput], output: WorkflowOutput
+        inputs: Sequence[WorkflowInput],
+        output: WorkflowOutput,
+        internal: Optional[Set[int]] = None,
     ) -> Dict[str, Node]:
-        # Get a list of all nodes.
+        """Finds all the nodes between the inputs and the output of a workflow.
+
+        Parameters
+        ----------
+        inputs:
+            The inputs of the workflow.
+        output:
+            The output of the workflow.
+        internal:
+            The ids of the nodes that belong to the workflow. If provided, other
+            nodes (and the nodes on which they depend) are not gathered, they are
+            used by the workflow but not part of it.
+        """
+        # Get a list of all nodes, in the order in which they are found. Nodes are
+        # registered by id, so that checking whether a node has been found is cheap.
         nodes = []
+        registered = set()
+
+        def visit(roots: Iterable[Node], children: Callable[[Node], Iterable[Node]]):
+            """Depth first traversal that visits each node only once."""
+            visited = set()
+            stack = [iter(roots)]
+            while stack:
+                for node in stack[-1]:
+                    if id(node) in visited:
+                        continue
+                    if internal is not None and id(node) not in internal:
+                        continue
+                    visited.add(id(node))
+                    if id(node) not in registered:
+                        registered.add(id(node))
+                        nodes.append(node)
+                    stack.append(iter(children(node)))
+                    break
+                else:
+                    stack.pop()
 
-        # Function that will receive a node and add it to the list if it's
-        # not already there.
-        def add_node(node):
-            if any(node is reg_node for reg_node in nodes):
-                return
-            nodes.append(node)
+        def input_nodes(node: Node) -> List[Node]:
+            found = []
+            node.map_inputs(node.inputs, func=found.append, only_nodes=True)
+            return found
 
-        # Visit all nodes that depend on the inputs.
-        traverse_tree_forward(inputs, add_node)
-        traverse_tree_backward((output,), add_node)
+        # Visit all nodes that depend on the inputs, and then all nodes
+        # on which the output depends.
+        visit(inputs, lambda node: node._output_links)
+        visit((output,), input_nodes)
 
         # Now build a dictionary that contains all nodes.
         dict_nodes = {}
+        # Number of nodes found for each class name.
+        name_counts: Dict[str, int] = {}
         for node in nodes:
             if isinstance(node, (WorkflowInput, WorkflowOutput)):
                 continue
 
             # Determine the name we are going to assign to this node inside the workflow.
             node_name = node.__class__.__name__
-            name = node_name
-            i = 0
+            i = name_counts.get(node_name, 0)
+            name = node_name if i == 0 else f"{node_name}_{i}"
             while name in dict_nodes:
                 i += 1
                 name = f"{node_name}_{i}"
+            name_counts[node_name] = i + 1
 
             # Add it to the dictionary of nodes
             dict_nodes[name] = node
 
         return dict_nodes
 
-    def copy(self, inputs: Dict[str, Any] = {}) -> "WorkflowNodes":
+    def eliminate_common_subexpressions(self) -> int:
+        """Merges worker nodes that are structurally identical.
+
+        Named variables that pointed to a removed node point to the node that
+        replaces it.
+
+        Returns
+        -------
+        int
+            The number of nodes that were removed.
+
+        See Also
+        --------
+        nodify.optimize.eliminate_common_subexpressions
+        """
+        replaced = eliminate_common_subexpressions(
+            [*self.workers.values(), self.output]
+        )
+
+        ids_to_key = {id(node): key for key, node in self.workers.items()}
+
+        # Remove the merged nodes, keeping track of the key of their replacement.
+        removed_keys = {}
+        for key, node in list(self.workers.items()):
+            if id(node) in replaced:
+                removed_keys[key] = ids_to_key[id(replaced[id(node)])]
+                del self.workers[key]
+
+        for var_name, key in self.named_vars.items():
+            if key in removed_keys:
+                self.named_vars[var_name] = removed_keys[key]
+
+        # The analyses of the graph are not valid anymore.
+        self._levels = None
+        self._index = None
+
+        return len(replaced)
+
+    def fold_constants(self) -> int:
+        """Marks the worker nodes that don't depend on the inputs to be shared between copies.
+
+        Copies of these nodes' outputs are then not computed again, instead copies use a
+        ``FoldedNode`` that returns the output of the original node.
+
+        Returns
+        -------
+        int
+            The number of workers that will be shared.
+
+        See Also
+        --------
+        DependencyIndex.constant
+        """
+        constant = set(self.dependency_index().constant())
+        self.folded = tuple(key for key in self.workers if key in constant)
+        return len(self.folded)
+
+    def dependency_levels(self) -> List[List[str]]:
+        """Groups the worker nodes needed to compute the output by dependency level.
+
+        Workers in the first level only depend on the inputs, and workers in each
+        of the following levels only depend on workers of the previous levels.
+        Therefore, all the workers of a level can be computed at the same time.
+
+        Only workers that are always needed are included. Inputs that nodes
+        evaluate depending on the values of other inputs (e.g. the branches of
+        a conditional, see ``Node._eager_inputs``) are left out, unless other
+        nodes always need them, since computing them could be wasteful or fail.
+        """
+        if self._levels is not None:
+            return self._levels
+
+        ids_to_key = {id(node): key for key, node in self.workers.items()}
+
+        eager = _eager_nodes([self.output])
+
+        node_levels: Dict[int, int] = {}
+        levels: List[List[str]] = []
+        for node in _topological_order([self.output]):
+            level = max(
+                (node_levels[id(inp)] + 1 for inp in node._input_nodes.values()),
+                default=0,
+            )
+            node_levels[id(node)] = level
+
+            key = ids_to_key.get(id(node))
+            if key is None or id(node) not in eager:
+                continue
+            while len(levels) <= level:
+                levels.append([])
+            levels[level].append(key)
+
+        self._levels = [level for level in levels if len(level) > 0]
+        return self._levels
+
+    def dependency_index(self) -> DependencyIndex:
+        """Returns the index of the inputs on which each worker node depends."""
+        if self._index is None:
+            self._index = DependencyIndex(self)
+        return self._index
+
+    def update_inputs(self, inputs: Dict[str, Any], index: DependencyIndex):
+        """Updates the values of some inputs and marks the affected nodes as outdated.
+
+        Instead of propagating the update through the links of each input, the
+        nodes that depend on the inputs are taken from the index and marked in a
+        single pass. Nodes that don't use some of their inputs (e.g. conditionals)
+        are only marked if an input that they use has been marked.
+
+        Parameters
+        ----------
+        inputs:
+            The new values of the inputs.
+        index:
+            The dependency index of the workflow. Since keys are the same, it can be
+            the index of the nodes of the workflow class.
+        """
+        # Nodes that have been marked as outdated, in topological order.
+        nodes: List[Node] = []
+        outdated: Set[int] = set()
+        for input_key, value in inputs.items():
+            input_node = self.inputs[input_key]
+            input_node._inputs["value"] = value
+            input_node._update_connections(input_node._inputs)
+            input_node._mark_outdated()
+            nodes.append(input_node)
+            outdated.add(id(input_node))
+
+        for key in index.affected_by(*inputs):
+            node = self._all_nodes.get(key)
+            # Nodes upstream of shared nodes might not be in the copy.
+            if node is None:
+                continue
+            if not any(id(inp) in outdated for inp in node._input_nodes.values()):
+                continue
+            if not node._outdated_by_inputs():
+                continue
+            node._mark_outdated()
+            outdated.add(id(node))
+            nodes.append(node)
+
+        for node in nodes:
+            node._maybe_autoupdate()
+
+        # Nodes outside of the workflow are informed as usual.
+        workflow_ids = {id(node) for node in self._all_nodes.values()}
+        for node in nodes:
+            for linked_node in node._output_links:
+                if id(linked_node) not in workflow_ids:
+                    linked_node._receive_outdated()
+
+    def compute_parallel(
+        self,
+        levels: List[List[str]],
+        max_workers: int,
+        executor: str = "thread",
+    ):
+        """Computes the worker nodes level by level, running each level concurrently.
+
+        Workers are computed in a pool of threads. Since the workers of a level only
+        depend on workers of previous levels, which have already been computed when
+        the level starts, each thread only computes a single node. The workers
+        that are only needed for some values of the inputs (e.g. the branches of
+        a conditional) are not in the levels, and they are computed when the nodes
+        that use them need them.
+
+        Parameters
+        ----------
+        levels:
+            The keys of the workers grouped by dependency level, as returned by
+            ``dependency_levels`` (possibly from the workflow class).
+        max_workers:
+            Maximum number of nodes computed at the same time.
+        executor:
+            If "thread", node functions run in the threads of the pool. If "process",
+            each node function runs in its own process (see the ``isolate`` context key),
+            so the function, its inputs and its output must be picklable.
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown workflow executor: {executor}")
+
+        def compute(node: Node):
+            if executor == "process":
+                with temporal_context(isolate=True):
+                    return node.get()
+            return node.get()
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="nodify-workflow"
+        ) as pool:
+            for level in levels:
+                nodes = [self.workers[key] for key in level if key in self.workers]
+                # Nodes that are up to date don't need a thread.
+                nodes = [
+                    node
+                    for node in nodes
+                    if node._outdated or node._output is Node._blank
+                ]
+                if len(nodes) == 0:
+                    continue
+                if len(nodes) == 1:
+                    compute(nodes[0])
+                    continue
+
+                # Each computation sees the temporal contexts of the caller.
+                futures = [
+                    pool.submit(contextvars.copy_context().run, compute, node)
+                    for node in nodes
+                ]
+                done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in futures:
+                    if future in done and future.exception() is not None:
+                        # Don't start any other computation, and wait for the
+                        # running ones to finish before raising the error.
+                        for other in futures:
+                            other.cancel()
+                        wait(futures)
+                        raise future.exception()
+
+    def input_dependencies(self) -> Dict[str, Optional[FrozenSet[str]]]:
+        """Returns the keys of the inputs on which each worker node depends.
+
+        Workers that depend on a volatile node (a node whose output can change even
+        if its inputs don't) are mapped to None.
+
+        See Also
+        --------
+        dependency_index
+        """
+        index = self.dependency_index()
+        return {
+            key: None if index.is_volatile(key) else frozenset(index.inputs_of(key))
+            for key in self.workers
+        }
+
+    def copy(
+        self, inputs: Dict[str, Any] = {}, copy_on_write: bool = False
+    ) -> "WorkflowNodes":
         """Creates a copy of the workflow nodes.
 
         Parameters
@@ -744,6 +1197,12 @@ class WorkflowNodes:
         inputs: dict, optional
             The inputs to be used in the copy. If not provided, the inputs of the original
             workflow will be used.
+        copy_on_write: bool, optional
+            If True, worker nodes whose inputs are the same in the copy (because they only
+            depend on inputs whose values have not changed) are not copied. The copy uses
+            the original nodes instead, through a ``FoldedNode``. They are copied later,
+            by ``materialize``, if the inputs on which they depend are updated, or
+            when they are accessed (e.g. ``nodes.some_name``).
         """
         # First, create a copy of the inputs with the new values.
         new_inputs = {}
@@ -753,60 +1212,323 @@ class WorkflowNodes:
                 value=inputs.get(input_k, input_node.value),
             )
 
-        # Now create a copy of the worker nodes
+        template = self._template if self._template is not None else self
+        shared_keys = set(self._shared_keys)
+        if copy_on_write and self._template is None:
+            index = self.dependency_index()
+            diverged = index.mask(
+                k
+                for k, value in inputs.items()
+                if k in self.inputs
+                and not _same_input_value(value, self.inputs[k].value)
+            )
+            for key in self.workers:
+                if not index.masks[key] & (diverged | index.volatile):
+                    shared_keys.add(key)
+
+        folded = {*self.folded, *shared_keys}
+
+        # Now find the worker nodes that the copy needs. Nodes are visited only
+        # once, inputs before the nodes that use them.
         old_ids_to_key = {id(node): key for key, node in self.workers.items()}
-        new_output = []
-        new_workers = {}
+        order = _topological_order([*self.workers.values(), self.output])
+
+        # All nodes that depend on the inputs, the output and the named variables
+        # are needed, as well as the inputs of the needed nodes, except for shared
+        # nodes, whose inputs don't need to be copied.
+        needed = {id(self.output)}
+        needed.update(id(self.workers[key]) for key in self.named_vars.values())
+        for node in order:
+            if any(
+                isinstance(input_node, WorkflowInput) or id(input_node) in needed
+                for input_node in node._input_nodes.values()
+            ):
+                needed.add(id(node))
+        for node in reversed(order):
+            if id(node) in needed and old_ids_to_key.get(id(node)) not in folded:
+                needed.update(
+                    id(input_node) for input_node in node._input_nodes.values()
+                )
 
-        def copy_node(node):
-            node_id = id(node)
+        # Then copy them.
+        old_to_new = {}
 
-            # If it is a WorkflowInput node, return the already created copy.
+        def copy_node(node):
             if isinstance(node, WorkflowInput):
                 return new_inputs[node.input_key]
-            # If it is a WorkflowOutput node, return the already created copy if it is there.
-            elif isinstance(node, WorkflowOutput):
-                if len(new_output) == 1:
-                    return new_output[0]
-            # If this is an already copied node, just return it.
-            elif node_id not in old_ids_to_key:
-                return node
-
-            node_key = old_ids_to_key.get(node_id)
-            # This is an old node that we already copied, so we can just return the copy.
-            if node_key in new_workers:
-                return new_workers[node_key]
-
-            # This is an old node that we haven't copied yet, so we need to copy it.
-            # Get the new inputs, copying nodes if needed.
-            new_node_inputs = node.map_inputs(
-                inputs=node.inputs, only_nodes=True, func=copy_node
-            )
-
-            # Initialize a new node with the new inputs.
-            args, kwargs = node._sanitize_inputs(new_node_inputs)
-            new_node = node.__class__(*args, **kwargs)
-
-            # Add the new node. If it's the output node, we save it in its own variable.
-            if isinstance(new_node, WorkflowOutput):
-                new_output.append(new_node)
-            else:
-                new_workers[node_key] = new_node
-
-            return new_node
+            # Nodes that are not part of the workflow are not copied.
+            return old_to_new.get(id(node), node)
 
         with temporal_context(lazy=True):
-            traverse_tree_forward(list(self.inputs.values()), copy_node)
-            traverse_tree_backward((self.output,), copy_node)
-
-        assert len(new_output) == 1 and isinstance(new_output[0], WorkflowOutput)
+            for node in order:
+                node_key = old_ids_to_key.get(id(node))
+                if id(node) not in needed or (
+                    node_key is None and not isinstance(node, WorkflowOutput)
+                ):
+                    continue
 
-        return self.__class__(
+                if node_key in folded:
+                    # This node is shared between copies, point to it.
+                    new_node = FoldedNode(shared=_SharedRef(node))
+                else:
+                    new_node_inputs = node.map_inputs(
+                        inputs=node.inputs, only_nodes=True, func=copy_node
+                    )
+                    args, kwargs = node._sanitize_inputs(new_node_inputs)
+                    new_node = node.__class__(*args, **kwargs)
+                old_to_new[id(node)] = new_node
+
+        # Keep the order of the workers of the original.
+        new_workers = {
+            key: old_to_new[id(node)]
+            for key, node in self.workers.items()
+            if id(node) in old_to_new
+        }
+        new_output = [old_to_new[id(self.output)]]
+        assert isinstance(new_output[0], WorkflowOutput)
+
+        new_nodes = self.__class__(
             inputs=new_inputs,
             workers=new_workers,
             output=new_output[0],
             named_vars=self.named_vars,
         )
+        if folded:
+            new_nodes._template = template
+            new_nodes._shared_keys = frozenset(shared_keys.intersection(new_workers))
+        return new_nodes
+
+    def materialize(self, input_keys: Iterable[str]) -> int:
+        """Gives the copy its own nodes for the shared workers that depend on some inputs.
+
+        This must be called before updating the inputs of a copy created with
+        ``copy_on_write=True``, so that the update doesn't need to modify the nodes
+        of the original.
+
+        Parameters
+        ----------
+        input_keys:
+            The keys of the inputs that are going to be updated.
+
+        Returns
+        -------
+        int
+            The number of nodes that have been copied.
+        """
+        template = self._template
+        if template is None:
+            return 0
+
+        index = template.dependency_index()
+        mask = index.mask(k for k in input_keys if k in template.inputs)
+
+        def affected(key: str) -> bool:
+            return bool(index.masks[key] & mask) and not index.is_volatile(key)
+
+        roots = [template.workers[key] for key in self._shared_keys if affected(key)]
+        if len(roots) == 0:
+            return 0
+
+        ids_to_key = {id(node): key for key, node in template.workers.items()}
+        keys = set()
+        for node in _topological_order(roots):
+            key = ids_to_key.get(id(node))
+            if key is not None and affected(key):
+                if key not in self.workers or key in self._shared_keys:
+                    keys.add(key)
+
+        return self._own_nodes(keys)
+
+    def _own_nodes(self, keys: Iterable[str]) -> int:
+        """Replaces the nodes that the copy shares with its template by its own nodes.
+
+        The new nodes are connected to the nodes of the copy, which keeps using
+        the shared ones for the rest of the workers.
+
+        Parameters
+        ----------
+        keys:
+            The keys of the workers to copy. Workers that are not in the copy
+            yet are added to it.
+
+        Returns
+        -------
+        int
+            The number of nodes that have been copied.
+        """
+        template = self._template
+        keys = set(keys)
+        if template is None or len(keys) == 0:
+            return 0
+
+        ids_to_key = {id(node): key for key, node in template.workers.items()}
+        shared_keys = set(self._shared_keys)
+
+        def link(node: Node) -> Node:
+            """Returns the node of the copy that corresponds to a node of the template."""
+            if isinstance(node, WorkflowInput):
+                return self.inputs[node.input_key]
+            key = ids_to_key[id(node)]
+            if key not in self.workers:
+                # Nodes upstream of shared nodes are not in the copy yet.
+                self.workers[key] = FoldedNode(shared=_SharedRef(node))
+                if key not in template.folded:
+                    shared_keys.add(key)
+            return self.workers[key]
+
+        n_copied = 0
+        with temporal_context(lazy=True):
+            for node in _topological_order([template.workers[key] for key in keys]):
+                key = ids_to_key.get(id(node))
+                if key not in keys:
+                    continue
+
+                new_node_inputs = node.map_inputs(
+                    inputs=node.inputs, only_nodes=True, func=link
+                )
+                args, kwargs = node._sanitize_inputs(new_node_inputs)
+                new_node = node.__class__(*args, **kwargs)
+
+                # The new node computes the same as the shared one, until the inputs are updated.
+                if key in self.workers:
+                    _replace_node(self.workers[key], new_node)
+                self.workers[key] = new_node
+                shared_keys.discard(key)
+                if self._on_copy is not None:
+                    self._on_copy(key, new_node)
+                n_copied += 1
+
+        self._shared_keys = frozenset(shared_keys)
+        return n_copied
+
+    def _own_node(self, key: str) -> Node:
+        """Returns the node of a worker, giving the copy its own node if it was shared.
+
+        Nodes that are handed out can be modified (e.g. their inputs updated), so
+        they can't be the nodes of the template.
+        """
+        if isinstance(self.workers.get(key), FoldedNode):
+            self._own_nodes([key])
+        return self._all_nodes[key]
+
+    def expand(self, points: Sequence[Dict[str, Any]]) -> List[WorkflowOutput]:
+        """Builds the graphs of the workflow for several sets of inputs, sharing nodes.
+
+        Each worker is created only once for each distinct combination of the values
+        of the inputs on which it depends. Therefore, points that only differ in some
+        inputs share all the workers that don't depend on them, and their outputs
+        are computed only once. Workers that are shared between copies (see
+        ``fold_constants``) are shared with these nodes as well.
+
+        Parameters
+        ----------
+        points:
+            The values of the inputs for each point. They must contain all inputs.
+
+        Returns
+        -------
+        List[WorkflowOutput]
+            The output node of each point.
+        """
+        index = self.dependency_index()
+        inputs_of = {key: index.inputs_of(key) for key in self.workers}
+        ids_to_key = {id(node): key for key, node in self.workers.items()}
+        folded = set(self.folded)
+
+        # Nodes needed to compute the output. Shared nodes don't need their inputs.
+        order = _topological_order([self.output])
+        needed = {id(self.output)}
+        for node in reversed(order):
+            if id(node) in needed and ids_to_key.get(id(node)) not in folded:
+                needed.update(id(inp) for inp in node._input_nodes.values())
+        order = [node for node in order if id(node) in needed]
+
+        # Distinct values of each input, so that each value is identified by its index.
+        distinct: Dict[str, List[Any]] = {k: [] for k in self.inputs}
+        # Index of each distinct hashable value, to find it without scanning. Keys
+        # include the type, since values of different types are not the same (see
+        # ``_same_input_value``), and nodes are identified by their id.
+        hashed: Dict[str, Dict[Tuple[Any, Any], int]] = {k: {} for k in self.inputs}
+
+        def value_index(input_key: str, value: Any) -> int:
+            values = distinct[input_key]
+            if isinstance(value, Node):
+                key = (Node, id(value))
+            else:
+                key = (type(value), value)
+            try:
+                i = hashed[input_key].setdefault(key, len(values))
+            except TypeError:
+                # Unhashable values are compared with all the distinct values.
+                i = next(
+                    (
+                        i
+                        for i, other in enumerate(values)
+                        if _same_input_value(value, other)
+                    ),
+                    len(values),
+                )
+            if i == len(values):
+                values.append(value)
+            return i
+
+        # Nodes created for each (key, indices of the values of its dependencies).
+        memo: Dict[Tuple, Node] = {}
+        outputs = []
+
+        with temporal_context(lazy=True):
+            for i_point, point in enumerate(points):
+                indices = {k: value_index(k, point[k]) for k in self.inputs}
+                point_nodes: Dict[int, Node] = {}
+
+                for node in order:
+                    if isinstance(node, WorkflowInput):
+                        memo_key = (node.input_key, indices[node.input_key])
+                    elif isinstance(node, WorkflowOutput):
+                        memo_key = ("output", tuple(indices.values()))
+                    elif id(node) not in ids_to_key:
+                        # Not a node of the workflow, it is used as it is.
+                        point_nodes[id(node)] = node
+                        continue
+                    else:
+                        key = ids_to_key[id(node)]
+                        if index.is_volatile(key):
+                            # Volatile nodes are never shared.
+                            memo_key = (key, "point", i_point)
+                        else:
+                            memo_key = (
+                                key,
+                                tuple(indices[k] for k in inputs_of[key]),
+                            )
+
+                    if memo_key not in memo:
+                        if isinstance(node, WorkflowInput):
+                            new_node = node.__class__(
+                                input_key=node.input_key, value=point[node.input_key]
+                            )
+                        elif ids_to_key.get(id(node)) in folded:
+                            new_node = FoldedNode(shared=_SharedRef(node))
+                        else:
+                            new_node_inputs = node.map_inputs(
+                                inputs=node.inputs,
+                                only_nodes=True,
+                                func=lambda inp: point_nodes[id(inp)],
+                            )
+                            args, kwargs = node._sanitize_inputs(new_node_inputs)
+                            new_node = node.__class__(*args, **kwargs)
+                        memo[memo_key] = new_node
+                    point_nodes[id(node)] = memo[memo_key]
+
+                outputs.append(point_nodes[id(self.output)])
+
+        return outputs
+
+
+def _same_input_value(value: Any, other: Any) -> bool:
+    """Checks whether two values of a workflow input are the same."""
+    if isinstance(value, Node) or isinstance(other, Node):
+        return value is other
+    return _same_value(value, other)
 
 
 class Workflow(Node):
@@ -835,6 +1557,10 @@ class Workflow(Node):
     # The nodes of the workflow instance.
     nodes: WorkflowNodes
 
+    # Cache of node outputs shared by all instances of the workflow class, used
+    # when the "output_cache" context key is True.
+    output_cache: OutputCache
+
     network = NetworkDescriptor()
 
     def _set_outdated(self, value: bool):
@@ -911,9 +1637,44 @@ class Workflow(Node):
         self.nodes = self.dryrun_nodes
         super().setup(*args, **kwargs)
 
-        self.nodes = self.dryrun_nodes.copy(inputs=self._inputs)
+        self.nodes = self.dryrun_nodes.copy(
+            inputs=self._inputs, copy_on_write=self.context["copy_on_write"]
+        )
+        self.nodes._on_copy = self._setup_node
+        for key, node in self.nodes.workers.items():
+            self._setup_node(key, node)
+
+    def _setup_node(self, key: str, node: Node):
+        """Prepares a worker node of the instance to compute its output.
+
+        If "checkpoint_dir" is set, the node persists its output. Checkpoints of
+        each workflow class are stored in their own subdirectory, and the output of
+        each worker under its key. If "output_cache" is True, the node uses the
+        output cache of the class.
+
+        Shared nodes (see ``FoldedNode``) are left untouched, since they point to
+        the nodes of the workflow class, which must not be modified by instances.
+        Their outputs are computed only once anyway.
+        """
+        if isinstance(node, FoldedNode):
+            return
+
+        checkpoint_dir = self.context["checkpoint_dir"]
+        if checkpoint_dir is not None:
+            cls = type(self)
+            store = CheckpointStore(
+                Path(checkpoint_dir) / f"{cls.__module__}.{cls.__qualname__}"
+            )
+            node._checkpoint = (store, key)
+
+        if self.context["output_cache"]:
+            node._output_cache = (type(self).output_cache, key)
 
     def __init_subclass__(cls):
+        # Each workflow class has its own output cache.
+        if "output_cache" not in cls.__dict__:
+            cls.output_cache = OutputCache()
+
         # If this is just a subclass of Workflow that is not meant to be ran, continue
         if not hasattr(cls, "function"):
             return super().__init_subclass__()
@@ -958,9 +1719,19 @@ class Workflow(Node):
         # Nodify it, passing the middleware function that will assign the variables to the workflow.
         work_func = nodify_func(work_func, assign_fn=assign_workflow_var)
 
+        # Nodes created during the dryrun. The workflow can also use nodes that
+        # already existed (e.g. a node in a global variable), which are not part of it.
+        created = []
+        outer_on_init = cls.context["on_init"]
+
+        def on_init(node: Node):
+            created.append(node)
+            if outer_on_init is not None:
+                outer_on_init(node)
+
         # Run a dryrun of the workflow, so that we can understand how the nodes are connected.
         # To this end, nodes must behave lazily.
-        with temporal_context(lazy=True):
+        with temporal_context(lazy=True, on_init=on_init):
             # Define all workflow inputs.
             inps = {
                 k: WorkflowInput(
@@ -984,10 +1755,25 @@ class Workflow(Node):
 
         # Store all the nodes of the workflow.
         cls.dryrun_nodes = WorkflowNodes.from_workflow_run(
-            inputs=inps, output=out, named_vars=named_vars
+            inputs=inps,
+            output=out,
+            named_vars=named_vars,
+            internal={id(node) for node in created},
         )
 
-        return super().__init_subclass__()
+        super().__init_subclass__()
+
+        # Merge the nodes that would compute the same thing. Since instances of the
+        # workflow are copies of the dryrun nodes, they will also benefit from it.
+        if cls.context["merge_identical_nodes"]:
+            n_merged = cls.dryrun_nodes.eliminate_common_subexpressions()
+            if n_merged > 0:
+                _logger.info(
+                    f"Merged {n_merged} identical nodes of workflow {cls.__name__}."
+                )
+        # Share the nodes that don't depend on the inputs between all instances.
+        if cls.context["fold_constants"]:
+            cls.dryrun_nodes.fold_constants()
 
     def __dir__(self) -> Iterable[str]:
         return [*super().__dir__(), *list(self._vars)]
@@ -1011,6 +1797,21 @@ class Workflow(Node):
             f"Could not find node {node} in the workflow. Workflow nodes {cls.dryrun_nodes.items()}"
         )
 
+    @classmethod
+    def affected_by(cls, *input_keys: str) -> List[str]:
+        """Returns the keys of the nodes whose output may change if some inputs change.
+
+        Keys are sorted so that nodes come after the nodes that they use. The key
+        "output" is included if the output of the workflow depends on the inputs.
+
+        Examples
+        --------
+
+        >>> my_workflow.affected_by("a")
+        ['my_sum', 'my_sum_1', 'output']
+        """
+        return cls.dryrun_nodes.dependency_index().affected_by(*input_keys)
+
     def get(self):
         """Returns the up to date output of the workflow.
 
@@ -1018,11 +1819,119 @@ class Workflow(Node):
         """
         self._errored = False
         try:
-            return self.nodes.output.get()
+            output = self.nodes.output
+            max_workers = self.context["max_workers"]
+            runner = self.context["runner"]
+            if runner is not None and (
+                output._outdated or output._output is Node._blank
+            ):
+                # Compute the workers as soon as they are ready, so that all
+                # the processes of the runner are busy.
+                runner.compute(
+                    [
+                        self.nodes.workers[key]
+                        for level in self.dryrun_nodes.dependency_levels()
+                        for key in level
+                        if key in self.nodes.workers
+                    ]
+                )
+            elif (
+                max_workers is not None
+                and max_workers > 1
+                and (output._outdated or output._output is Node._blank)
+            ):
+                # Levels are computed once for the workflow class, keys are the same
+                # for all instances.
+                self.nodes.compute_parallel(
+                    self.dryrun_nodes.dependency_levels(),
+                    max_workers=max_workers,
+                    executor=self.context["executor"],
+                )
+            return output.get()
         except:
             self._errored = True
             raise
 
+    @classmethod
+    def sweep(
+        cls,
+        points: Iterable[Dict[str, Any]],
+        max_workers: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Any]]:
+        """Computes the output of the workflow for many sets of inputs.
+
+        Instead of creating an instance for each set of inputs, the graph of the
+        workflow is expanded once for all of them (see ``WorkflowNodes.expand``).
+        Intermediate nodes are shared between all the points that have the same
+        values for the inputs on which they depend, so they are only computed once.
+
+        Parameters
+        ----------
+        points:
+            The inputs of each point, as dictionaries. Inputs that are not in
+            a dictionary take their default value.
+        max_workers:
+            Maximum number of points computed at the same time. If None, it is taken
+            from the "max_workers" context key. If it is not larger than 1, points
+            are computed one after the other, in order.
+
+        Yields
+        ------
+        index:
+            The index of the point in ``points``.
+        output:
+            The output of the workflow for that point.
+
+        Examples
+        --------
+
+        >>> for i, output in my_workflow.sweep([{"a": 1, "b": 2}, {"a": 1, "b": 3}]):
+        >>>     print(i, output)
+        """
+        defaults = {k: inp.value for k, inp in cls.dryrun_nodes.inputs.items()}
+
+        full_points = []
+        for i, point in enumerate(points):
+            unknown = set(point).difference(defaults)
+            if unknown:
+                raise TypeError(
+                    f"Sweep point {i} contains unknown inputs for {cls.__name__}: {sorted(unknown)}"
+                )
+            full_point = {**defaults, **point}
+            missing = [k for k, v in full_point.items() if v is Node._blank]
+            if missing:
+                raise TypeError(
+                    f"Sweep point {i} is missing required inputs for {cls.__name__}: {missing}"
+                )
+            full_points.append(full_point)
+
+        outputs = cls.dryrun_nodes.expand(full_points)
+
+        if max_workers is None:
+            max_workers = cls.context["max_workers"]
+        if max_workers is None or max_workers <= 1:
+            for i, output in enumerate(outputs):
+                yield i, output.get()
+            return
+
+        # Points are computed by threads. Nodes shared by several points are computed
+        # only once, the other threads wait for the output.
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="nodify-sweep"
+        ) as pool:
+            futures = {
+                pool.submit(contextvars.copy_context().run, output.get): i
+                for i, output in enumerate(outputs)
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                # If there is an error or the iteration is stopped, don't
+                # compute the remaining points.
+                for future in futures:
+                    future.cancel()
+
     def update_inputs(self, **inputs):
         """Updates the inputs of the workflow."""
         # Be careful here:
@@ -1031,15 +1940,22 @@ class Workflow(Node):
         # Otherwise the nodes will be recalculated every time we update each
         # individual input.
 
-        for input_key, value in inputs.items():
-            self.nodes.inputs[input_key].update_inputs(value=value)
+        # Nodes shared with the workflow class can't be updated, they need to be copied.
+        self.nodes.materialize(inputs)
+
+        # All nodes affected by the update are found in the index of the class,
+        # and marked as outdated at once.
+        self.nodes.update_inputs(inputs, self.dryrun_nodes.dependency_index())
 
         self._inputs.update(inputs)
 
         # Now, update all connections between this workflow and other nodes.
         self._update_connections(self._inputs)
 
-        self._receive_outdated()
+        # If the output doesn't depend on the updated inputs (e.g. they are only
+        # used by branches that are not taken), the workflow is still up to date.
+        if self.nodes.output._outdated:
+            self._receive_outdated()
 
         return self
 